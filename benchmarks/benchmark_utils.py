@@ -0,0 +1,62 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from functools import lru_cache
+from typing import Callable, Tuple
+
+import torch
+from torch import Tensor, eye, zeros
+from torch.distributions import Distribution, MultivariateNormal
+
+from sbi.inference import SNLE, SNPE, SNRE, simulate_for_sbi
+from sbi.inference.base import NeuralInference
+from sbi.simulators.linear_gaussian import linear_gaussian
+from sbi.utils.sbiutils import seed_all_backends
+
+# Dimensions of parameters and data of the linear Gaussian task.
+NUM_DIMS = (2, 10)
+# Number of simulations to train estimators on.
+NUM_TRAINING_SIMULATIONS = 2000
+
+
+@lru_cache(maxsize=None)
+def linear_gaussian_task(
+    num_dim: int,
+) -> Tuple[Distribution, Callable[[Tensor], Tensor], Tensor]:
+    """Return prior, simulator and an observation of the linear Gaussian task."""
+    prior = MultivariateNormal(loc=zeros(num_dim), covariance_matrix=eye(num_dim))
+
+    def simulator(theta: Tensor) -> Tensor:
+        return linear_gaussian(theta, zeros(num_dim), 0.5 * eye(num_dim))
+
+    x_o = torch.full((1, num_dim), 0.5)
+    return prior, simulator, x_o
+
+
+def simulations(num_dim: int, num_simulations: int) -> Tuple[Tensor, Tensor]:
+    """Return parameters and data simulated from the linear Gaussian task."""
+    prior, simulator, _ = linear_gaussian_task(num_dim)
+    return simulate_for_sbi(
+        simulator,
+        prior,
+        num_simulations,
+        simulation_batch_size=num_simulations,
+        show_progress_bar=False,
+    )
+
+
+@lru_cache(maxsize=None)
+def trained_inference(method: str, num_dim: int) -> NeuralInference:
+    """Return an inference object of `SNPE`, `SNLE` or `SNRE` trained on the linear
+    Gaussian task.
+
+    Trained objects are cached, such that benchmarks of sampling and diagnostics only
+    time the part they benchmark.
+    """
+    seed_all_backends(0)
+    prior, _, _ = linear_gaussian_task(num_dim)
+    inference_class = dict(SNPE=SNPE, SNLE=SNLE, SNRE=SNRE)[method]
+    inference = inference_class(prior, show_progress_bars=False)
+    theta, x = simulations(num_dim, NUM_TRAINING_SIMULATIONS)
+    inference.append_simulations(theta, x).train(max_num_epochs=20)
+    return inference
@@ -0,0 +1,12 @@
+import pytest
+
+from sbi.utils.sbiutils import seed_all_backends
+
+# Seed for `set_seed` fixture, such that all benchmarks run the same workload.
+seed = 1
+
+
+# Use seed automatically for every benchmark function.
+@pytest.fixture(autouse=True)
+def set_seed():
+    seed_all_backends(seed)
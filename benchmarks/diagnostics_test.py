@@ -0,0 +1,81 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import pytest
+import torch
+
+from benchmarks.benchmark_utils import linear_gaussian_task, trained_inference
+from sbi.diagnostics import run_coverage, run_sbc
+from sbi.utils.metrics import (
+    c2st,
+    linear_time_mmd_squared,
+    rff_mmd_squared,
+    unbiased_mmd_squared,
+)
+
+
+@pytest.mark.parametrize("use_batched_sampling", (True, False))
+@pytest.mark.parametrize("num_sbc_runs", (100, 1000))
+def test_run_sbc(benchmark, num_sbc_runs: int, use_batched_sampling: bool):
+    if num_sbc_runs > 100 and not use_batched_sampling:
+        pytest.skip("Sampling one observation at a time is too slow.")
+    num_dim = 2
+    prior, simulator, _ = linear_gaussian_task(num_dim)
+    thetas = prior.sample((num_sbc_runs,))
+    xs = simulator(thetas)
+    posterior = trained_inference("SNPE", num_dim).build_posterior()
+
+    benchmark.pedantic(
+        run_sbc,
+        args=(thetas, xs, posterior),
+        kwargs=dict(
+            num_posterior_samples=1000,
+            show_progress_bar=False,
+            use_batched_sampling=use_batched_sampling,
+        ),
+        rounds=3,
+    )
+
+
+def test_run_coverage(benchmark):
+    num_dim = 2
+    prior, simulator, _ = linear_gaussian_task(num_dim)
+    thetas = prior.sample((1000,))
+    xs = simulator(thetas)
+    posterior = trained_inference("SNPE", num_dim).build_posterior()
+
+    benchmark.pedantic(
+        run_coverage,
+        args=(thetas, xs, posterior),
+        kwargs=dict(num_posterior_samples=1000, show_progress_bar=False),
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize(
+    "classifier, backend", (("rf", "sklearn"), ("mlp", "sklearn"), ("mlp", "torch"))
+)
+@pytest.mark.parametrize("num_samples", (1000, 5000))
+def test_c2st(benchmark, num_samples: int, classifier: str, backend: str):
+    X = torch.randn(num_samples, 5)
+    Y = torch.randn(num_samples, 5) + 0.5
+
+    benchmark.pedantic(
+        c2st,
+        args=(X, Y),
+        kwargs=dict(classifier=classifier, backend=backend),
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize(
+    "mmd", (unbiased_mmd_squared, linear_time_mmd_squared, rff_mmd_squared)
+)
+@pytest.mark.parametrize("num_samples", (1000, 10_000))
+def test_mmd(benchmark, num_samples: int, mmd):
+    x = torch.randn(num_samples, 5)
+    y = torch.randn(num_samples, 5) + 0.5
+
+    benchmark(mmd, x, y)
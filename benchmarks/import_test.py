@@ -0,0 +1,30 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "statement",
+    (
+        "import torch",
+        "import sbi.inference",
+        "from sbi.inference import SNPE",
+        "from sbi.inference import SNLE, MCMCPosterior",
+        "from sbi.inference import MCABC",
+        "import sbi.analysis",
+    ),
+)
+def test_import_time(benchmark, statement: str):
+    """Time importing sbi in a fresh interpreter, as done by CLI tools and workers."""
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", statement],),
+        kwargs=dict(check=True),
+        rounds=5,
+    )
@@ -0,0 +1,112 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from benchmarks.benchmark_utils import (
+    NUM_DIMS,
+    linear_gaussian_task,
+    trained_inference,
+)
+from sbi.inference import (
+    ImportanceSamplingPosterior,
+    MCMCPosterior,
+    likelihood_estimator_based_potential,
+)
+from sbi.inference.posteriors.serving import PosteriorServer
+
+
+@pytest.mark.parametrize("num_samples", (1000, 100_000))
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_direct_posterior_sample(benchmark, num_dim: int, num_samples: int):
+    _, _, x_o = linear_gaussian_task(num_dim)
+    posterior = trained_inference("SNPE", num_dim).build_posterior()
+
+    benchmark(posterior.sample, (num_samples,), x=x_o, show_progress_bars=False)
+
+
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_direct_posterior_sample_batched(benchmark, num_dim: int):
+    prior, simulator, _ = linear_gaussian_task(num_dim)
+    xs = simulator(prior.sample((100,)))
+    posterior = trained_inference("SNPE", num_dim).build_posterior()
+
+    benchmark(posterior.sample_batched, (1000,), x=xs, show_progress_bars=False)
+
+
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_posterior_server_sample(benchmark, num_dim: int):
+    prior, simulator, _ = linear_gaussian_task(num_dim)
+    xs = simulator(prior.sample((100,)))
+    posterior = trained_inference("SNPE", num_dim).build_posterior()
+
+    async def serve():
+        async with PosteriorServer(posterior) as server:
+            await asyncio.gather(*[server.sample((100,), x=x) for x in xs])
+
+    benchmark(lambda: asyncio.run(serve()))
+
+
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_direct_posterior_log_prob(benchmark, num_dim: int):
+    prior, _, x_o = linear_gaussian_task(num_dim)
+    theta = prior.sample((10_000,))
+    posterior = trained_inference("SNPE", num_dim).build_posterior()
+
+    benchmark(posterior.log_prob, theta, x=x_o, norm_posterior=False)
+
+
+@pytest.mark.parametrize(
+    "method, num_chains",
+    (
+        ("slice_np", 1),
+        ("slice_np_vectorized", 1),
+        ("slice_np_vectorized", 20),
+        ("slice", 1),
+        ("hmc", 1),
+        ("nuts", 1),
+    ),
+)
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_mcmc_posterior_sample(benchmark, num_dim: int, method: str, num_chains):
+    prior, _, x_o = linear_gaussian_task(num_dim)
+    likelihood_estimator = trained_inference("SNLE", num_dim)._neural_net
+    potential_fn, theta_transform = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o
+    )
+
+    def sample():
+        posterior = MCMCPosterior(
+            potential_fn,
+            proposal=prior,
+            theta_transform=theta_transform,
+            method=method,
+            num_chains=num_chains,
+            warmup_steps=50,
+            thin=1,
+        )
+        posterior.sample((200,), show_progress_bars=False)
+
+    benchmark.pedantic(sample, rounds=3)
+
+
+@pytest.mark.parametrize("method", ("sir", "importance"))
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_importance_sampling_posterior_sample(benchmark, num_dim: int, method):
+    prior, _, x_o = linear_gaussian_task(num_dim)
+    likelihood_estimator = trained_inference("SNLE", num_dim)._neural_net
+    potential_fn, theta_transform = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o
+    )
+    posterior = ImportanceSamplingPosterior(
+        potential_fn,
+        proposal=prior,
+        theta_transform=theta_transform,
+        method=method,
+    )
+
+    benchmark(posterior.sample, (1000,))
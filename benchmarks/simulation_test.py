@@ -0,0 +1,24 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import pytest
+
+from benchmarks.benchmark_utils import NUM_DIMS, linear_gaussian_task
+from sbi.inference import simulate_for_sbi
+
+
+@pytest.mark.parametrize("simulation_batch_size", (1, 100, 1000))
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+def test_simulate_for_sbi(benchmark, num_dim: int, simulation_batch_size: int):
+    prior, simulator, _ = linear_gaussian_task(num_dim)
+
+    benchmark(
+        simulate_for_sbi,
+        simulator,
+        prior,
+        num_simulations=1000,
+        simulation_batch_size=simulation_batch_size,
+        show_progress_bar=False,
+    )
@@ -0,0 +1,35 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import pytest
+
+from benchmarks.benchmark_utils import (
+    NUM_DIMS,
+    NUM_TRAINING_SIMULATIONS,
+    linear_gaussian_task,
+    simulations,
+)
+from sbi.inference import SNLE, SNPE, SNRE
+
+
+@pytest.mark.parametrize("training_batch_size", (50, 200, 1000))
+@pytest.mark.parametrize("num_dim", NUM_DIMS)
+@pytest.mark.parametrize("inference_class", (SNPE, SNLE, SNRE))
+def test_training_epoch(
+    benchmark, inference_class, num_dim: int, training_batch_size: int
+):
+    """Time a single training epoch, including building the network."""
+    prior, _, _ = linear_gaussian_task(num_dim)
+    theta, x = simulations(num_dim, NUM_TRAINING_SIMULATIONS)
+
+    def setup():
+        inference = inference_class(prior, show_progress_bars=False)
+        inference.append_simulations(theta, x)
+        return (inference,), {}
+
+    def train(inference):
+        inference.train(max_num_epochs=0, training_batch_size=training_batch_size)
+
+    benchmark.pedantic(train, setup=setup, rounds=5)
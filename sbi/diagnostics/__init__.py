@@ -1 +1,2 @@
+from sbi.diagnostics.coverage import get_expected_coverage, run_coverage
 from sbi.diagnostics.sbc import check_sbc, get_nltp, run_sbc
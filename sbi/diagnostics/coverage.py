@@ -0,0 +1,165 @@
+import warnings
+from typing import Optional, Tuple
+
+import torch
+from torch import Tensor
+
+from sbi.diagnostics.sbc import _run_on_batches, _sample_per_observation
+from sbi.inference import DirectPosterior
+from sbi.inference.posteriors.base_posterior import NeuralPosterior
+
+
+def run_coverage(
+    thetas: Tensor,
+    xs: Tensor,
+    posterior: NeuralPosterior,
+    num_posterior_samples: int = 1000,
+    num_workers: int = 1,
+    coverage_batch_size: int = 1,
+    show_progress_bar: bool = True,
+    use_batched_sampling: bool = True,
+    max_batch_size: int = 100_000,
+) -> Tensor:
+    """Return the HPD levels of ground-truth parameters under the posterior.
+
+    The HPD level of a ground-truth parameter is the fraction of posterior samples with
+    a higher posterior density, i.e., the smallest credibility level of the highest
+    posterior density (HPD) region that contains the parameter. For a calibrated
+    posterior, HPD levels are uniformly distributed in [0, 1], and the expected
+    coverage of every credibility level equals the level, see
+    `get_expected_coverage()`.
+
+    Expected coverage is implemented as proposed in Hermans et al., "A Trust Crisis In
+    Simulation-Based Inference? Your Posterior Approximations Can Be Unfaithful",
+    https://arxiv.org/abs/2110.06581.
+
+    Args:
+        thetas: ground-truth parameters, simulated from the prior.
+        xs: observed data, simulated from thetas.
+        posterior: a posterior obtained from sbi.
+        num_posterior_samples: number of posterior samples used to estimate the HPD
+            level of every ground-truth parameter.
+        num_workers: number of CPU cores to use in parallel for running the
+            observations. Not used for amortized posteriors with batched sampling.
+        coverage_batch_size: number of observations per task of a worker.
+        show_progress_bar: whether to display a progress bar over observations.
+        use_batched_sampling: whether to sample and evaluate the posteriors of all
+            observations in batched calls of the posterior network. Only applies to
+            amortized posteriors, i.e., `DirectPosterior`; other posteriors, e.g.,
+            MCMC posteriors, are run one observation at a time (and in parallel if
+            `num_workers > 1`).
+        max_batch_size: maximal number of posterior samples that are evaluated in one
+            call of the posterior network with batched sampling.
+
+    Returns:
+        HPD levels of shape (num_observations,).
+    """
+    num_observations = thetas.shape[0]
+    if num_posterior_samples < 100:
+        warnings.warn(
+            """Number of posterior samples should be on the order of 100s to give
+            reliable HPD levels.""",
+            stacklevel=2,
+        )
+    assert (
+        thetas.shape[0] == xs.shape[0]
+    ), "Unequal number of parameters and observations."
+
+    if use_batched_sampling and isinstance(posterior, DirectPosterior):
+        # Amortized posterior: sample and evaluate all observations at once.
+        posterior_samples = posterior.sample_batched(
+            (num_posterior_samples,), x=xs, show_progress_bars=show_progress_bar
+        )
+        # Normalization constants do not change the order of densities given one x.
+        x_batch_size = max(1, max_batch_size // (num_posterior_samples + 1))
+        hpd_levels = []
+        for start in range(0, num_observations, x_batch_size):
+            end = start + x_batch_size
+            log_probs = posterior.log_prob_batched(
+                torch.cat((thetas[None, start:end], posterior_samples[:, start:end])),
+                x=xs[start:end],
+                norm_posterior=False,
+            )
+            hpd_levels.append(_hpd_levels(log_probs[0], log_probs[1:]))
+        return torch.cat(hpd_levels)
+
+    hpd_levels = _run_on_batches(
+        coverage_on_batch,
+        thetas,
+        xs,
+        (posterior, num_posterior_samples),
+        batch_size=coverage_batch_size,
+        num_workers=num_workers,
+        show_progress_bar=show_progress_bar,
+    )
+    return torch.cat(hpd_levels)
+
+
+def coverage_on_batch(
+    thetas: Tensor,
+    xs: Tensor,
+    posterior: NeuralPosterior,
+    num_posterior_samples: int,
+) -> Tensor:
+    """Return HPD levels for a batch of ground-truth parameters and data.
+
+    Posterior densities are evaluated with the potential of the posterior, which is
+    the unnormalized log-probability and thus gives the same HPD regions.
+
+    Args:
+        thetas: ground truth parameters.
+        xs: corresponding observations.
+        posterior: sbi posterior.
+        num_posterior_samples: number of samples to draw from the posterior for every
+            observation.
+
+    Returns:
+        HPD levels of the ground truth parameters.
+    """
+    posterior_samples = _sample_per_observation(posterior, xs, num_posterior_samples)
+
+    hpd_levels = torch.zeros(thetas.shape[0])
+    for idx in range(thetas.shape[0]):
+        potentials = posterior.potential(
+            torch.cat((thetas[idx].unsqueeze(0), posterior_samples[:, idx])),
+            x=xs[idx].unsqueeze(0),
+        )
+        hpd_levels[idx] = _hpd_levels(potentials[:1], potentials[1:].unsqueeze(1))
+
+    return hpd_levels
+
+
+def get_expected_coverage(
+    hpd_levels: Tensor, credibility_levels: Optional[Tensor] = None
+) -> Tuple[Tensor, Tensor]:
+    """Return the expected coverage of HPD regions at many credibility levels.
+
+    The expected coverage of a credibility level is the fraction of ground-truth
+    parameters that lie within the HPD region of that level. A calibrated posterior
+    has an expected coverage equal to the credibility level; a coverage below the
+    level indicates an overconfident (overly narrow) posterior, one above the level an
+    underconfident (conservative, overly wide) posterior.
+
+    Args:
+        hpd_levels: HPD levels of ground-truth parameters returned by
+            `run_coverage()`.
+        credibility_levels: credibility levels at which to evaluate the coverage. If
+            None, 101 levels evenly spaced in [0, 1] are used.
+
+    Returns:
+        credibility_levels: the credibility levels.
+        expected_coverage: expected coverage at every credibility level.
+    """
+    if credibility_levels is None:
+        credibility_levels = torch.linspace(0, 1, 101)
+    is_covered = hpd_levels.unsqueeze(1) < credibility_levels.to(hpd_levels)
+    # The HPD region of level 1 covers the entire support.
+    is_covered |= credibility_levels.to(hpd_levels) >= 1
+    return credibility_levels, is_covered.to(torch.float32).mean(dim=0)
+
+
+def _hpd_levels(log_prob_thetas: Tensor, log_prob_samples: Tensor) -> Tensor:
+    """Return the fraction of posterior samples with higher density than the
+    ground-truth parameters, given log-probs of shape (batch,) and (samples, batch).
+    """
+    return (log_prob_samples > log_prob_thetas).to(torch.float32).mean(dim=0)
@@ -1,5 +1,5 @@
 import warnings
-from typing import Callable, Dict, List, Sequence, Tuple, Union
+from typing import Any, Callable, Dict, List, Tuple, Union
 
 import torch
 from joblib import Parallel, delayed
@@ -12,7 +12,7 @@ from sbi.inference import DirectPosterior
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
 from sbi.inference.posteriors.vi_posterior import VIPosterior
 from sbi.simulators.simutils import tqdm_joblib
-from sbi.utils.metrics import c2st
+from sbi.utils.metrics import batched_c2st
 
 
 def run_sbc(
@@ -24,6 +24,7 @@ def run_sbc(
     num_workers: int = 1,
     sbc_batch_size: int = 1,
     show_progress_bar: bool = True,
+    use_batched_sampling: bool = True,
 ) -> Tuple[Tensor, Tensor]:
     """Run simulation-based calibration (SBC) (parallelized across sbc runs).
 
@@ -43,9 +44,13 @@ def run_sbc(
             `marginals`. Sample-based expected coverage can be recovered by setting it
             to `posterior.log_prob` (as a Callable).
         num_workers: number of CPU cores to use in parallel for running num_sbc_samples
-            inferences.
+            inferences. Not used for amortized posteriors with batched sampling.
         sbc_batch_size: batch size for workers.
         show_progress_bar: whether to display a progress over sbc runs.
+        use_batched_sampling: whether to draw the posterior samples of all sbc runs
+            in one batched call of the posterior network. Only applies to amortized
+            posteriors, i.e., `DirectPosterior`; other posteriors are run one
+            observation at a time (and in parallel if `num_workers > 1`).
 
     Returns:
         ranks: ranks of the ground truth parameters under the inferred posterior.
@@ -70,49 +75,27 @@ def run_sbc(
         thetas.shape[0] == xs.shape[0]
     ), "Unequal number of parameters and observations."
 
-    thetas_batches = torch.split(thetas, sbc_batch_size, dim=0)
-    xs_batches = torch.split(xs, sbc_batch_size, dim=0)
-
-    if num_workers != 1:
-        # Parallelize the sequence of batches across workers.
-        # We use the solution proposed here: https://stackoverflow.com/a/61689175
-        # to update the pbar only after the workers finished a task.
-        with tqdm_joblib(
-            tqdm(
-                thetas_batches,
-                disable=not show_progress_bar,
-                desc=f"""Running {num_sbc_samples} sbc runs in {len(thetas_batches)}
-                    batches.""",
-                total=len(thetas_batches),
-            )
-        ) as _:
-            sbc_outputs: Sequence[Tuple[Tensor, Tensor]]
-            sbc_outputs = Parallel(n_jobs=num_workers)(  # pyright: ignore[reportAssignmentType]
-                delayed(sbc_on_batch)(
-                    thetas_batch, xs_batch, posterior, num_posterior_samples
-                )
-                for thetas_batch, xs_batch in zip(thetas_batches, xs_batches)
-            )
-    else:
-        pbar = tqdm(
-            total=num_sbc_samples,
-            disable=not show_progress_bar,
-            desc=f"Running {num_sbc_samples} sbc samples.",
+    if use_batched_sampling and isinstance(posterior, DirectPosterior):
+        # Amortized posterior: sample for all observations at once.
+        posterior_samples = posterior.sample_batched(
+            (num_posterior_samples,),
+            x=xs,
+            show_progress_bars=show_progress_bar,
         )
-
-        with pbar:
-            sbc_outputs = []
-            for thetas_batch, xs_batch in zip(thetas_batches, xs_batches):
-                sbc_outputs.append(
-                    sbc_on_batch(
-                        thetas_batch,
-                        xs_batch,
-                        posterior,
-                        num_posterior_samples,
-                        reduce_fns,
-                    )
-                )
-                pbar.update(sbc_batch_size)
+        ranks = _run_sbc_ranks(thetas, xs, posterior_samples, reduce_fns)
+        # Save one random sample for data average posterior (dap).
+        dap_samples = posterior_samples[0]
+        return ranks, dap_samples
+
+    sbc_outputs = _run_on_batches(
+        sbc_on_batch,
+        thetas,
+        xs,
+        (posterior, num_posterior_samples, reduce_fns),
+        batch_size=sbc_batch_size,
+        num_workers=num_workers,
+        show_progress_bar=show_progress_bar,
+    )
 
     # Aggregate results.
     ranks = []
@@ -157,47 +140,137 @@ def sbc_on_batch(
             i.e., a single sample from each approximate posterior.
     """
 
+    posterior_samples = _sample_per_observation(posterior, xs, num_posterior_samples)
+    ranks = _run_sbc_ranks(thetas, xs, posterior_samples, reduce_fns)
+
+    # Save one random sample for data average posterior (dap).
+    dap_samples = posterior_samples[0]
+
+    return ranks, dap_samples
+
+
+def _run_on_batches(
+    batch_fn: Callable,
+    thetas: Tensor,
+    xs: Tensor,
+    batch_fn_args: Tuple,
+    batch_size: int,
+    num_workers: int,
+    show_progress_bar: bool,
+) -> List[Any]:
+    """Return the outputs of `batch_fn(thetas_batch, xs_batch, *batch_fn_args)` for
+    batches of ground-truth parameters and observations.
+
+    Used by diagnostics that run a posterior on one observation at a time, e.g.,
+    `run_sbc()` and `run_coverage()`. The batches are distributed across
+    `num_workers` processes if `num_workers != 1`.
+    """
+    num_observations = thetas.shape[0]
+    thetas_batches = torch.split(thetas, batch_size, dim=0)
+    xs_batches = torch.split(xs, batch_size, dim=0)
+
+    if num_workers != 1:
+        # Parallelize the sequence of batches across workers.
+        # We use the solution proposed here: https://stackoverflow.com/a/61689175
+        # to update the pbar only after the workers finished a task.
+        with tqdm_joblib(
+            tqdm(
+                thetas_batches,
+                disable=not show_progress_bar,
+                desc=f"""Running {num_observations} observations in
+                    {len(thetas_batches)} batches.""",
+                total=len(thetas_batches),
+            )
+        ) as _:
+            return Parallel(n_jobs=num_workers)(  # pyright: ignore[reportReturnType]
+                delayed(batch_fn)(thetas_batch, xs_batch, *batch_fn_args)
+                for thetas_batch, xs_batch in zip(thetas_batches, xs_batches)
+            )
+
+    pbar = tqdm(
+        total=num_observations,
+        disable=not show_progress_bar,
+        desc=f"Running {num_observations} observations.",
+    )
+    with pbar:
+        outputs = []
+        for thetas_batch, xs_batch in zip(thetas_batches, xs_batches):
+            outputs.append(batch_fn(thetas_batch, xs_batch, *batch_fn_args))
+            pbar.update(thetas_batch.shape[0])
+    return outputs
+
+
+def _sample_per_observation(
+    posterior: NeuralPosterior, xs: Tensor, num_posterior_samples: int
+) -> Tensor:
+    """Return posterior samples of shape (num_posterior_samples, batch,
+    parameter_dim), drawn for one observation at a time."""
+    posterior_samples = []
+    for xo in xs:
+        # unsqueeze for potential higher-dimensional data.
+        xo = xo.unsqueeze(0)
+        # VI posterior needs to be trained on the current xo.
+        if isinstance(posterior, VIPosterior):
+            posterior.set_default_x(xo)
+            posterior.train()
+
+        posterior_samples.append(
+            posterior.sample((num_posterior_samples,), x=xo, show_progress_bars=False)
+        )
+    return torch.stack(posterior_samples, dim=1)
+
+
+def _run_sbc_ranks(
+    thetas: Tensor,
+    xs: Tensor,
+    posterior_samples: Tensor,
+    reduce_fns: Union[str, Callable, List[Callable]],
+) -> Tensor:
+    """Return ranks of the true parameters among the posterior samples.
+
+    Args:
+        thetas: ground truth parameters of shape (num_sbc_runs, parameter_dim).
+        xs: corresponding observations.
+        posterior_samples: posterior samples of shape
+            (num_posterior_samples, num_sbc_runs, parameter_dim).
+        reduce_fns: `marginals` or Callable(s) reducing the parameter space into 1D.
+
+    Returns:
+        ranks of shape (num_sbc_runs, num_reduce_fns).
+    """
     if isinstance(reduce_fns, str):
         assert reduce_fns == "marginals", (
             "`reduce_fn` must either be the string `marginals` or a Callable or a List "
             "of Callables."
         )
-        reduce_fns = [
-            eval(f"lambda theta, x: theta[:, {i}]") for i in range(thetas.shape[1])
-        ]
+        # rank for each posterior dimension as in Talts et al. section 4.1, for all
+        # runs and dimensions at once.
+        return (posterior_samples < thetas.unsqueeze(0)).sum(0).float()
 
     if isinstance(reduce_fns, Callable):
         reduce_fns = [reduce_fns]
 
-    dap_samples = torch.zeros_like(thetas)
     ranks = torch.zeros((thetas.shape[0], len(reduce_fns)))
-
     for idx in range(thetas.shape[0]):
-        # unsqueeze for potential higher-dimensional data.
         xo = xs[idx].unsqueeze(0)
-        # VI posterior needs to be trained on the current xo.
-        if isinstance(posterior, VIPosterior):
-            posterior.set_default_x(xo)
-            posterior.train()
-
-        # Draw posterior samples and save one for the data average posterior.
-        ths = posterior.sample((num_posterior_samples,), x=xo, show_progress_bars=False)
-
-        # Save one random sample for data average posterior (dap).
-        dap_samples[idx] = ths[0]
-
-        # rank for each posterior dimension as in Talts et al. section 4.1.
         for i, reduce_fn in enumerate(reduce_fns):
             ranks[idx, i] = (
-                (reduce_fn(ths, xo) < reduce_fn(thetas[idx].unsqueeze(0), xo))
+                (
+                    reduce_fn(posterior_samples[:, idx], xo)
+                    < reduce_fn(thetas[idx].unsqueeze(0), xo)
+                )
                 .sum()
                 .item()
             )
-
-    return ranks, dap_samples
+    return ranks
 
 
-def get_nltp(thetas: Tensor, xs: Tensor, posterior: NeuralPosterior) -> Tensor:
+def get_nltp(
+    thetas: Tensor,
+    xs: Tensor,
+    posterior: NeuralPosterior,
+    norm_posterior: bool = True,
+) -> Tensor:
     """Return negative log prob of true parameters under the posterior.
 
     NLTP: negative log probs of true parameters under the approximate posterior.
@@ -209,32 +282,35 @@ def get_nltp(thetas: Tensor, xs: Tensor, posterior: NeuralPosterior) -> Tensor:
     settings (even without access to the ground-truth posterior)
 
     Note that this is interpretable only for normalized log probs, i.e., when
-    using (S)NPE.
+    using (S)NPE. For (S)NPE, the log probs of all pairs are evaluated in one batched
+    call of the posterior network.
 
     Args:
         thetas: parameters (sampled from the prior) for which to calculate NLTP values.
         xs: simulated data corresponding to thetas.
         posterior: inferred posterior for which to calculate NLTP.
+        norm_posterior: whether to correct the log probs of (S)NPE posteriors for
+            leakage out of the prior support. The correction factors of all `xs` are
+            estimated in batches, but this requires sampling the posterior network
+            for every `x` and is much more expensive than evaluating the log probs.
+            Pass `False` to skip the correction.
 
     Returns:
         nltp: negative log probs of true parameters under approximate posteriors.
     """
-    nltp = torch.zeros(thetas.shape[0])
-    unnormalized_log_prob = not isinstance(posterior, DirectPosterior)
+    if isinstance(posterior, DirectPosterior):
+        return -posterior.log_prob_batched(thetas, x=xs, norm_posterior=norm_posterior)
 
+    nltp = torch.zeros(thetas.shape[0])
     for idx, (tho, xo) in enumerate(zip(thetas, xs)):
         # Log prob of true params under posterior.
-        if unnormalized_log_prob:
-            nltp[idx] = -posterior.potential(tho, x=xo)
-        else:
-            nltp[idx] = -posterior.log_prob(tho, x=xo)
+        nltp[idx] = -posterior.potential(tho, x=xo)
 
-    if unnormalized_log_prob:
-        warnings.warn(
-            """Note that log probs of the true parameters under the posteriors
-        are not normalized because the posterior used is likelihood-based.""",
-            stacklevel=2,
-        )
+    warnings.warn(
+        """Note that log probs of the true parameters under the posteriors
+    are not normalized because the posterior used is likelihood-based.""",
+        stacklevel=2,
+    )
 
     return nltp
 
@@ -245,6 +321,8 @@ def check_sbc(
     dap_samples: Tensor,
     num_posterior_samples: int = 1000,
     num_c2st_repetitions: int = 1,
+    c2st_backend: str = "sklearn",
+    num_workers: int = 1,
 ) -> Dict[str, Tensor]:
     """Return uniformity checks and data averaged posterior checks for SBC.
 
@@ -255,6 +333,9 @@ def check_sbc(
         dap_samples: N samples from the data averaged posterior
         num_posterior_samples: number of posterior samples used for sbc ranking.
         num_c2st_repetitions: number of times c2st is repeated to estimate robustness.
+        c2st_backend: 'sklearn' to train a random forest for every c2st, or 'torch' to
+            train MLPs for all c2sts at once, see `batched_c2st`.
+        num_workers: number of processes for the c2sts of the 'sklearn' backend.
 
     Returns (all in a dictionary):
         ks_pvals: p-values of the Kolmogorov-Smirnov test of uniformity,
@@ -273,9 +354,15 @@ def check_sbc(
 
     ks_pvals = check_uniformity_frequentist(ranks, num_posterior_samples)
     c2st_ranks = check_uniformity_c2st(
-        ranks, num_posterior_samples, num_repetitions=num_c2st_repetitions
+        ranks,
+        num_posterior_samples,
+        num_repetitions=num_c2st_repetitions,
+        backend=c2st_backend,
+        num_workers=num_workers,
+    )
+    c2st_scores_dap = check_prior_vs_dap(
+        prior_samples, dap_samples, backend=c2st_backend, num_workers=num_workers
     )
-    c2st_scores_dap = check_prior_vs_dap(prior_samples, dap_samples)
 
     return dict(
         ks_pvals=ks_pvals,
@@ -284,10 +371,17 @@ def check_sbc(
     )
 
 
-def check_prior_vs_dap(prior_samples: Tensor, dap_samples: Tensor) -> Tensor:
+def check_prior_vs_dap(
+    prior_samples: Tensor,
+    dap_samples: Tensor,
+    backend: str = "sklearn",
+    num_workers: int = 1,
+) -> Tensor:
     """Returns the c2st accuracy between prior and data avaraged posterior samples.
 
-    c2st is calculated for each dimension separately.
+    c2st is calculated for each dimension separately. With the 'torch' backend, the
+    classifiers of all dimensions are trained at once, see `batched_c2st`. With the
+    'sklearn' backend, the dimensions are distributed across `num_workers` processes.
 
     According to simulation-based calibration, the inference methods is well-calibrated
     if the data averaged posterior samples follow the same distribution as the prior,
@@ -298,10 +392,12 @@ def check_prior_vs_dap(prior_samples: Tensor, dap_samples: Tensor) -> Tensor:
 
     assert prior_samples.shape == dap_samples.shape
 
-    return torch.tensor([
-        c2st(s1.unsqueeze(1), s2.unsqueeze(1))
-        for s1, s2 in zip(prior_samples.T, dap_samples.T)
-    ])
+    return batched_c2st(
+        prior_samples.T.unsqueeze(-1),
+        dap_samples.T.unsqueeze(-1),
+        backend=backend,
+        num_workers=num_workers,
+    )
 
 
 def check_uniformity_frequentist(ranks, num_posterior_samples) -> Tensor:
@@ -330,7 +426,11 @@ def check_uniformity_frequentist(ranks, num_posterior_samples) -> Tensor:
 
 
 def check_uniformity_c2st(
-    ranks, num_posterior_samples, num_repetitions: int = 1
+    ranks,
+    num_posterior_samples,
+    num_repetitions: int = 1,
+    backend: str = "sklearn",
+    num_workers: int = 1,
 ) -> Tensor:
     """Return c2st scores for uniformity of the ranks.
 
@@ -341,24 +441,26 @@ def check_uniformity_c2st(
             shape (N, dim_parameters)
         num_posterior_samples: number of posterior samples used for sbc ranking.
         num_repetitions: repetitions of C2ST tests estimate classifier variance.
+        backend: 'sklearn' to train a random forest for every dimension and
+            repetition, or 'torch' to train MLPs for all of them at once, see
+            `batched_c2st`.
+        num_workers: number of processes for the 'sklearn' backend.
 
     Returns:
         c2st_ranks: C2ST accuracy of between ranks and uniform baseline,
             one for each dim_parameters.
     """
 
-    c2st_scores = torch.tensor([
-        [
-            c2st(
-                rks.unsqueeze(1),
-                Uniform(zeros(1), num_posterior_samples * ones(1)).sample(
-                    torch.Size((ranks.shape[0],))
-                ),
-            )
-            for rks in ranks.T
-        ]
-        for _ in range(num_repetitions)
-    ])
+    num_dims = ranks.shape[1]
+    uniform_samples = Uniform(zeros(1), num_posterior_samples * ones(1)).sample(
+        torch.Size((num_repetitions * num_dims, ranks.shape[0]))
+    )
+    c2st_scores = batched_c2st(
+        ranks.T.unsqueeze(-1).repeat(num_repetitions, 1, 1).to(torch.float32),
+        uniform_samples,
+        backend=backend,
+        num_workers=num_workers,
+    ).reshape(num_repetitions, num_dims)
 
     # Use variance over repetitions to estimate robustness of c2st.
     if (c2st_scores.std(0) > 0.05).any():
@@ -1,65 +1,106 @@
-from typing import (
-    Any,
-    Callable,
-    Dict,
-    List,
-    Optional,
-    Sequence,
-    Tuple,
-    TypeVar,
-    Union,
-    cast,
-)
+from typing import TYPE_CHECKING
 
-from sbi.inference.abc.mcabc import MCABC
-from sbi.inference.abc.smcabc import SMCABC
-from sbi.inference.base import (
-    NeuralInference,  # noqa: F401
-    check_if_proposal_has_default_x,
-    infer,
-    simulate_for_sbi,
-)
-from sbi.inference.snle.mnle import MNLE
-from sbi.inference.snle.snle_a import SNLE_A
-from sbi.inference.snpe.snpe_a import SNPE_A
-from sbi.inference.snpe.snpe_b import SNPE_B
-from sbi.inference.snpe.snpe_c import SNPE_C  # noqa: F401
-from sbi.inference.snre import BNRE, SNRE, SNRE_A, SNRE_B, SNRE_C  # noqa: F401
-from sbi.utils.user_input_checks import prepare_for_sbi
-
-SNL = SNLE = SNLE_A
-_snle_family = ["SNL"]
+from sbi.utils.lazy_imports import lazy_imports
 
+# Algorithms, posteriors and potentials are imported on first use, such that
+# `import sbi.inference` does not load heavy dependencies (e.g. `arviz`, `pyro` or
+# `sklearn`) of the parts that are not used.
+_imports = {
+    "sbi.inference.abc.mcabc": ["MCABC"],
+    "sbi.inference.abc.reference_table_abc": ["ReferenceTableABC"],
+    "sbi.inference.abc.smcabc": ["SMCABC"],
+    "sbi.inference.base": [
+        "NeuralInference",
+        "check_if_proposal_has_default_x",
+        "infer",
+        "simulate_for_sbi",
+    ],
+    "sbi.inference.snle.mnle": ["MNLE"],
+    "sbi.inference.snle.snle_a": ["SNLE_A"],
+    "sbi.inference.snpe.snpe_a": ["SNPE_A"],
+    "sbi.inference.snpe.snpe_b": ["SNPE_B"],
+    "sbi.inference.snpe.snpe_c": ["SNPE_C"],
+    "sbi.inference.snre": ["BNRE", "SNRE_A", "SNRE_B", "SNRE_C"],
+    "sbi.utils.user_input_checks": ["prepare_for_sbi"],
+    "sbi.inference.posteriors.direct_posterior": ["DirectPosterior"],
+    "sbi.inference.posteriors.ensemble_posterior": ["EnsemblePosterior"],
+    "sbi.inference.posteriors.importance_posterior": ["ImportanceSamplingPosterior"],
+    "sbi.inference.posteriors.mcmc_posterior": ["MCMCPosterior"],
+    "sbi.inference.posteriors.rejection_posterior": ["RejectionPosterior"],
+    "sbi.inference.posteriors.vi_posterior": ["VIPosterior"],
+    "sbi.inference.potentials.likelihood_based_potential": [
+        "likelihood_estimator_based_potential",
+        "mixed_likelihood_estimator_based_potential",
+    ],
+    "sbi.inference.potentials.posterior_based_potential": [
+        "posterior_estimator_based_potential",
+    ],
+    "sbi.inference.potentials.ratio_based_potential": [
+        "ratio_estimator_based_potential",
+    ],
+}
+_aliases = {
+    "SNL": "SNLE_A",
+    "SNLE": "SNLE_A",
+    "SNPE": "SNPE_C",
+    "APT": "SNPE_C",
+    "SRE": "SNRE_B",
+    "SNRE": "SNRE_B",
+    "AALR": "SNRE_A",
+    "CNRE": "SNRE_C",
+    "NREC": "SNRE_C",
+    "ABC": "MCABC",
+    "SMC": "SMCABC",
+}
+__getattr__, __dir__ = lazy_imports(__name__, _imports, _aliases)
 
-SNPE = APT = SNPE_C
-_snpe_family = ["SNPE_A", "SNPE_C", "SNPE", "APT"]
+if TYPE_CHECKING:
+    from sbi.inference.abc.mcabc import MCABC
+    from sbi.inference.abc.reference_table_abc import ReferenceTableABC
+    from sbi.inference.abc.smcabc import SMCABC
+    from sbi.inference.base import (
+        NeuralInference,
+        check_if_proposal_has_default_x,
+        infer,
+        simulate_for_sbi,
+    )
+    from sbi.inference.posteriors.direct_posterior import DirectPosterior
+    from sbi.inference.posteriors.ensemble_posterior import EnsemblePosterior
+    from sbi.inference.posteriors.importance_posterior import (
+        ImportanceSamplingPosterior,
+    )
+    from sbi.inference.posteriors.mcmc_posterior import MCMCPosterior
+    from sbi.inference.posteriors.rejection_posterior import RejectionPosterior
+    from sbi.inference.posteriors.vi_posterior import VIPosterior
+    from sbi.inference.potentials.likelihood_based_potential import (
+        likelihood_estimator_based_potential,
+        mixed_likelihood_estimator_based_potential,
+    )
+    from sbi.inference.potentials.posterior_based_potential import (
+        posterior_estimator_based_potential,
+    )
+    from sbi.inference.potentials.ratio_based_potential import (
+        ratio_estimator_based_potential,
+    )
+    from sbi.inference.snle.mnle import MNLE
+    from sbi.inference.snle.snle_a import SNLE_A
+    from sbi.inference.snpe.snpe_a import SNPE_A
+    from sbi.inference.snpe.snpe_b import SNPE_B
+    from sbi.inference.snpe.snpe_c import SNPE_C
+    from sbi.inference.snre import BNRE, SNRE_A, SNRE_B, SNRE_C
+    from sbi.utils.user_input_checks import prepare_for_sbi
 
+    SNL = SNLE = SNLE_A
+    SNPE = APT = SNPE_C
+    SRE = SNRE = SNRE_B
+    AALR = SNRE_A
+    CNRE = NREC = SNRE_C
+    ABC = MCABC
+    SMC = SMCABC
 
-SRE = SNRE_B
-AALR = SNRE_A
-CNRE = NREC = SNRE_C
+_snle_family = ["SNL"]
+_snpe_family = ["SNPE_A", "SNPE_C", "SNPE", "APT"]
 _snre_family = ["SNRE_A", "AALR", "SNRE_B", "SNRE", "SRE", "SNRE_C", "CNRE", "NREC"]
-
-ABC = MCABC
-SMC = SMCABC
-_abc_family = ["ABC", "MCABC", "SMC", "SMCABC"]
-
+_abc_family = ["ABC", "MCABC", "SMC", "SMCABC", "ReferenceTableABC"]
 
 __all__ = _snpe_family + _snre_family + _snle_family + _abc_family
-
-from sbi.inference.posteriors.direct_posterior import DirectPosterior
-from sbi.inference.posteriors.ensemble_posterior import EnsemblePosterior
-from sbi.inference.posteriors.importance_posterior import ImportanceSamplingPosterior
-from sbi.inference.posteriors.mcmc_posterior import MCMCPosterior
-from sbi.inference.posteriors.rejection_posterior import RejectionPosterior
-from sbi.inference.posteriors.vi_posterior import VIPosterior
-from sbi.inference.potentials.likelihood_based_potential import (
-    likelihood_estimator_based_potential,
-    mixed_likelihood_estimator_based_potential,
-)
-from sbi.inference.potentials.posterior_based_potential import (
-    posterior_estimator_based_potential,
-)
-from sbi.inference.potentials.ratio_based_potential import (
-    ratio_estimator_based_potential,
-)
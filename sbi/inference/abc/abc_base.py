@@ -1,14 +1,13 @@
 """Base class for Approximate Bayesian Computation methods."""
 
 import logging
-from typing import Callable, Union
+from itertools import combinations_with_replacement
+from typing import Callable, Tuple, Union
 
-import numpy as np
 import torch
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
 from torch import Tensor
 
+from sbi.inference.abc.distances import Distance
 from sbi.simulators.simutils import simulate_in_batches
 
 
@@ -36,7 +35,8 @@ class ABCBASE:
                 object with `.log_prob()`and `.sample()` (for example, a PyTorch
                 distribution) can be used.
             distance: Distance function to compare observed and simulated data. Can be
-                a custom callable function or one of `l1`, `l2`, `mse`.
+                a custom callable function, a `Distance`, or one of `l1`, `l2`, `mse`,
+                `mahalanobis`, `wasserstein`, `energy`.
             num_workers: Number of parallel workers to use for simulations.
             simulation_batch_size: Number of parameter sets that the simulator
                 maps to data x at once. If None, we simulate all parameter sets at the
@@ -72,8 +72,9 @@ class ABCBASE:
 
         Args:
             distance_type: string indicating the distance type, e.g., 'l2', 'l1',
-                'mse'. Note that the returned distance function averages over the last
-                dimension, e.g., over the summary statistics.
+                'mse', 'mahalanobis', 'wasserstein' or 'energy', see `Distance`. Note
+                that the 'l1' and 'mse' distances average over the data dimensions,
+                e.g., over the summary statistics.
 
         Returns:
             distance_fun: distance functions built from passe string. Returns
@@ -83,43 +84,24 @@ class ABCBASE:
         if isinstance(distance_type, Callable):
             return distance_type
 
-        # Select distance function.
-        implemented_distances = ["l1", "l2", "mse"]
-        assert (
-            distance_type in implemented_distances
-        ), f"{distance_type} must be one of {implemented_distances}."
-
-        def mse_distance(xo, x):
-            return torch.mean((xo - x) ** 2, dim=-1)
-
-        def l2_distance(xo, x):
-            return torch.norm((xo - x), dim=-1)
-
-        def l1_distance(xo, x):
-            return torch.mean(abs(xo - x), dim=-1)
-
-        distance_functions = {"mse": mse_distance, "l2": l2_distance, "l1": l1_distance}
-
-        try:
-            distance = distance_functions[distance_type]
-        except KeyError as exc:
-            raise KeyError(f"Distance {distance_type} not supported.") from exc
-
-        def distance_fun(observed_data: Tensor, simulated_data: Tensor) -> Tensor:
-            """Return distance over batch dimension.
-
-            Args:
-                observed_data: Observed data, could be 1D.
-                simulated_data: Batch of simulated data, has batch dimension.
-
-            Returns:
-                Torch tensor with batch of distances.
-            """
-            assert simulated_data.ndim == 2, "simulated data needs batch dimension"
-
-            return distance(observed_data, simulated_data)
-
-        return distance_fun
+        return Distance(distance_type)
+
+    def _fit_distance(self, x: Tensor) -> None:
+        """Fit the distance on pilot simulations `x` if it requires calibration and
+        has not been fit yet."""
+        if (
+            isinstance(self.distance, Distance)
+            and self.distance.requires_fit
+            and not self.distance.is_fitted
+        ):
+            self.distance.fit(x)
+
+    def _pairwise_distances(self, x_o: Tensor, x: Tensor) -> Tensor:
+        """Return distances of shape (num_observations, num_simulations) between a
+        batch of observations and a batch of simulations."""
+        if isinstance(self.distance, Distance):
+            return self.distance.pairwise(x_o, x)
+        return torch.stack([self.distance(xo.unsqueeze(0), x) for xo in x_o])
 
     @staticmethod
     def get_sass_transform(
@@ -137,24 +119,20 @@ class ABCBASE:
         https://abcpy.readthedocs.io/en/latest/_modules/abcpy/statistics.html#Identity
         and
         https://pythonhosted.org/abcpy/_modules/abcpy/summaryselections.html#Semiautomatic
-        """
-        expansion = PolynomialFeatures(degree=expansion_degree, include_bias=False)
-        # Transform x, remove intercept.
-        x_expanded = expansion.fit_transform(x)
-        sumstats_map = np.zeros((x_expanded.shape[1], theta.shape[1]))
-
-        for parameter_idx in range(theta.shape[1]):
-            regression_model = LinearRegression(fit_intercept=True)
-            regression_model.fit(
-                X=x_expanded, y=theta[:, parameter_idx], sample_weight=sample_weight
-            )
-            sumstats_map[:, parameter_idx] = regression_model.coef_
 
-        sumstats_map = torch.tensor(sumstats_map, dtype=torch.float32)
+        The regression for all parameters is a single weighted least-squares solve in
+        torch, and the returned transform applies the polynomial feature expansion and
+        the regression coefficients as torch operations on the device of its input.
+        """
+        expansion = _polynomial_feature_map(x.shape[1], expansion_degree)
+        # Transform x, the intercept is fit separately.
+        x_expanded = expansion(x)
+        _, sumstats_map = _weighted_least_squares(x_expanded, theta, sample_weight)
+        sumstats_map = sumstats_map.to(torch.float32)
 
         def sumstats_transform(x):
-            x_expanded = torch.tensor(expansion.fit_transform(x), dtype=torch.float32)
-            return x_expanded.mm(sumstats_map)
+            x = torch.as_tensor(x, dtype=torch.float32)
+            return expansion(x).mm(sumstats_map.to(x.device))
 
         return sumstats_transform
 
@@ -168,19 +146,89 @@ class ABCBASE:
         """Return parameters adjusted with linear regression adjustment.
 
         Implementation as in Beaumont et al. 2002: https://arxiv.org/abs/1707.01254
+
+        The regression for all parameters is a single weighted least-squares solve.
+        Note that `theta` is adjusted in place.
         """
 
+        _, coef = _weighted_least_squares(x, theta, sample_weight)
+        # The intercept cancels in the difference of the predictions at the
+        # observation and at the simulations.
+        correction = (observation.reshape(1, -1).to(coef) - x.to(coef)).mm(coef)
         theta_adjusted = theta
-        for parameter_idx in range(theta.shape[1]):
-            regression_model = LinearRegression(fit_intercept=True)
-            regression_model.fit(
-                X=x,
-                y=theta[:, parameter_idx],
-                sample_weight=sample_weight,
-            )
-            theta_adjusted[:, parameter_idx] += regression_model.predict(
-                observation.reshape(1, -1)
-            )
-            theta_adjusted[:, parameter_idx] -= regression_model.predict(x)
+        theta_adjusted += correction.to(theta.dtype)
 
         return theta_adjusted
+
+
+def _polynomial_feature_map(num_features: int, degree: int) -> Callable:
+    """Return function that maps a batch of vectors to their polynomial features.
+
+    The features are all monomials of degree 1 to `degree` (i.e., without bias), in
+    the order of `sklearn.preprocessing.PolynomialFeatures`. The indices of the
+    factors of every monomial are computed once here.
+
+    Args:
+        num_features: Dimensionality of the input vectors.
+        degree: Maximal degree of the monomials.
+
+    Returns:
+        Function that maps a batch of shape (batch, num_features) to its polynomial
+        features of shape (batch, num_monomials).
+    """
+    assert degree >= 1, "The degree of the polynomial features must be at least 1."
+    factor_indices = [
+        torch.tensor(
+            list(combinations_with_replacement(range(num_features), d)),
+            dtype=torch.long,
+        )
+        for d in range(2, degree + 1)
+    ]
+
+    def polynomial_features(x: Tensor) -> Tensor:
+        x = torch.as_tensor(x)
+        monomials = [x] + [x[:, idx.to(x.device)].prod(-1) for idx in factor_indices]
+        return torch.cat(monomials, dim=1)
+
+    return polynomial_features
+
+
+def _weighted_least_squares(
+    x: Tensor, y: Tensor, sample_weight=None
+) -> Tuple[Tensor, Tensor]:
+    """Return intercept and coefficients of a (weighted) linear regression of `y` on
+    `x`, fit jointly for all output dimensions.
+
+    The regression is solved in double precision. As in `sklearn`, the data are
+    centered with their (weighted) means so that the intercept is not penalized in
+    rank-deficient problems.
+
+    Args:
+        x: Regressors of shape (batch, num_features).
+        y: Targets of shape (batch, num_outputs).
+        sample_weight: Optional non-negative weight for every sample.
+
+    Returns:
+        Intercept of shape (num_outputs,) and coefficients of shape
+        (num_features, num_outputs).
+    """
+    x = torch.as_tensor(x).to(torch.float64)
+    y = torch.as_tensor(y).to(device=x.device, dtype=torch.float64)
+    if sample_weight is None:
+        weight = torch.ones(x.shape[0], dtype=torch.float64, device=x.device)
+    else:
+        weight = torch.as_tensor(sample_weight).to(x)
+    weight = weight / weight.sum()
+
+    x_mean = weight @ x
+    y_mean = weight @ y
+    sqrt_weight = weight.sqrt().unsqueeze(1)
+    # `gelsd` handles rank-deficient problems like `sklearn` but is only on the CPU.
+    coef = torch.linalg.lstsq(
+        sqrt_weight * (x - x_mean),
+        sqrt_weight * (y - y_mean),
+        driver="gelsd" if x.device.type == "cpu" else None,
+    ).solution
+    intercept = y_mean - x_mean @ coef
+
+    return intercept, coef
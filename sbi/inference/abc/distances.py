@@ -0,0 +1,229 @@
+"""Distances between observed and simulated data for ABC methods."""
+
+from typing import Dict, Optional
+
+import torch
+from torch import Tensor
+
+
+class Distance:
+    """Batched distance between observed and simulated data."""
+
+    vector_distances = ("l1", "l2", "mse", "mahalanobis")
+    set_distances = ("wasserstein", "energy")
+
+    def __init__(
+        self,
+        distance: str = "l2",
+        scale: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        num_projections: int = 50,
+    ) -> None:
+        r"""Batched distance between observed and simulated data.
+
+        Vector distances (`l1`, `l2`, `mse`, `mahalanobis`) flatten all but the batch
+        dimension, such that time series or images can be compared without
+        flattening them in the simulator. Set distances (`wasserstein`, `energy`)
+        interpret every observation or simulation of shape `(num_samples,)` or
+        `(num_samples, dim)` as an empirical distribution, e.g. of iid outcomes.
+
+        Distances that are calibrated on pilot simulations (`scale="mad"` or
+        `mahalanobis`) have to be fit with `fit()` before use. ABC methods of `sbi`
+        fit them on their first batch of simulations.
+
+        Args:
+            distance: One of `l1` (mean absolute difference), `l2` (Euclidean
+                distance), `mse` (mean squared difference), `mahalanobis` (Euclidean
+                distance after whitening with the covariance of pilot simulations),
+                `wasserstein` (1-Wasserstein distance, sliced with random projections
+                for multivariate samples) or `energy` (energy distance).
+            scale: If `mad`, every data dimension is divided by its median absolute
+                deviation over pilot simulations before computing distances. For set
+                distances, the scale is computed per dimension of the samples.
+            batch_size: Number of simulations for which distances are computed at
+                once. If None, distances to all simulations are computed at once.
+            num_projections: Number of random projections of the sliced Wasserstein
+                distance for multivariate samples.
+        """
+        implemented_distances = self.vector_distances + self.set_distances
+        assert (
+            distance in implemented_distances
+        ), f"{distance} must be one of {implemented_distances}."
+        assert scale in (None, "mad"), "scale must be None or 'mad'."
+
+        self.distance = distance
+        self.scale = scale
+        self.batch_size = batch_size
+        self.num_projections = num_projections
+
+        self._scale = None
+        self._scale_tril = None
+        self._projections = None
+
+    @property
+    def requires_fit(self) -> bool:
+        """Whether the distance has to be fit on pilot simulations."""
+        return self.scale is not None or self.distance == "mahalanobis"
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether the distance has been fit on pilot simulations."""
+        return (self.scale is None or self._scale is not None) and (
+            self.distance != "mahalanobis" or self._scale_tril is not None
+        )
+
+    def fit(self, x: Tensor) -> "Distance":
+        """Fit scales and covariances of the distance on pilot simulations.
+
+        Args:
+            x: Batch of pilot simulations.
+
+        Returns:
+            The fitted distance.
+        """
+        x = self._reshape(x)
+        if self.scale == "mad":
+            # Vector data are scaled per dimension, sets per dimension of the samples.
+            pooled = x if self.distance in self.vector_distances else x.flatten(0, 1)
+            median = pooled.median(dim=0).values
+            mad = (pooled - median).abs().median(dim=0).values
+            self._scale = torch.where(mad > 0, mad, torch.ones_like(mad))
+            x = x / self._scale
+
+        if self.distance == "mahalanobis":
+            covariance = torch.cov(x.T.to(torch.float64)).reshape(
+                x.shape[1], x.shape[1]
+            )
+            jitter = 1e-6 * covariance.diag().mean().clamp(min=1e-12)
+            self._scale_tril = torch.linalg.cholesky(
+                covariance + jitter * torch.eye(x.shape[1], dtype=torch.float64)
+            ).to(x.dtype)
+        return self
+
+    def state_dict(self) -> Dict[str, Optional[Tensor]]:
+        """Return the scales and covariances fit on pilot simulations."""
+        return dict(scale=self._scale, scale_tril=self._scale_tril)
+
+    def load_state_dict(self, state_dict: Dict[str, Optional[Tensor]]) -> None:
+        """Load scales and covariances returned by `state_dict()`."""
+        self._scale = state_dict["scale"]
+        self._scale_tril = state_dict["scale_tril"]
+
+    def __call__(self, observed_data: Tensor, simulated_data: Tensor) -> Tensor:
+        """Return distances between observed data and a batch of simulations.
+
+        Args:
+            observed_data: One or multiple observations with leading batch dimension.
+            simulated_data: Batch of simulated data.
+
+        Returns:
+            Distances of shape `(num_simulations,)` for a single observation, or
+            `(num_observations, num_simulations)` for multiple observations.
+        """
+        distances = self.pairwise(observed_data, simulated_data)
+        return distances[0] if distances.shape[0] == 1 else distances
+
+    def pairwise(self, observed_data: Tensor, simulated_data: Tensor) -> Tensor:
+        """Return distances between every observation and every simulation.
+
+        Args:
+            observed_data: Batch of observations.
+            simulated_data: Batch of simulated data.
+
+        Returns:
+            Distances of shape `(num_observations, num_simulations)`.
+        """
+        assert self.is_fitted, (
+            f"The {self.distance} distance with scale {self.scale} has to be fit on "
+            "pilot simulations with `fit()` first."
+        )
+        if observed_data.ndim == simulated_data.ndim - 1:
+            observed_data = observed_data.unsqueeze(0)
+        # Sets of samples can differ in their number of samples.
+        start = 1 if self.distance in self.vector_distances else 2
+        assert observed_data.shape[start:] == simulated_data.shape[start:], (
+            f"Shape of observed data {tuple(observed_data.shape[1:])} does not match "
+            f"simulated data {tuple(simulated_data.shape[1:])}."
+        )
+        observed_data = self._standardize(self._reshape(observed_data))
+        simulated_data = self._reshape(simulated_data)
+
+        batch_size = self.batch_size or max(simulated_data.shape[0], 1)
+        return torch.cat(
+            [
+                self._pairwise(observed_data, self._standardize(batch))
+                for batch in simulated_data.split(batch_size)
+            ],
+            dim=1,
+        )
+
+    def _reshape(self, x: Tensor) -> Tensor:
+        """Return vector data as `(batch, dim)` and set data as `(batch, samples,
+        dim)`."""
+        if self.distance in self.vector_distances:
+            return x.reshape(x.shape[0], -1)
+        assert x.ndim in (2, 3), (
+            "Set distances require data of shape (batch, num_samples) or "
+            "(batch, num_samples, dim)."
+        )
+        return x.unsqueeze(-1) if x.ndim == 2 else x
+
+    def _standardize(self, x: Tensor) -> Tensor:
+        if self._scale is not None:
+            x = x / self._scale.to(x.device)
+        if self._scale_tril is not None:
+            x = torch.linalg.solve_triangular(
+                self._scale_tril.to(x.device), x.T, upper=False
+            ).T
+        return x
+
+    def _pairwise(self, x_o: Tensor, x: Tensor) -> Tensor:
+        if self.distance == "l1":
+            return torch.cdist(x_o, x, p=1) / x.shape[1]
+        elif self.distance in ("l2", "mahalanobis"):
+            return torch.cdist(x_o, x, compute_mode="donot_use_mm_for_euclid_dist")
+        elif self.distance == "mse":
+            return (
+                torch.cdist(x_o, x, compute_mode="donot_use_mm_for_euclid_dist") ** 2
+                / x.shape[1]
+            )
+        elif self.distance == "wasserstein":
+            return self._wasserstein(x_o, x)
+        else:
+            return self._energy(x_o, x)
+
+    def _wasserstein(self, x_o: Tensor, x: Tensor) -> Tensor:
+        """Return (sliced) 1-Wasserstein distances between sets of samples."""
+        dim = x.shape[2]
+        if dim > 1:
+            if self._projections is None or self._projections.shape[0] != dim:
+                generator = torch.Generator().manual_seed(0)
+                projections = torch.randn(
+                    dim, self.num_projections, generator=generator
+                )
+                self._projections = projections / projections.norm(dim=0)
+            projections = self._projections.to(x)
+            x_o, x = x_o @ projections, x @ projections
+
+        quantiles_o, quantiles = x_o.sort(dim=1).values, x.sort(dim=1).values
+        if quantiles_o.shape[1] != quantiles.shape[1]:
+            # Compare empirical quantile functions on a common grid.
+            num_levels = max(quantiles_o.shape[1], quantiles.shape[1])
+            levels = (torch.arange(num_levels).to(x) + 0.5) / num_levels
+            quantiles_o = torch.quantile(x_o, levels, dim=1).transpose(0, 1)
+            quantiles = torch.quantile(x, levels, dim=1).transpose(0, 1)
+
+        differences = quantiles_o.unsqueeze(1) - quantiles.unsqueeze(0)
+        return differences.abs().mean(dim=(2, 3))
+
+    def _energy(self, x_o: Tensor, x: Tensor) -> Tensor:
+        """Return energy distances between sets of samples."""
+        within_x = torch.cdist(x, x).mean(dim=(1, 2))
+        distances = []
+        for samples_o in x_o:
+            within_o = torch.cdist(samples_o, samples_o).mean()
+            between = torch.cdist(samples_o.expand(x.shape[0], -1, -1), x).mean(
+                dim=(1, 2)
+            )
+            distances.append((2 * between - within_o - within_x).clamp(min=0))
+        return torch.stack(distances)
@@ -7,6 +7,7 @@ from numpy import ndarray
 from torch import Tensor
 
 from sbi.inference.abc.abc_base import ABCBASE
+from sbi.inference.abc.distances import Distance
 from sbi.utils import KDEWrapper, get_kde, process_x
 
 
@@ -38,7 +39,9 @@ class MCABC(ABCBASE):
                 object with `.log_prob()`and `.sample()` (for example, a PyTorch
                 distribution) can be used.
             distance: Distance function to compare observed and simulated data. Can be
-                a custom function or one of `l1`, `l2`, `mse`.
+                a custom function, a `Distance`, or one of `l1`, `l2`, `mse`,
+                `mahalanobis`, `wasserstein`, `energy`. Distances that require pilot
+                simulations are fit on the first batch of simulations.
             num_workers: Number of parallel workers to use for simulations.
             simulation_batch_size: Number of parameter sets that the simulator
                 maps to data x at once. If None, we simulate all parameter sets at the
@@ -70,6 +73,8 @@ class MCABC(ABCBASE):
         kde: bool = False,
         kde_kwargs: Optional[Dict[str, Any]] = None,
         return_summary: bool = False,
+        simulation_chunk_size: Optional[int] = None,
+        resume_from: Optional[Dict[str, Any]] = None,
     ) -> Union[Tuple[Tensor, dict], Tuple[KDEWrapper, dict], Tensor, KDEWrapper]:
         r"""Run MCABC and return accepted parameters or KDE object fitted on them.
 
@@ -98,21 +103,34 @@ class MCABC(ABCBASE):
                 more details
             return_summary: Whether to return the distances and data corresponding to
                 the accepted parameters.
+            simulation_chunk_size: If passed, simulations are run in chunks of this
+                size, and only the accepted parameters, distances and data are kept in
+                memory between chunks (the running top quantile or all simulations
+                within `eps`). If None, all simulations are run at once.
+            resume_from: Summary returned by a previous call with
+                `return_summary=True`. Its accepted simulations are used as the
+                starting point, and `num_simulations` new simulations are added, e.g.,
+                to continue a run that was interrupted or turned out to be too short.
+                For `quantile`, the quantile is taken over the simulations of both
+                calls. The distance fitted in the previous call is reused, and `x_o`
+                has to be the same. Not supported together with `sass`.
 
         Returns:
             theta (if kde False): accepted parameters
             kde (if kde True): KDE object based on accepted parameters from which one
                 can .sample() and .log_prob().
             summary (if summary True): dictionary containing the accepted paramters (if
-                kde True), distances and simulated data x.
+                kde True), distances and simulated data x, the accepted parameters
+                before LRA, the total number of simulations, the observation and the
+                state of the fitted distance, which are used to resume the run.
         """
 
-        # Exactly one of eps or quantile need to be passed.
-        assert (eps is not None) ^ (
-            quantile is not None
-        ), "Eps or quantile must be passed, but not both."
+        if (eps is None) == (quantile is None):
+            raise ValueError("Exactly one of eps or quantile has to be passed.")
         if kde_kwargs is None:
             kde_kwargs = {}
+        if resume_from is not None and sass:
+            raise ValueError("Resuming MCABC is not supported with sass.")
 
         # Run SASS and change the simulator and x_o accordingly.
         if sass:
@@ -137,41 +155,95 @@ class MCABC(ABCBASE):
         else:
             simulator = self._batched_simulator
 
-        # Simulate and calculate distances.
-        theta = self.prior.sample((num_simulations,))
-        x = simulator(theta)
+        if resume_from is None:
+            theta_accepted, distances_accepted, x_accepted = None, None, None
+            num_previous_simulations = 0
+        else:
+            if not torch.equal(
+                process_x(x_o, resume_from["x_o"].shape), resume_from["x_o"]
+            ):
+                raise ValueError("`resume_from` is the summary of a different x_o.")
+            # Restore the fitted distance, such that new distances are on the same
+            # scale as the accepted ones.
+            self.x_o = resume_from["x_o"]
+            self.x_shape = resume_from["x_o"].shape
+            if resume_from["distance_state"] is not None:
+                self.distance.load_state_dict(resume_from["distance_state"])
+            theta_accepted = resume_from["theta_accepted"]
+            distances_accepted = resume_from["distances"]
+            x_accepted = resume_from["x"]
+            num_previous_simulations = resume_from["num_simulations"]
 
-        # Infer shape of x to test and set x_o.
-        self.x_shape = x[0].unsqueeze(0).shape
-        self.x_o = process_x(x_o, self.x_shape)
+        if quantile is not None:
+            num_top_samples = int(
+                (num_previous_simulations + num_simulations) * quantile
+            )
 
-        distances = self.distance(self.x_o, x)
+        if simulation_chunk_size is None:
+            simulation_chunk_size = max(num_simulations, 1)
 
-        # Select based on acceptance threshold epsilon.
-        if eps is not None:
-            is_accepted = distances < eps
-            num_accepted = is_accepted.sum().item()
-            assert num_accepted > 0, f"No parameters accepted, eps={eps} too small"
+        for chunk_start in range(0, num_simulations, simulation_chunk_size):
+            # Simulate and calculate distances.
+            theta = self.prior.sample((
+                min(simulation_chunk_size, num_simulations - chunk_start),
+            ))
+            x = simulator(theta)
 
-            theta_accepted = theta[is_accepted]
-            distances_accepted = distances[is_accepted]
-            x_accepted = x[is_accepted]
+            # Infer shape of x to test and set x_o.
+            if chunk_start == 0 and resume_from is None:
+                self.x_shape = x[0].unsqueeze(0).shape
+                self.x_o = process_x(x_o, self.x_shape)
+                self._fit_distance(x)
 
-        # Select based on quantile on sorted distances.
-        elif quantile is not None:
-            num_top_samples = int(num_simulations * quantile)
-            sort_idx = torch.argsort(distances)
-            theta_accepted = theta[sort_idx][:num_top_samples]
-            distances_accepted = distances[sort_idx][:num_top_samples]
-            x_accepted = x[sort_idx][:num_top_samples]
+            distances = self.distance(self.x_o, x)
 
-        else:
-            raise ValueError("One of epsilon or quantile has to be passed.")
+            # Select based on acceptance threshold epsilon.
+            if eps is not None:
+                is_accepted = distances < eps
+                theta, distances, x = (
+                    theta[is_accepted],
+                    distances[is_accepted],
+                    x[is_accepted],
+                )
+
+            # Merge with previously accepted simulations.
+            if theta_accepted is not None:
+                theta = torch.cat((theta_accepted, theta))
+                distances = torch.cat((distances_accepted, distances))
+                x = torch.cat((x_accepted, x))
+
+            # Select based on quantile on sorted distances.
+            if quantile is not None:
+                top_idx = torch.topk(
+                    distances,
+                    min(num_top_samples, distances.shape[0]),
+                    largest=False,
+                ).indices
+                theta, distances, x = theta[top_idx], distances[top_idx], x[top_idx]
+
+            theta_accepted, distances_accepted, x_accepted = theta, distances, x
+
+        if eps is not None:
+            num_accepted = theta_accepted.shape[0]
+            assert num_accepted > 0, f"No parameters accepted, eps={eps} too small"
+
+        resume_summary = dict(
+            theta_accepted=theta_accepted,
+            num_simulations=num_previous_simulations + num_simulations,
+            x_o=self.x_o,
+            distance_state=(
+                self.distance.state_dict()
+                if isinstance(self.distance, Distance)
+                else None
+            ),
+        )
 
         # Maybe adjust theta with LRA.
         if lra:
             self.logger.info("Running Linear regression adjustment.")
-            final_theta = self.run_lra(theta_accepted, x_accepted, observation=self.x_o)
+            final_theta = self.run_lra(
+                theta_accepted.clone(), x_accepted, observation=self.x_o
+            )
         else:
             final_theta = theta_accepted
 
@@ -189,11 +261,18 @@ class MCABC(ABCBASE):
             if return_summary:
                 return (
                     kde_dist,
-                    dict(theta=final_theta, distances=distances_accepted, x=x_accepted),
+                    dict(
+                        theta=final_theta,
+                        distances=distances_accepted,
+                        x=x_accepted,
+                        **resume_summary,
+                    ),
                 )
             else:
                 return kde_dist
         elif return_summary:
-            return final_theta, dict(distances=distances_accepted, x=x_accepted)
+            return final_theta, dict(
+                distances=distances_accepted, x=x_accepted, **resume_summary
+            )
         else:
             return final_theta
@@ -0,0 +1,325 @@
+"""Approximate Bayesian Computation on a reusable reference table."""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from numpy import ndarray
+from sklearn.neighbors import KDTree
+from torch import Tensor
+
+from sbi.inference.abc.abc_base import ABCBASE
+from sbi.utils.torchutils import atleast_2d
+
+
+class ReferenceTableABC(ABCBASE):
+    """Rejection ABC for many observations on a single table of simulations."""
+
+    def __init__(
+        self,
+        simulator: Callable,
+        prior,
+        distance: Union[str, Callable] = "l2",
+        num_workers: int = 1,
+        simulation_batch_size: int = 1,
+        show_progress_bars: bool = True,
+        index: str = "auto",
+        block_size: int = 100_000,
+    ):
+        r"""Rejection ABC on a reusable reference table of simulations.
+
+        The table of parameters and simulated data is simulated once (or loaded from
+        disk) and indexed for nearest-neighbour search. Afterwards, rejection ABC can be
+        run for any number of observations without running new simulations, see
+        `__call__()`.
+
+        Args:
+            simulator: A function that takes parameters $\theta$ and maps them to
+                simulations, or observations, `x`, $\mathrm{sim}(\theta)\to x$. Any
+                regular Python callable (i.e. function or class with `__call__` method)
+                can be used.
+            prior: A probability distribution that expresses prior knowledge about the
+                parameters, e.g. which ranges are meaningful for them. Any
+                object with `.log_prob()`and `.sample()` (for example, a PyTorch
+                distribution) can be used.
+            distance: Distance function to compare observed and simulated data. Can be
+                a custom function, a `Distance`, or one of `l1`, `l2`, `mse`,
+                `mahalanobis`, `wasserstein`, `energy`. Distances that require pilot
+                simulations are fit on the first batch of simulations.
+            num_workers: Number of parallel workers to use for simulations.
+            simulation_batch_size: Number of parameter sets that the simulator
+                maps to data x at once. If None, we simulate all parameter sets at the
+                same time. If >= 1, the simulator has to process data of shape
+                (simulation_batch_size, parameter_dimension).
+            show_progress_bars: Whether to show a progressbar during simulation and
+                sampling.
+            index: Nearest-neighbour index over the simulated data, one of `kdtree`
+                (a KD-tree, only for `l1`, `l2` and `mse` distances), `brute` (blocked
+                brute-force search, for any distance), or `auto`, which uses a KD-tree
+                whenever possible and the data has at most 20 dimensions.
+            block_size: Number of simulations for which distances are computed at once
+                in brute-force search.
+        """
+
+        super().__init__(
+            simulator=simulator,
+            prior=prior,
+            distance=distance,
+            num_workers=num_workers,
+            simulation_batch_size=simulation_batch_size,
+            show_progress_bars=show_progress_bars,
+        )
+
+        indices = ("auto", "kdtree", "brute")
+        assert (
+            index in indices
+        ), f"Index '{index}' not supported. Choose one from {indices}."
+        if index == "kdtree" and distance not in _KDTREE_METRICS:
+            raise ValueError(
+                f"A KD-tree index requires one of the distances {_KDTREE_METRICS}."
+            )
+        self._index_type = index
+        self._distance_type = distance
+        self.block_size = block_size
+
+        self.theta = None
+        self.x = None
+        self._sass_expansion_degree = None
+        self._sass_transform = None
+        self._summaries = None
+        self._tree = None
+
+    def simulate(
+        self,
+        num_simulations: int,
+        sass: bool = False,
+        sass_expansion_degree: int = 1,
+    ) -> "ReferenceTableABC":
+        """Simulate the reference table and build the nearest-neighbour index.
+
+        Args:
+            num_simulations: Number of simulations in the reference table.
+            sass: Whether to compare observed and simulated data on semi-automatic
+                summary statistics as in Fearnhead & Prangle 2012. The regression is
+                fit on the entire reference table.
+            sass_expansion_degree: Degree of the polynomial feature expansion for the
+                sass regression, default 1 - no expansion.
+
+        Returns:
+            `ReferenceTableABC` object with the reference table and index.
+        """
+        theta = self.prior.sample((num_simulations,))
+        x = self._batched_simulator(theta)
+        return self.set_table(
+            theta, x, sass_expansion_degree=sass_expansion_degree if sass else None
+        )
+
+    def set_table(
+        self,
+        theta: Tensor,
+        x: Tensor,
+        sass_expansion_degree: Optional[int] = None,
+    ) -> "ReferenceTableABC":
+        """Set the reference table and build the nearest-neighbour index.
+
+        Args:
+            theta: Parameters of the reference table, sampled from the prior.
+            x: Simulated data of the reference table.
+            sass_expansion_degree: If passed, semi-automatic summary statistics with
+                this degree of polynomial feature expansion are fit on the table and
+                used to compare observed and simulated data.
+
+        Returns:
+            `ReferenceTableABC` object with the reference table and index.
+        """
+        assert theta.shape[0] == x.shape[0], "theta and x must have the same size."
+        self.theta = theta
+        self.x = x
+        self.x_shape = x[0].unsqueeze(0).shape
+
+        self._sass_expansion_degree = sass_expansion_degree
+        if sass_expansion_degree is not None:
+            self._sass_transform = self.get_sass_transform(
+                theta, x, expansion_degree=sass_expansion_degree
+            )
+            self._summaries = self._sass_transform(x)
+        else:
+            self._sass_transform = None
+            self._summaries = x
+        self._fit_distance(self._summaries)
+
+        # Like the vector distances, the KD-tree compares flattened data.
+        flat_summaries = _flatten(self._summaries)
+        use_kdtree = self._index_type == "kdtree" or (
+            self._index_type == "auto"
+            and self._distance_type in _KDTREE_METRICS
+            and flat_summaries.shape[1] <= 20
+        )
+        self._tree = (
+            KDTree(flat_summaries.numpy(), metric=_KDTREE_METRICS[self._distance_type])
+            if use_kdtree
+            else None
+        )
+        return self
+
+    def save(self, path: str) -> None:
+        """Save the reference table to disk, see `load()`."""
+        assert self.theta is not None, "Simulate the reference table first."
+        torch.save(
+            dict(
+                theta=self.theta,
+                x=self.x,
+                sass_expansion_degree=self._sass_expansion_degree,
+            ),
+            path,
+        )
+
+    def load(self, path: str) -> "ReferenceTableABC":
+        """Load a reference table saved with `save()` and build the index."""
+        table = torch.load(path)
+        return self.set_table(
+            table["theta"],
+            table["x"],
+            sass_expansion_degree=table["sass_expansion_degree"],
+        )
+
+    def __call__(
+        self,
+        x_o: Union[Tensor, ndarray],
+        eps: Optional[float] = None,
+        quantile: Optional[float] = None,
+        lra: bool = False,
+        return_summary: bool = False,
+    ) -> Union[List[Tensor], Tuple[List[Tensor], List[Dict[str, Any]]]]:
+        r"""Run rejection ABC on the reference table for a batch of observations.
+
+        Args:
+            x_o: Batch of observed data, ABC is run independently for every
+                observation.
+            eps: Acceptance threshold $\epsilon$ for distance between observed and
+                simulated data.
+            quantile: Upper quantile of smallest distances for which the corresponding
+                parameters are returned, e.g, q=0.01 will return the top 1%. Exactly
+                one of quantile or `eps` have to be passed.
+            lra: Whether to run linear regression adjustment as in Beaumont et al. 2002
+            return_summary: Whether to return the distances and data corresponding to
+                the accepted parameters.
+
+        Returns:
+            theta: list with the accepted parameters for every observation.
+            summary (if return_summary True): list with a dictionary containing the
+                distances and simulated data x of the accepted parameters for every
+                observation. With sass, the distances are those of the summary
+                statistics, but x is the raw simulated data.
+        """
+        assert self.theta is not None, "Simulate or load the reference table first."
+        # Exactly one of eps or quantile need to be passed.
+        assert (eps is not None) ^ (
+            quantile is not None
+        ), "Eps or quantile must be passed, but not both."
+
+        x_o = atleast_2d(torch.as_tensor(x_o, dtype=torch.float32))
+        assert x_o.shape[1:] == self.x.shape[1:], (
+            f"Observed data shape ({x_o.shape[1:]}) must match the shape of simulated "
+            f"data x ({self.x.shape[1:]})."
+        )
+        summaries_o = x_o if self._sass_transform is None else self._sass_transform(x_o)
+
+        if quantile is not None:
+            num_top_samples = int(self.theta.shape[0] * quantile)
+            if num_top_samples == 0:
+                raise ValueError(
+                    f"quantile={quantile} selects no simulations of the reference "
+                    f"table of size {self.theta.shape[0]}."
+                )
+            candidates = self._nearest_neighbours(summaries_o, num_top_samples)
+        else:
+            candidates = self._within_radius(summaries_o, eps)
+
+        all_theta, all_summaries = [], []
+        for summary_o, idx in zip(summaries_o, candidates):
+            # Compute exact distances with the distance function of the method.
+            distances = self.distance(summary_o.unsqueeze(0), self._summaries[idx])
+            if eps is not None:
+                is_accepted = distances < eps
+                idx, distances = idx[is_accepted], distances[is_accepted]
+            sort_idx = torch.argsort(distances)
+            idx, distances = idx[sort_idx], distances[sort_idx]
+
+            theta = self.theta[idx]
+            if lra:
+                theta = self.run_lra(
+                    theta.clone(), self._summaries[idx], observation=summary_o
+                )
+            all_theta.append(theta)
+            # Distances are computed on the summaries, but the raw data is returned.
+            all_summaries.append(dict(distances=distances, x=self.x[idx]))
+
+        if return_summary:
+            return all_theta, all_summaries
+        else:
+            return all_theta
+
+    def _nearest_neighbours(self, summaries_o: Tensor, k: int) -> List[Tensor]:
+        """Return indices of the `k` nearest simulations for every observation."""
+        if self._tree is not None:
+            _, idx = self._tree.query(_flatten(summaries_o).numpy(), k=k)
+            return [torch.as_tensor(i) for i in idx]
+
+        num_observations = summaries_o.shape[0]
+        top_distances = torch.empty(num_observations, 0)
+        top_idx = torch.empty(num_observations, 0, dtype=torch.long)
+        for block_start in range(0, self._summaries.shape[0], self.block_size):
+            block = self._summaries[block_start : block_start + self.block_size]
+            # Distances of all observations to the block of simulations at once.
+            distances = torch.cat(
+                (top_distances, self._pairwise_distances(summaries_o, block)), dim=1
+            )
+            idx = torch.cat(
+                (
+                    top_idx,
+                    torch.arange(block_start, block_start + block.shape[0]).expand(
+                        num_observations, -1
+                    ),
+                ),
+                dim=1,
+            )
+            top = torch.topk(distances, min(k, distances.shape[1]), largest=False)
+            top_distances, top_idx = top.values, idx.gather(1, top.indices)
+        return list(top_idx)
+
+    def _within_radius(self, summaries_o: Tensor, eps: float) -> List[Tensor]:
+        """Return indices of simulations within `eps` for every observation."""
+        if self._tree is not None:
+            # Radius of the KD-tree metric that corresponds to eps, slightly enlarged
+            # because the distances are checked exactly afterwards.
+            flat_summaries_o = _flatten(summaries_o)
+            num_dim = flat_summaries_o.shape[1]
+            radius = {
+                "l2": eps,
+                "l1": eps * num_dim,
+                "mse": math.sqrt(eps * num_dim),
+            }[self._distance_type]
+            idx = self._tree.query_radius(
+                flat_summaries_o.numpy(), r=radius * (1 + 1e-5)
+            )
+            return [torch.as_tensor(i.astype(np.int64)) for i in idx]
+
+        accepted_idx = []
+        for block_start in range(0, self._summaries.shape[0], self.block_size):
+            block = self._summaries[block_start : block_start + self.block_size]
+            is_accepted = self._pairwise_distances(summaries_o, block) < eps
+            accepted_idx.append([
+                torch.where(accepted)[0] + block_start for accepted in is_accepted
+            ])
+        return [torch.cat(idx) for idx in zip(*accepted_idx)]
+
+
+def _flatten(x: Tensor) -> Tensor:
+    """Return `x` with all but the batch dimension flattened."""
+    return x.reshape(x.shape[0], -1)
+
+
+# KD-tree metrics that are monotone in the distances of `ABCBASE`.
+_KDTREE_METRICS = {"l2": "euclidean", "l1": "manhattan", "mse": "euclidean"}
@@ -1,14 +1,18 @@
 """Sequential Monte Carlo Approximate Bayesian Computation."""
 
+import math
+import os
+import time
 from typing import Any, Callable, Dict, Optional, Tuple, Union
 
 import numpy as np
 import torch
 from numpy import ndarray
 from torch import Tensor
-from torch.distributions import Distribution, Multinomial, MultivariateNormal
+from torch.distributions import Distribution, MultivariateNormal
 
 from sbi.inference.abc.abc_base import ABCBASE
+from sbi.inference.abc.distances import Distance
 from sbi.sbi_types import Array
 from sbi.utils import BoxUniform, KDEWrapper, get_kde, process_x, within_support
 
@@ -51,7 +55,9 @@ class SMCABC(ABCBASE):
                 object with `.log_prob()`and `.sample()` (for example, a PyTorch
                 distribution) can be used.
             distance: Distance function to compare observed and simulated data. Can be
-                a custom function or one of `l1`, `l2`, `mse`.
+                a custom function, a `Distance`, or one of `l1`, `l2`, `mse`,
+                `mahalanobis`, `wasserstein`, `energy`. Distances that require pilot
+                simulations are fit on the first batch of simulations.
             num_workers: Number of parallel workers to use for simulations.
             simulation_batch_size: Number of parameter sets that the simulator
                 maps to data x at once. If None, we simulate all parameter sets at the
@@ -89,6 +95,7 @@ class SMCABC(ABCBASE):
         self.simulation_counter = 0
         self.num_simulations = 0
         self.kernel_variance = None
+        self._acceptance_rate = 1.0
 
         # Define simulator that keeps track of budget.
         def simulate_with_budget(theta):
@@ -105,6 +112,9 @@ class SMCABC(ABCBASE):
         num_simulations: int,
         epsilon_decay: float,
         distance_based_decay: bool = False,
+        ess_based_decay: bool = False,
+        min_acceptance_rate: Optional[float] = None,
+        min_num_particles: Optional[int] = None,
         ess_min: Optional[float] = None,
         kernel_variance_scale: float = 1.0,
         use_last_pop_samples: bool = True,
@@ -117,6 +127,8 @@ class SMCABC(ABCBASE):
         sass: bool = False,
         sass_fraction: float = 0.25,
         sass_expansion_degree: int = 1,
+        checkpoint_path: Optional[str] = None,
+        resume_from: Optional[str] = None,
     ) -> Union[Tensor, KDEWrapper, Tuple[Tensor, dict], Tuple[KDEWrapper, dict]]:
         r"""Run SMCABC and return accepted parameters or KDE object fitted on them.
 
@@ -129,6 +141,19 @@ class SMCABC(ABCBASE):
             distance_based_decay: Whether the $\epsilon$ decay is constant over
                 populations or calculated from the previous populations distribution of
                 distances.
+            ess_based_decay: Whether to choose $\epsilon$ such that the effective
+                sample size of the previous population, reweighted to the new
+                $\epsilon$, is `epsilon_decay` times its current effective sample size
+                (Del Moral et al. 2012). The decay then adapts to how informative the
+                distances of the previous population are.
+            min_acceptance_rate: If passed, stop early once the fraction of
+                simulations accepted into an SMC population (i.e., not the initial
+                population) drops below this rate, instead of spending the remaining
+                budget on ever smaller $\epsilon$ gains.
+            min_num_particles: If passed, the size of a population is reduced (down to
+                `min_num_particles`) when the remaining budget is not expected to
+                suffice for `num_particles` at the current acceptance rate, instead of
+                filling up the population with particles of the previous population.
             ess_min: Threshold of effective sampling size for resampling weights. Not
                 used when None (default).
             kernel_variance_scale: Factor for scaling the perturbation kernel variance.
@@ -156,7 +181,20 @@ class SMCABC(ABCBASE):
             kde_sample_weights: Whether perform weighted KDE with SMC weights or on raw
                 particles.
             return_summary: Whether to return a dictionary with all accepted particles,
-                weights, etc. at the end.
+                weights, etc. at the end. For every population, it also contains the
+                fraction of simulations that were accepted (`acceptance_rates`), the
+                number of simulations (`num_simulations`) and the wall time in seconds
+                (`wall_times`).
+            checkpoint_path: If passed, a checkpoint is written to this file after
+                every population. It contains the summary of all populations so far,
+                the number of simulations used and the random number generator state,
+                such that the run can be continued with `resume_from`. Not supported
+                together with `sass`.
+            resume_from: Path of a checkpoint written with `checkpoint_path`. The run
+                continues after the last population of the checkpoint, and
+                `num_simulations` is the total budget including the simulations that
+                were run before the checkpoint. The remaining arguments should match
+                those of the checkpointed run.
 
         Returns:
             theta (if kde False): accepted parameters of the last population.
@@ -169,9 +207,15 @@ class SMCABC(ABCBASE):
 
         pop_idx = 0
         self.num_simulations = num_simulations
+        self._acceptance_rate = 1.0
         if kde_kwargs is None:
             kde_kwargs = {}
         assert isinstance(epsilon_decay, float) and epsilon_decay > 0.0
+        assert not (
+            distance_based_decay and ess_based_decay
+        ), "Only one of distance_based_decay and ess_based_decay can be used."
+        if sass and (checkpoint_path is not None or resume_from is not None):
+            raise ValueError("Checkpointing SMCABC is not supported with sass.")
 
         # Pilot run for SASS.
         if sass:
@@ -191,33 +235,94 @@ class SMCABC(ABCBASE):
 
             self._simulate_with_budget = sass_simulator
 
-        # run initial population
-        particles, epsilon, distances, x = self._set_xo_and_sample_initial_population(
-            x_o, num_particles, num_initial_pop
+        if resume_from is None:
+            # run initial population
+            start_time = time.time()
+            num_simulations_before = self.simulation_counter
+            particles, epsilon, distances, x = (
+                self._set_xo_and_sample_initial_population(
+                    x_o, num_particles, num_initial_pop
+                )
+            )
+            log_weights = torch.log(1 / num_particles * torch.ones(num_particles))
+
+            self.logger.info((
+                "population=%s, eps=%s, ess=%s, num_sims=%s",
+                pop_idx,
+                epsilon,
+                1.0,
+                num_initial_pop,
+            ))
+
+            all_particles = [particles]
+            all_log_weights = [log_weights]
+            all_distances = [distances]
+            all_epsilons = [epsilon]
+            all_x = [x]
+            all_acceptance_rates = [num_particles / num_initial_pop]
+            all_num_simulations = [self.simulation_counter - num_simulations_before]
+            all_wall_times = [time.time() - start_time]
+        else:
+            checkpoint = self._load_checkpoint(resume_from, x_o)
+            all_particles = checkpoint["particles"]
+            all_log_weights = checkpoint["weights"]
+            all_distances = checkpoint["distances"]
+            all_epsilons = checkpoint["epsilons"]
+            all_x = checkpoint["xs"]
+            all_acceptance_rates = checkpoint["acceptance_rates"]
+            all_num_simulations = checkpoint["num_simulations"]
+            all_wall_times = checkpoint["wall_times"]
+            pop_idx = len(all_particles) - 1
+            epsilon = all_epsilons[-1]
+            self.logger.info(
+                "Resuming from population=%s, num_sims=%s.",
+                pop_idx,
+                self.simulation_counter,
+            )
+
+        summary = dict(
+            particles=all_particles,
+            weights=all_log_weights,
+            epsilons=all_epsilons,
+            distances=all_distances,
+            xs=all_x,
+            acceptance_rates=all_acceptance_rates,
+            num_simulations=all_num_simulations,
+            wall_times=all_wall_times,
         )
-        log_weights = torch.log(1 / num_particles * torch.ones(num_particles))
-
-        self.logger.info((
-            "population=%s, eps=%s, ess=%s, num_sims=%s",
-            pop_idx,
-            epsilon,
-            1.0,
-            num_initial_pop,
-        ))
-
-        all_particles = [particles]
-        all_log_weights = [log_weights]
-        all_distances = [distances]
-        all_epsilons = [epsilon]
-        all_x = [x]
+        if checkpoint_path is not None:
+            self._save_checkpoint(checkpoint_path, summary)
 
         while self.simulation_counter < self.num_simulations:
+            # The rate of the initial population is the fraction of prior samples
+            # selected as particles, not an acceptance rate at epsilon.
+            if (
+                min_acceptance_rate is not None
+                and pop_idx >= 1
+                and all_acceptance_rates[-1] < min_acceptance_rate
+            ):
+                self.logger.info(
+                    "Acceptance rate %s below %s, stopping.",
+                    all_acceptance_rates[-1],
+                    min_acceptance_rate,
+                )
+                break
+
             pop_idx += 1
+            start_time = time.time()
+            num_simulations_before = self.simulation_counter
             # Decay based on quantile of distances from previous pop.
             if distance_based_decay:
                 epsilon = self._get_next_epsilon(
                     all_distances[pop_idx - 1], epsilon_decay
                 )
+            # Decay based on effective sample size of previous pop.
+            elif ess_based_decay:
+                epsilon = self._get_next_epsilon_from_ess(
+                    all_distances[pop_idx - 1],
+                    all_log_weights[pop_idx - 1],
+                    epsilon_decay,
+                )
             # Constant decay.
             else:
                 epsilon *= epsilon_decay
@@ -236,6 +341,9 @@ class SMCABC(ABCBASE):
                 epsilon=epsilon,
                 x=all_x[pop_idx - 1],
                 use_last_pop_samples=use_last_pop_samples,
+                num_particles=self._get_next_num_particles(
+                    num_particles, min_num_particles
+                ),
             )
 
             # Resample population if effective sampling size is too small.
@@ -257,6 +365,11 @@ class SMCABC(ABCBASE):
             all_distances.append(distances)
             all_epsilons.append(epsilon)
             all_x.append(x)
+            all_acceptance_rates.append(self._population_acceptance_rate)
+            all_num_simulations.append(self.simulation_counter - num_simulations_before)
+            all_wall_times.append(time.time() - start_time)
+            if checkpoint_path is not None:
+                self._save_checkpoint(checkpoint_path, summary)
 
         # Maybe run LRA and adjust weights.
         if lra:
@@ -287,33 +400,51 @@ class SMCABC(ABCBASE):
             kde_dist = get_kde(final_particles, **kde_kwargs)
 
             if return_summary:
-                return (
-                    kde_dist,
-                    dict(
-                        particles=all_particles,
-                        weights=all_log_weights,
-                        epsilons=all_epsilons,
-                        distances=all_distances,
-                        xs=all_x,
-                    ),
-                )
+                return kde_dist, summary
             else:
                 return kde_dist
 
         if return_summary:
-            return (
-                final_particles,
-                dict(
-                    particles=all_particles,
-                    weights=all_log_weights,
-                    epsilons=all_epsilons,
-                    distances=all_distances,
-                    xs=all_x,
-                ),
-            )
+            return final_particles, summary
         else:
             return final_particles
 
+    def _save_checkpoint(self, path: str, summary: Dict[str, Any]) -> None:
+        """Write the summary of all populations so far and the sampler state to
+        `path`, see `_load_checkpoint()`."""
+        checkpoint = dict(
+            summary,
+            x_o=self.x_o,
+            simulation_counter=self.simulation_counter,
+            acceptance_rate=self._acceptance_rate,
+            rng_state=torch.get_rng_state(),
+            distance_state=(
+                self.distance.state_dict()
+                if isinstance(self.distance, Distance)
+                else None
+            ),
+        )
+        # Write to a temporary file first such that an interruption while writing
+        # does not corrupt the previous checkpoint.
+        torch.save(checkpoint, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def _load_checkpoint(self, path: str, x_o: Array) -> Dict[str, Any]:
+        """Restore the sampler state from a checkpoint written by `_save_checkpoint()`
+        and return it."""
+        checkpoint = torch.load(path)
+        if not torch.equal(process_x(x_o, checkpoint["x_o"].shape), checkpoint["x_o"]):
+            raise ValueError("The checkpoint was written for a different x_o.")
+
+        self.x_o = checkpoint["x_o"]
+        self.x_shape = checkpoint["x_o"].shape
+        self.simulation_counter = checkpoint["simulation_counter"]
+        self._acceptance_rate = checkpoint["acceptance_rate"]
+        if checkpoint["distance_state"] is not None:
+            self.distance.load_state_dict(checkpoint["distance_state"])
+        torch.set_rng_state(checkpoint["rng_state"])
+        return checkpoint
+
     def _set_xo_and_sample_initial_population(
         self,
         x_o: Array,
@@ -332,14 +463,15 @@ class SMCABC(ABCBASE):
         # Infer x shape to test and set x_o.
         self.x_shape = x[0].unsqueeze(0).shape
         self.x_o = process_x(x_o, self.x_shape)
+        self._fit_distance(x)
 
         distances = self.distance(self.x_o, x)
         sortidx = torch.argsort(distances)
         particles = theta[sortidx][:num_particles]
         # Take last accepted distance as epsilon.
-        initial_epsilon = distances[sortidx][num_particles - 1]
+        initial_epsilon = distances[sortidx][num_particles - 1].item()
 
-        if not torch.isfinite(initial_epsilon):
+        if not math.isfinite(initial_epsilon):
             initial_epsilon = 1e8
 
         return (
@@ -357,8 +489,18 @@ class SMCABC(ABCBASE):
         epsilon: float,
         x: Tensor,
         use_last_pop_samples: bool = True,
+        num_particles: Optional[int] = None,
     ) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
-        """Return particles, weights and distances of new population."""
+        """Return particles, weights and distances of new population.
+
+        Candidates are proposed and simulated in batches. The size of every batch is
+        the number of particles that are still needed divided by the acceptance rate
+        observed so far (starting from the rate of the previous population), such
+        that usually a single batch is needed and all simulation workers are busy.
+
+        The size of the new population is `num_particles`, or the size of the previous
+        population if None.
+        """
 
         new_particles = []
         new_log_weights = []
@@ -366,12 +508,16 @@ class SMCABC(ABCBASE):
         new_x = []
 
         num_accepted_particles = 0
-        num_particles = particles.shape[0]
+        if num_particles is None:
+            num_particles = particles.shape[0]
+        num_proposed_particles = 0
+        num_candidates_within_epsilon = 0
 
         while num_accepted_particles < num_particles:
+            num_remaining = num_particles - num_accepted_particles
             # Upperbound for batch size to not exceed simulation budget.
             num_batch = min(
-                num_particles - num_accepted_particles,
+                math.ceil(num_remaining / self._acceptance_rate),
                 self.num_simulations - self.simulation_counter,
             )
 
@@ -382,9 +528,21 @@ class SMCABC(ABCBASE):
             # Simulate and select based on distance.
             x_candidates = self._simulate_with_budget(particle_candidates)
             dists = self.distance(self.x_o, x_candidates)
-            is_accepted = dists <= epsilon
+            is_within_epsilon = dists <= epsilon
+            # Candidates are iid, so taking the first accepted ones does not bias the
+            # population.
+            is_accepted = torch.zeros_like(dists, dtype=torch.bool)
+            is_accepted[torch.where(is_within_epsilon)[0][:num_remaining]] = True
             num_accepted_batch = is_accepted.sum().item()
 
+            # Update the acceptance rate with all candidates of this population,
+            # including the accepted ones that exceed the population size.
+            num_proposed_particles += num_batch
+            num_candidates_within_epsilon += is_within_epsilon.sum().item()
+            self._acceptance_rate = max(num_candidates_within_epsilon, 1) / max(
+                num_proposed_particles, 1
+            )
+
             if num_accepted_batch > 0:
                 new_particles.append(particle_candidates[is_accepted])
                 new_log_weights.append(
@@ -435,6 +593,10 @@ class SMCABC(ABCBASE):
 
                 break
 
+        self._population_acceptance_rate = num_candidates_within_epsilon / max(
+            num_proposed_particles, 1
+        )
+
         # collect lists of tensors into tensors
         new_particles = torch.cat(new_particles)
         new_log_weights = torch.cat(new_log_weights)
@@ -486,46 +648,130 @@ class SMCABC(ABCBASE):
         # The new epsilon is given by that distance.
         return distances[qidx].item()
 
+    def _get_next_epsilon_from_ess(
+        self, distances: Tensor, log_weights: Tensor, ess_fraction: float
+    ) -> float:
+        """Return epsilon for next round based on the effective sample size (ESS).
+
+        Following Del Moral et al. 2012, the new epsilon is the smallest distance of
+        this round for which the ESS of this round's population, with the weights of
+        particles beyond the new epsilon set to zero, is at least `ess_fraction` times
+        the ESS of this round's population.
+
+        Args:
+            distances: The distances accepted in this round.
+            log_weights: The log weights of the particles of this round.
+            ess_fraction: Fraction of the current ESS to be kept.
+
+        Returns:
+            epsilon: Epsilon for the next population.
+        """
+        sort_idx = torch.argsort(distances)
+        weights = torch.exp(log_weights[sort_idx])
+        # ESS of the population restricted to the k smallest distances, for every k.
+        ess = torch.cumsum(weights, dim=0) ** 2 / torch.cumsum(weights**2, dim=0)
+        qidx = torch.where(ess >= ess_fraction * ess[-1])[0][0]
+        return distances[sort_idx][qidx].item()
+
+    def _get_next_num_particles(
+        self, num_particles: int, min_num_particles: Optional[int]
+    ) -> int:
+        """Return the size of the next population.
+
+        If `min_num_particles` is passed, the population is reduced to the number of
+        particles that the remaining simulation budget is expected to yield at the
+        current acceptance rate, but to no fewer than `min_num_particles`.
+        """
+        if min_num_particles is None:
+            return num_particles
+        num_affordable = int(
+            (self.num_simulations - self.simulation_counter) * self._acceptance_rate
+        )
+        return max(min_num_particles, min(num_particles, num_affordable))
+
     def _calculate_new_log_weights(
         self,
         new_particles: Tensor,
         old_particles: Tensor,
         old_log_weights: Tensor,
+        max_batch_size: int = 2**24,
     ) -> Tensor:
-        """Return new log weights following formulas in publications A,B anc C."""
+        """Return new log weights following formulas in publications A,B anc C.
+
+        The kernel log probs of all pairs of new and old particles are computed in
+        chunks of new particles, such that at most `max_batch_size` elements are held
+        in memory at once.
+        """
 
         # Prior can be batched across new particles.
         prior_log_probs = self.prior.log_prob(new_particles)
 
-        # Contstruct function to get kernel log prob for given old particle.
         # The kernel is centered on each old particle as in all three variants (A,B,C).
-        def kernel_log_prob(new_particle):
-            return self.get_new_kernel(old_particles).log_prob(new_particle)
-
-        # We still have to loop over particles here because
-        # the kernel log probs are already batched across old particles.
-        log_weighted_sum = torch.tensor(
-            [
-                torch.logsumexp(old_log_weights + kernel_log_prob(new_particle), dim=0)
-                for new_particle in new_particles
-            ],
-            dtype=torch.float32,
-        )
+        num_old, num_dim = old_particles.shape
+        chunk_size = max(1, max_batch_size // (num_old * num_dim))
+        log_weighted_sum = torch.cat([
+            torch.logsumexp(
+                old_log_weights + self._kernel_log_probs(new_chunk, old_particles),
+                dim=1,
+            )
+            for new_chunk in new_particles.split(chunk_size)
+        ])
         # new weights are prior probs over weighted sum:
         return prior_log_probs - log_weighted_sum
 
+    def _kernel_log_probs(self, new_particles: Tensor, old_particles: Tensor) -> Tensor:
+        """Return `(num_new, num_old)` log probs of the new particles under the kernels
+        centered on the old particles, i.e., the log probs of
+        `self.get_new_kernel(old_particles)` for every new particle.
+        """
+        assert self.kernel_variance is not None, "get kernel variance first."
+
+        if self.kernel == "gaussian":
+            # Whiten the particles such that the Mahalanobis distance under the kernel
+            # covariance becomes the euclidean distance.
+            scale_tril = torch.linalg.cholesky(self.kernel_variance)
+            whitened_new, whitened_old = (
+                torch.linalg.solve_triangular(scale_tril, particles.T, upper=False).T
+                for particles in (new_particles, old_particles)
+            )
+            squared_distances = (
+                torch.cdist(
+                    whitened_new,
+                    whitened_old,
+                    compute_mode="donot_use_mm_for_euclid_dist",
+                )
+                ** 2
+            )
+            log_normalizer = (
+                0.5 * new_particles.shape[1] * math.log(2 * math.pi)
+                + scale_tril.diagonal().log().sum()
+            )
+            return -0.5 * squared_distances - log_normalizer
+
+        elif self.kernel == "uniform":
+            # The kernel is uniform on [old - variance, old + variance).
+            differences = new_particles.unsqueeze(1) - old_particles.unsqueeze(0)
+            within_kernel = (
+                (differences >= -self.kernel_variance)
+                & (differences < self.kernel_variance)
+            ).all(dim=-1)
+            log_normalizer = torch.log(2 * self.kernel_variance).sum()
+            return torch.where(
+                within_kernel,
+                -log_normalizer,
+                torch.tensor(float("-inf"), dtype=new_particles.dtype),
+            )
+        else:
+            raise ValueError(f"Kernel, '{self.kernel}' not supported.")
+
     @staticmethod
     def sample_from_population_with_weights(
         particles: Tensor, weights: Tensor, num_samples: int = 1
     ) -> Tensor:
         """Return samples from particles sampled with weights."""
 
-        # define multinomial with weights as probs
-        multi = Multinomial(probs=weights)
-        # sample num samples, with replacement
-        samples = multi.sample(sample_shape=torch.Size((num_samples,)))
-        # get indices of success trials
-        indices = torch.where(samples)[1]
+        # sample num samples, with replacement, with weights as probs
+        indices = torch.multinomial(weights, num_samples, replacement=True)
         # return those indices from trace
         return particles[indices]
 
@@ -534,24 +780,32 @@ class SMCABC(ABCBASE):
     ) -> Tensor:
         """Sample and perturb batch of new parameters from trace.
 
-        Reject sampled and perturbed parameters outside of prior.
+        Reject sampled and perturbed parameters outside of prior. Every round
+        oversamples by the fraction of perturbed parameters within the prior observed
+        so far.
         """
 
         num_accepted = 0
+        num_proposed = 0
+        within_prior_rate = 1.0
         parameters = []
         while num_accepted < num_samples:
+            num_remaining = num_samples - num_accepted
+            num_proposals = math.ceil(num_remaining / within_prior_rate)
             parms = self.sample_from_population_with_weights(
-                particles, weights, num_samples=num_samples - num_accepted
+                particles, weights, num_samples=num_proposals
             )
 
             # Create kernel on params and perturb.
             parms_perturbed = self.get_new_kernel(parms).sample()
 
             is_within_prior = within_support(self.prior, parms_perturbed)
-            num_accepted += int(is_within_prior.sum().item())
+            parms_accepted = parms_perturbed[is_within_prior][:num_remaining]
+            parameters.append(parms_accepted)
+            num_accepted += parms_accepted.shape[0]
 
-            if num_accepted > 0:
-                parameters.append(parms_perturbed[is_within_prior])
+            num_proposed += num_proposals
+            within_prior_rate = max(num_accepted, 1) / num_proposed
 
         return torch.cat(parameters)
 
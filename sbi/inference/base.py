@@ -1,15 +1,20 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
+import multiprocessing
+import tempfile
+import time
 from abc import ABC, abstractmethod
 from copy import deepcopy
-from datetime import datetime
+from datetime import datetime, timedelta
+from multiprocessing.process import BaseProcess
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from warnings import warn
 
 import torch
-from torch import Tensor
+import torch.distributed as dist
+from torch import Tensor, nn, optim
 from torch.distributions import Distribution
 from torch.utils import data
 from torch.utils.data.sampler import SubsetRandomSampler
@@ -17,6 +22,7 @@ from torch.utils.tensorboard.writer import SummaryWriter
 
 import sbi.inference
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
+from sbi.inference.posteriors.ensemble_posterior import EnsemblePosterior
 from sbi.simulators.simutils import simulate_in_batches
 from sbi.utils import (
     check_prior,
@@ -26,6 +32,7 @@ from sbi.utils import (
     nle_nre_apt_msg_on_invalid_x,
     validate_theta_and_x,
     warn_if_zscoring_changes_data,
+    x_shape_from_simulation,
 )
 from sbi.utils.sbiutils import get_simulations_since_round
 from sbi.utils.torchutils import check_if_prior_on_device, process_device
@@ -160,6 +167,14 @@ class NeuralInference(ABC):
         self._x_roundwise = []
         self._prior_masks = []
         self._model_bank = []
+        # Maximal number of posteriors that are kept in `_model_bank`: all if None,
+        # none if 0. Posteriors share their networks with the returned posteriors.
+        self.max_model_bank_size: Optional[int] = 1
+        # Whether `_neural_net` was returned or is used by a posterior, such that it
+        # has to be copied before it is trained further.
+        self._neural_net_is_shared = False
+        # Whether this object is training as one process of `train_data_parallel()`.
+        self._data_parallel = False
 
         # Initialize list that indicates the round from which simulations were drawn.
         self._data_round_index = []
@@ -298,6 +313,339 @@ class NeuralInference(ABC):
     ) -> NeuralPosterior:
         raise NotImplementedError
 
+    def train_ensemble(
+        self,
+        num_members: int,
+        training_batch_size: int = 50,
+        learning_rate: float = 5e-4,
+        validation_fraction: float = 0.1,
+        stop_after_epochs: int = 20,
+        max_num_epochs: int = 2**31 - 1,
+        clip_max_norm: Optional[float] = 5.0,
+        show_train_summary: bool = False,
+        loss_kwargs: Optional[Dict[str, Any]] = None,
+        build_posterior_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> EnsemblePosterior:
+        r"""Train an ensemble of independently initialized networks in one process.
+
+        All members are trained on the appended simulations, using the same split into
+        training and validation data. Each member is initialized independently and
+        sees its own shuffle of the training data in every epoch. The parameters of
+        all members are stacked such that, whenever the network supports it, the loss
+        of all members is evaluated in a single vectorized call (`torch.func.vmap`).
+        Networks that can not be vectorized (e.g. because they use data-dependent
+        indexing) are evaluated member by member, still sharing a single optimizer.
+
+        Early stopping is done for every member separately: each member is reset to
+        the state with the best validation performance, and training stops once all
+        members have converged.
+
+        Args:
+            num_members: Number of networks in the ensemble.
+            training_batch_size: Training batch size.
+            learning_rate: Learning rate for Adam optimizer.
+            validation_fraction: The fraction of data to use for validation.
+            stop_after_epochs: The number of epochs to wait for improvement on the
+                validation set before terminating training of a member.
+            max_num_epochs: Maximum number of epochs to run. If reached, we stop
+                training even when the validation loss is still decreasing.
+            clip_max_norm: Value at which to clip the total gradient norm of each
+                member in order to prevent exploding gradients. Use None for no
+                clipping.
+            show_train_summary: Whether to print the number of epochs and validation
+                loss after the training.
+            loss_kwargs: Additional kwargs passed to the loss of the method, e.g.
+                `num_atoms` for SNRE.
+            build_posterior_kwargs: Additional kwargs passed to `.build_posterior()`
+                for every member.
+
+        Returns:
+            `EnsemblePosterior` with uniformly weighted members.
+        """
+        from torch.func import functional_call, stack_module_state, vmap
+
+        self._round = max(self._data_round_index)
+        loss_kwargs = loss_kwargs or {}
+        build_posterior_kwargs = build_posterior_kwargs or {}
+
+        _, val_loader = self.get_dataloaders(
+            0, training_batch_size, validation_fraction
+        )
+        theta, x, _ = self.get_simulations()
+        self._x_shape = x_shape_from_simulation(x.to("cpu"))
+
+        # Use only training data for building the neural nets (z-scoring transforms).
+        nets = [
+            self._build_neural_net(
+                theta[self.train_indices].to("cpu"), x[self.train_indices].to("cpu")
+            ).to(self._device)
+            for _ in range(num_members)
+        ]
+
+        # `_EnsembleMemberLoss` evaluates the loss of `self._neural_net`. Its
+        # parameters are swapped for those of a member by `functional_call`.
+        self._neural_net = deepcopy(nets[0])
+        loss_module = _EnsembleMemberLoss(
+            self._neural_net, lambda t, x_: self._ensemble_loss(t, x_, **loss_kwargs)
+        )
+        params, buffers = stack_module_state(nets)  # type: ignore
+        params = {f"net.{k}": v for k, v in params.items()}
+        buffers = {f"net.{k}": v for k, v in buffers.items()}
+
+        def member_loss(p, b, theta_batch, x_batch):
+            return functional_call(loss_module, (p, b), (theta_batch, x_batch))
+
+        use_vmap = True
+
+        def member_losses(theta_batch, x_batch, batched_data: bool) -> Tensor:
+            nonlocal use_vmap
+            in_dims = 0 if batched_data else None
+            vmap_error = None
+            if use_vmap:
+                try:
+                    return vmap(
+                        member_loss,
+                        in_dims=(0, 0, in_dims, in_dims),
+                        randomness="different",
+                    )(params, buffers, theta_batch, x_batch)
+                except RuntimeError as err:
+                    vmap_error = err
+            losses = []
+            for m in range(num_members):
+                losses.append(
+                    member_loss(
+                        {k: v[m] for k, v in params.items()},
+                        {k: v[m] for k, v in buffers.items()},
+                        theta_batch[m] if batched_data else theta_batch,
+                        x_batch[m] if batched_data else x_batch,
+                    )
+                )
+            if vmap_error is not None:
+                # Errors that are not caused by `vmap` are raised by the loop above.
+                use_vmap = False
+                warn(
+                    "The density estimator can not be vectorized with `vmap`, so the "
+                    "ensemble members are trained one after the other, which is "
+                    f"slower. `vmap` raised: {vmap_error}",
+                    stacklevel=3,
+                )
+            return torch.stack(losses)
+
+        optimizer = optim.Adam(list(params.values()), lr=learning_rate)
+
+        best_params = {k: v.detach().clone() for k, v in params.items()}
+        best_val_log_prob = torch.full((num_members,), float("-Inf"))
+        epochs_since_last_improvement = torch.zeros(num_members, dtype=torch.long)
+        converged = torch.zeros(num_members, dtype=torch.bool)
+
+        num_training_examples = len(self.train_indices)
+        batch_size = min(training_batch_size, num_training_examples)
+        num_batches = num_training_examples // batch_size
+
+        epoch = 0
+        while epoch <= max_num_epochs and not converged.all():
+            # Train for a single epoch.
+            loss_module.train()
+            train_log_probs_sum = torch.zeros(num_members)
+            epoch_start_time = time.time()
+            permutations = torch.stack([
+                self.train_indices[torch.randperm(num_training_examples)]
+                for _ in range(num_members)
+            ])
+            for i in range(num_batches):
+                optimizer.zero_grad()
+                batch_indices = permutations[:, i * batch_size : (i + 1) * batch_size]
+                train_losses = member_losses(
+                    theta[batch_indices].to(self._device),
+                    x[batch_indices].to(self._device),
+                    batched_data=True,
+                )
+                train_losses.sum().backward()
+                if clip_max_norm is not None:
+                    _clip_grad_norm_per_member(params.values(), clip_max_norm)
+                optimizer.step()
+                train_log_probs_sum -= train_losses.detach().cpu()
+
+            epoch += 1
+            self._summary["training_log_probs"].append(
+                (train_log_probs_sum / num_batches).mean().item()
+            )
+
+            # Calculate validation performance. All members share the same batches.
+            loss_module.eval()
+            val_log_probs_sum = torch.zeros(num_members)
+            with torch.no_grad():
+                for batch in val_loader:
+                    val_log_probs_sum -= member_losses(
+                        batch[0].to(self._device),
+                        batch[1].to(self._device),
+                        batched_data=False,
+                    ).cpu()
+            val_log_prob = val_log_probs_sum / len(val_loader)
+            self._summary["validation_log_probs"].append(val_log_prob.mean().item())
+            self._summary["epoch_durations_sec"].append(time.time() - epoch_start_time)
+
+            # Same logic as `_converged()`, but for every member separately.
+            improved = (val_log_prob > best_val_log_prob) & ~converged
+            best_val_log_prob[improved] = val_log_prob[improved]
+            for k, v in params.items():
+                best_params[k][improved] = v.detach()[improved]
+            epochs_since_last_improvement[improved] = 0
+            epochs_since_last_improvement[~improved & ~converged] += 1
+            converged |= epochs_since_last_improvement > stop_after_epochs - 1
+
+            self._maybe_show_progress(self._show_progress_bars, epoch)
+
+        if not converged.all():
+            warn(
+                f"Maximum number of epochs `max_num_epochs={max_num_epochs}` reached, "
+                "but not all ensemble members have fully converged. Consider "
+                "increasing it.",
+                stacklevel=2,
+            )
+
+        for m, net in enumerate(nets):
+            member_state = {
+                k[len("net.") :]: v[m] for k, v in {**best_params, **buffers}.items()
+            }
+            # Non-persistent buffers are stacked as well, but not part of the state.
+            net.load_state_dict({k: member_state[k] for k in net.state_dict()})
+
+        # Update summary.
+        self._summary["epochs_trained"].append(epoch)
+        self._summary["best_validation_log_prob"].append(
+            best_val_log_prob.mean().item()
+        )
+        self._summarize(round_=self._round)
+        if show_train_summary:
+            print(self._describe_round(self._round, self._summary))
+
+        posteriors = []
+        for net in nets:
+            self._neural_net = net
+            posteriors.append(
+                self.build_posterior(density_estimator=net, **build_posterior_kwargs)
+            )
+        self._neural_net_is_shared = True
+
+        return EnsemblePosterior(posteriors)
+
+    def _ensemble_loss(self, theta: Tensor, x: Tensor, **loss_kwargs) -> Tensor:
+        """Return the training loss of `self._neural_net`, see `train_ensemble()`."""
+        raise NotImplementedError
+
+    def train_data_parallel(
+        self,
+        num_processes: int,
+        timeout: timedelta = timedelta(minutes=30),
+        startup_timeout: timedelta = timedelta(minutes=1),
+        **train_kwargs,
+    ) -> nn.Module:
+        r"""Train the neural network with data parallelism on multiple CPU processes.
+
+        `num_processes - 1` worker processes are forked and, together with the current
+        process, form a `torch.distributed` process group (gloo backend). Every process
+        trains on its own shard of the training data with a batch size of
+        `training_batch_size // num_processes`, and gradients are averaged across
+        processes after every batch. Validation performance is averaged across
+        processes as well, such that the convergence criterion is the same as for
+        `.train()`. The network of the current process is the one that is returned and
+        used by `.build_posterior()`.
+
+        Forked worker processes run with a single thread each. Because they inherit
+        the random state of the current process, all processes use the same
+        train-validation split and the same initial network.
+
+        Forking a process whose thread pools are already running is unsafe: locks
+        held by other threads stay locked in the child, and OpenMP thread pools may
+        deadlock when they are used in the child. The workers therefore do not use
+        intra-op parallelism. If a worker exits or does not start within
+        `startup_timeout`, all workers are terminated and a `RuntimeError` is
+        raised, instead of waiting for the process group for the full `timeout`.
+
+        Args:
+            num_processes: Total number of processes, including the current one.
+            timeout: Timeout for communication between processes.
+            startup_timeout: Timeout for all worker processes to start.
+            train_kwargs: Keyword arguments passed to `.train()` in every process.
+
+        Returns:
+            The trained neural network.
+        """
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError(
+                "Data-parallel training requires the `fork` start method, which is "
+                "not available on your platform."
+            )
+        if self._device != "cpu":
+            raise ValueError("Data-parallel training is only supported on the cpu.")
+        if train_kwargs.get("resume_training", False):
+            raise ValueError("Data-parallel training does not support resume_training.")
+        if num_processes == 1:
+            return self.train(**train_kwargs)
+
+        context = multiprocessing.get_context("fork")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            init_method = f"file://{Path(tmp_dir, 'rendezvous')}"
+            started = [context.Event() for _ in range(1, num_processes)]
+            workers = [
+                context.Process(
+                    target=_data_parallel_worker,
+                    args=(
+                        self,
+                        rank,
+                        num_processes,
+                        init_method,
+                        timeout,
+                        train_kwargs,
+                        started[rank - 1],
+                    ),
+                    daemon=True,
+                )
+                for rank in range(1, num_processes)
+            ]
+            for worker in workers:
+                worker.start()
+            _wait_for_workers(workers, started, startup_timeout)
+
+            dist.init_process_group(
+                "gloo",
+                init_method=init_method,
+                rank=0,
+                world_size=num_processes,
+                timeout=timeout,
+            )
+            self._data_parallel = True
+            try:
+                neural_net = self.train(**train_kwargs)
+            finally:
+                self._data_parallel = False
+                dist.destroy_process_group()
+                for worker in workers:
+                    worker.join()
+
+        if any(worker.exitcode != 0 for worker in workers):
+            raise RuntimeError("A worker process of data-parallel training failed.")
+
+        return neural_net
+
+    def _average_gradients(self) -> None:
+        """Average the gradients of the neural net across processes during
+        data-parallel training. Does nothing otherwise.
+        """
+        if not self._data_parallel:
+            return
+
+        assert self._neural_net is not None
+        grads = [p.grad for p in self._neural_net.parameters() if p.grad is not None]
+        flat_grads = torch.cat([grad.reshape(-1) for grad in grads])
+        dist.all_reduce(flat_grads)
+        flat_grads /= dist.get_world_size()
+        offset = 0
+        for grad in grads:
+            grad.copy_(flat_grads[offset : offset + grad.numel()].view_as(grad))
+            offset += grad.numel()
+
     def get_dataloaders(
         self,
         starting_round: int = 0,
@@ -340,6 +688,16 @@ class NeuralInference(ABC):
                 permuted_indices[num_training_examples:],
             )
 
+        train_indices, val_indices = self.train_indices, self.val_indices
+        if self._data_parallel:
+            # Every process uses its own, equally sized shard of the data and a
+            # fraction of the batch, see `train_data_parallel()`.
+            train_indices = _shard_for_this_process(train_indices)
+            val_indices = _shard_for_this_process(val_indices)
+            num_training_examples = len(train_indices)
+            num_validation_examples = len(val_indices)
+            training_batch_size = max(1, training_batch_size // dist.get_world_size())
+
         # Create training and validation loaders using a subset sampler.
         # Intentionally use dicts to define the default dataloader args
         # Then, use dataloader_kwargs to override (or add to) any of these defaults
@@ -347,13 +705,13 @@ class NeuralInference(ABC):
         train_loader_kwargs = {
             "batch_size": min(training_batch_size, num_training_examples),
             "drop_last": True,
-            "sampler": SubsetRandomSampler(self.train_indices.tolist()),
+            "sampler": SubsetRandomSampler(train_indices.tolist()),
         }
         val_loader_kwargs = {
             "batch_size": min(training_batch_size, num_validation_examples),
             "shuffle": False,
             "drop_last": True,
-            "sampler": SubsetRandomSampler(self.val_indices.tolist()),
+            "sampler": SubsetRandomSampler(val_indices.tolist()),
         }
         if dataloader_kwargs is not None:
             train_loader_kwargs = dict(train_loader_kwargs, **dataloader_kwargs)
@@ -381,6 +739,13 @@ class NeuralInference(ABC):
         assert self._neural_net is not None
         neural_net = self._neural_net
 
+        if self._data_parallel:
+            # Average the validation performance over the shards of all processes such
+            # that all processes take the same decision.
+            val_log_prob = torch.tensor(self._val_log_prob, dtype=torch.float64)
+            dist.all_reduce(val_log_prob)
+            self._val_log_prob = val_log_prob.item() / dist.get_world_size()
+
         # (Re)-start the epoch count with the first epoch or any improvement.
         if epoch == 0 or self._val_log_prob > self._best_val_log_prob:
             self._best_val_log_prob = self._val_log_prob
@@ -396,6 +761,40 @@ class NeuralInference(ABC):
 
         return converged
 
+    def _share_neural_net(self) -> nn.Module:
+        """Return `_neural_net` without copying it.
+
+        The net is marked as shared, such that further training works on a copy of
+        it, see `_copy_neural_net_if_shared()`.
+        """
+        self._neural_net_is_shared = True
+        return self._neural_net
+
+    def _copy_neural_net_if_shared(self, resume_training: bool) -> None:
+        """Copy `_neural_net` before training it, if it was returned or is used by a
+        posterior (copy-on-write).
+
+        When training is resumed, the optimizer is copied together with the net, such
+        that it updates the parameters of the copy.
+        """
+        if not self._neural_net_is_shared:
+            return
+        if resume_training:
+            net_and_optimizer = deepcopy((self._neural_net, self.optimizer))
+            self._neural_net, self.optimizer = net_and_optimizer
+        else:
+            self._neural_net = deepcopy(self._neural_net)
+        self._neural_net_is_shared = False
+
+    def _add_to_model_bank(self, posterior: NeuralPosterior) -> None:
+        """Store a posterior in `_model_bank`, keeping only the last
+        `max_model_bank_size` posteriors."""
+        if self.max_model_bank_size == 0:
+            return
+        self._model_bank.append(posterior)
+        if self.max_model_bank_size is not None:
+            del self._model_bank[: -self.max_model_bank_size]
+
     def _default_summary_writer(self) -> SummaryWriter:
         """Return summary writer logging to method- and simulator-specific directory."""
 
@@ -608,6 +1007,105 @@ def simulate_for_sbi(
     return theta, x
 
 
+def _shard_for_this_process(indices: Tensor) -> Tensor:
+    """Return the shard of `indices` used by the current process.
+
+    All shards have the same size, such that all processes run the same number of
+    batches per epoch.
+    """
+    shard_size = len(indices) // dist.get_world_size()
+    rank = dist.get_rank()
+    return indices[rank * shard_size : (rank + 1) * shard_size]
+
+
+def _wait_for_workers(
+    workers: List[BaseProcess], started: List[Any], timeout: timedelta
+) -> None:
+    """Wait until all worker processes of data-parallel training have set their
+    `started` event. Terminate them and raise a `RuntimeError` if one of them exits
+    before, or if they do not start within `timeout`."""
+    deadline = time.monotonic() + timeout.total_seconds()
+    while not all(event.is_set() for event in started):
+        if any(worker.exitcode is not None for worker in workers):
+            error = "A worker process of data-parallel training exited on startup."
+        elif time.monotonic() > deadline:
+            error = (
+                "Worker processes of data-parallel training did not start within "
+                f"{timeout}."
+            )
+        else:
+            time.sleep(0.01)
+            continue
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        raise RuntimeError(error)
+
+
+def _data_parallel_worker(
+    inference: NeuralInference,
+    rank: int,
+    world_size: int,
+    init_method: str,
+    timeout: timedelta,
+    train_kwargs: Dict,
+    started: Any,
+) -> None:
+    """Train the forked copy of `inference` as one process of data-parallel training.
+
+    The random state is inherited from the parent process, such that all processes
+    create the same train-validation split and the same initial network.
+    """
+    # The intra-op thread pool of the parent is not usable after forking.
+    torch.set_num_threads(1)
+    started.set()
+    dist.init_process_group(
+        "gloo",
+        init_method=init_method,
+        rank=rank,
+        world_size=world_size,
+        timeout=timeout,
+    )
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            # The summary writer of the parent process can not be used after forking.
+            inference._summary_writer = SummaryWriter(log_dir)
+            inference._show_progress_bars = False
+            inference._data_parallel = True
+            inference.train(**dict(train_kwargs, show_train_summary=False))
+            inference._summary_writer.close()
+    finally:
+        dist.destroy_process_group()
+
+
+class _EnsembleMemberLoss(nn.Module):
+    """Module whose forward pass returns the loss of a single ensemble member.
+
+    Used with `torch.func.functional_call` such that the parameters of `net` are
+    replaced by those of the ensemble member.
+    """
+
+    def __init__(self, net: nn.Module, loss_fn: Callable):
+        super().__init__()
+        self.net = net
+        self.loss_fn = loss_fn
+
+    def forward(self, theta: Tensor, x: Tensor) -> Tensor:
+        return self.loss_fn(theta, x).mean()
+
+
+def _clip_grad_norm_per_member(parameters, max_norm: float) -> None:
+    """Clip the gradient norm of each member of stacked ensemble parameters.
+
+    The leading dimension of every parameter indexes the ensemble member.
+    """
+    grads = [p.grad for p in parameters if p.grad is not None]
+    norms = torch.stack([g.reshape(g.shape[0], -1).norm(dim=1) for g in grads])
+    clip_coef = (max_norm / (norms.norm(dim=0) + 1e-6)).clamp(max=1.0)
+    for g in grads:
+        g.mul_(clip_coef.reshape(-1, *([1] * (g.dim() - 1))))
+
+
 def check_if_proposal_has_default_x(proposal: Any):
     """Check for validity of the provided proposal distribution.
 
@@ -1,6 +1,30 @@
-from sbi.inference.posteriors.direct_posterior import DirectPosterior
-from sbi.inference.posteriors.ensemble_posterior import EnsemblePosterior
-from sbi.inference.posteriors.importance_posterior import ImportanceSamplingPosterior
-from sbi.inference.posteriors.mcmc_posterior import MCMCPosterior
-from sbi.inference.posteriors.rejection_posterior import RejectionPosterior
-from sbi.inference.posteriors.vi_posterior import VIPosterior
+from typing import TYPE_CHECKING
+
+from sbi.utils.lazy_imports import lazy_imports
+
+# Posteriors are imported on first use, e.g. such that sampling a `DirectPosterior`
+# does not import `arviz` and `pyro` for the `MCMCPosterior`.
+_imports = {
+    "sbi.inference.posteriors.direct_posterior": ["DirectPosterior"],
+    "sbi.inference.posteriors.ensemble_posterior": ["EnsemblePosterior"],
+    "sbi.inference.posteriors.export": ["export_posterior", "load_posterior"],
+    "sbi.inference.posteriors.importance_posterior": ["ImportanceSamplingPosterior"],
+    "sbi.inference.posteriors.mcmc_posterior": ["MCMCPosterior"],
+    "sbi.inference.posteriors.rejection_posterior": ["RejectionPosterior"],
+    "sbi.inference.posteriors.serving": ["PosteriorServer"],
+    "sbi.inference.posteriors.vi_posterior": ["VIPosterior"],
+}
+__getattr__, __dir__ = lazy_imports(__name__, _imports)
+__all__ = sorted(name for names in _imports.values() for name in names)
+
+if TYPE_CHECKING:
+    from sbi.inference.posteriors.direct_posterior import DirectPosterior
+    from sbi.inference.posteriors.ensemble_posterior import EnsemblePosterior
+    from sbi.inference.posteriors.export import export_posterior, load_posterior
+    from sbi.inference.posteriors.importance_posterior import (
+        ImportanceSamplingPosterior,
+    )
+    from sbi.inference.posteriors.mcmc_posterior import MCMCPosterior
+    from sbi.inference.posteriors.rejection_posterior import RejectionPosterior
+    from sbi.inference.posteriors.serving import PosteriorServer
+    from sbi.inference.posteriors.vi_posterior import VIPosterior
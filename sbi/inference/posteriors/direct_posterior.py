@@ -1,10 +1,12 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
-from typing import Optional, Union
+import warnings
+from typing import Optional, Tuple, Union
 
 import torch
 from torch import Tensor, log
 from torch.distributions import Distribution
+from tqdm.auto import tqdm
 
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
 from sbi.inference.potentials.posterior_based_potential import (
@@ -138,6 +140,108 @@ class DirectPosterior(NeuralPosterior):
 
         return samples
 
+    def sample_batched(
+        self,
+        sample_shape: Shape,
+        x: Tensor,
+        max_sampling_batch_size: int = 10_000,
+        show_progress_bars: bool = True,
+    ) -> Tensor:
+        r"""Return samples from the posteriors $p(\theta|x_i)$ of a batch of `x`.
+
+        The posterior network is sampled for all observations at once, i.e., in one
+        batched call per round of rejection sampling, instead of once per observation.
+
+        Args:
+            sample_shape: Desired shape of samples that are drawn from the posterior
+                of every observation.
+            x: Batch of observations of shape (batch_size, *x_shape).
+            max_sampling_batch_size: Maximal number of samples that are drawn for
+                every observation in one round of rejection sampling.
+            show_progress_bars: Whether to show sampling progress monitor.
+
+        Returns:
+            Samples of shape (*sample_shape, batch_size, parameter_dim).
+        """
+        num_samples = torch.Size(sample_shape).numel()
+        condition_shape = self.posterior_estimator._condition_shape
+        x = torch.as_tensor(x).to(self._device).reshape(-1, *condition_shape)
+
+        samples, _ = self._accept_reject_batched(
+            x, num_samples, max_sampling_batch_size, show_progress_bars
+        )
+        return samples.reshape(*sample_shape, *samples.shape[1:])
+
+    @torch.no_grad()
+    def _accept_reject_batched(
+        self,
+        x: Tensor,
+        num_samples: int,
+        max_sampling_batch_size: int = 10_000,
+        show_progress_bars: bool = False,
+        warn_acceptance: float = 0.01,
+    ) -> Tuple[Tensor, Tensor]:
+        """Return samples within the prior support for every `x` of a batch, and the
+        acceptance rates of the posterior network samples for every `x`.
+
+        Returns:
+            Samples of shape (num_samples, batch_size, parameter_dim) and acceptance
+            rates of shape (batch_size,).
+        """
+        num_xs = x.shape[0]
+        accepted = [[] for _ in range(num_xs)]
+        num_accepted = torch.zeros(num_xs, dtype=torch.long)
+        num_sampled = torch.zeros(num_xs, dtype=torch.long)
+        leakage_warning_raised = False
+
+        pbar = tqdm(
+            disable=not show_progress_bars,
+            total=num_samples * num_xs,
+            desc=f"Drawing {num_samples} posterior samples for {num_xs} observations",
+        )
+        with pbar:
+            while (num_accepted < num_samples).any():
+                remaining = torch.where(num_accepted < num_samples)[0]
+                # Oversample by the acceptance rate so far.
+                acceptance_rate = (num_accepted[remaining].sum() + 1) / (
+                    num_sampled[remaining].sum() + 1
+                )
+                num_missing = int((num_samples - num_accepted[remaining]).max())
+                num_draws = min(
+                    int(num_missing / acceptance_rate) + 1, max_sampling_batch_size
+                )
+
+                candidates = self.posterior_estimator.sample(
+                    (num_draws,), condition=x[remaining]
+                )
+                is_accepted = within_support(
+                    self.prior, candidates.reshape(-1, candidates.shape[-1])
+                ).reshape(candidates.shape[:-1])
+                for idx, candidates_x, is_accepted_x in zip(
+                    remaining.tolist(), candidates, is_accepted
+                ):
+                    accepted[idx].append(candidates_x[is_accepted_x])
+                num_accepted[remaining] += is_accepted.sum(1).cpu()
+                num_sampled[remaining] += num_draws
+                pbar.update(int(is_accepted.sum()))
+
+                min_acceptance_rate = (num_accepted / num_sampled.clamp(min=1)).min()
+                if (
+                    num_sampled.min() > 1_000
+                    and min_acceptance_rate < warn_acceptance
+                    and not leakage_warning_raised
+                ):
+                    warnings.warn(
+                        f"Only {min_acceptance_rate:.3%} posterior samples were "
+                        "accepted for some observations. It may take a long time to "
+                        "collect the remaining samples.",
+                        stacklevel=2,
+                    )
+                    leakage_warning_raised = True
+
+        samples = torch.stack([torch.cat(acc)[:num_samples] for acc in accepted], dim=1)
+        return samples, num_accepted / num_sampled
+
     def log_prob(
         self,
         theta: Tensor,
@@ -209,6 +313,105 @@ class DirectPosterior(NeuralPosterior):
 
             return masked_log_prob - log_factor
 
+    def log_prob_batched(
+        self,
+        theta: Tensor,
+        x: Tensor,
+        norm_posterior: bool = True,
+        track_gradients: bool = False,
+        leakage_correction_params: Optional[dict] = None,
+    ) -> Tensor:
+        r"""Returns the log-probabilities of the posteriors $p(\theta|x_i)$ of a batch
+        of `x`, evaluated in one call of the posterior network.
+
+        Args:
+            theta: Parameters of shape (*sample_shape, batch_size, parameter_dim),
+                i.e., the parameters `theta[..., i, :]` are evaluated under the
+                posterior given `x[i]`. For aligned pairs of parameters and
+                observations, pass `theta` of shape (batch_size, parameter_dim).
+            x: Batch of observations of shape (batch_size, *x_shape).
+            norm_posterior: Whether to enforce a normalized posterior density. The
+                leakage correction factors of all `x` are estimated together, see
+                `log_prob()`.
+            track_gradients: Whether the returned tensor supports tracking gradients.
+            leakage_correction_params: A `dict` of keyword arguments to override the
+                default values of the batched leakage correction,
+                `num_rejection_samples` (per observation) and
+                `max_sampling_batch_size` (total number of samples per call of the
+                posterior network).
+
+        Returns:
+            Log posterior probabilities of shape (*sample_shape, batch_size), -∞
+            outside of the support of the prior.
+        """
+        condition_shape = self.posterior_estimator._condition_shape
+        x = torch.as_tensor(x).to(self._device).reshape(-1, *condition_shape)
+        theta = torch.as_tensor(theta).to(self._device)
+        assert theta.ndim >= 2 and theta.shape[-2] == x.shape[0], (
+            f"theta of shape {tuple(theta.shape)} must have shape (*sample_shape, "
+            f"{x.shape[0]}, parameter_dim) for {x.shape[0]} observations."
+        )
+
+        self.posterior_estimator.eval()
+
+        with torch.set_grad_enabled(track_gradients):
+            unnorm_log_prob = self.posterior_estimator.log_prob(theta, condition=x)
+
+            # Force probability to be zero outside prior support.
+            in_prior_support = within_support(
+                self.prior, theta.reshape(-1, theta.shape[-1])
+            ).reshape(theta.shape[:-1])
+
+            masked_log_prob = torch.where(
+                in_prior_support,
+                unnorm_log_prob,
+                torch.tensor(float("-inf"), dtype=torch.float32, device=self._device),
+            )
+
+            if leakage_correction_params is None:
+                leakage_correction_params = dict()  # use defaults
+            log_factor = (
+                log(self._leakage_correction_batched(x, **leakage_correction_params))
+                if norm_posterior
+                else 0
+            )
+
+            return masked_log_prob - log_factor
+
+    @torch.no_grad()
+    def _leakage_correction_batched(
+        self,
+        x: Tensor,
+        num_rejection_samples: int = 10_000,
+        max_sampling_batch_size: int = 100_000,
+    ) -> Tensor:
+        """Return the leakage correction factors of a batch of observations.
+
+        The factor of every observation is the fraction of `num_rejection_samples`
+        posterior network samples within the prior support. Observations are sampled
+        together, with at most `max_sampling_batch_size` samples per network call.
+        """
+        num_samples_per_call = min(num_rejection_samples, max_sampling_batch_size)
+        x_batch_size = max(1, max_sampling_batch_size // num_samples_per_call)
+
+        acceptance_rates = []
+        for x_batch in x.split(x_batch_size):
+            num_accepted = torch.zeros(x_batch.shape[0], device=self._device)
+            for start in range(0, num_rejection_samples, num_samples_per_call):
+                num_samples = min(num_samples_per_call, num_rejection_samples - start)
+                candidates = self.posterior_estimator.sample(
+                    (num_samples,), condition=x_batch
+                )
+                num_accepted += (
+                    within_support(
+                        self.prior, candidates.reshape(-1, candidates.shape[-1])
+                    )
+                    .reshape(candidates.shape[:-1])
+                    .sum(1)
+                )
+            acceptance_rates.append(num_accepted / num_rejection_samples)
+        return torch.cat(acceptance_rates)
+
     @torch.no_grad()
     def leakage_correction(
         self,
@@ -1,17 +1,20 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
-from typing import List, Optional, Tuple, Union
+import warnings
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
-from torch import Tensor
+from torch import Tensor, nn
 from torch.distributions import Distribution
 
 from sbi.inference.posteriors.base_posterior import NeuralPosterior
+from sbi.inference.posteriors.direct_posterior import DirectPosterior
 from sbi.inference.potentials.base_potential import BasePotential
 from sbi.inference.potentials.posterior_based_potential import PosteriorBasedPotential
+from sbi.samplers.rejection.rejection import _warn_low_acceptance
 from sbi.sbi_types import Shape, TorchTransform
-from sbi.utils import gradient_ascent
+from sbi.utils import gradient_ascent, within_support
 from sbi.utils.torchutils import ensure_theta_batched
 from sbi.utils.user_input_checks import process_x
 
@@ -29,6 +32,13 @@ class EnsemblePosterior(NeuralPosterior):
 
     So far `log_prob()`, `sample()` and `map()` functionality are supported.
 
+    If all posteriors are `DirectPosterior`s whose density estimators share the same
+    architecture, `sample()` and `log_prob()` evaluate all density estimators in a
+    single vectorized call (via `torch.func.vmap` over the stacked weights), which
+    makes a large ensemble about as expensive as a single, wider network. If the
+    density estimator can not be vectorized, we fall back to evaluating every
+    posterior separately.
+
     Example:
 
     ```
@@ -44,6 +54,10 @@ class EnsemblePosterior(NeuralPosterior):
     ensemble.sample((1,))
     ```
 
+    To train an ensemble of networks on the same simulations, use
+    `inference.append_simulations(theta, x).train_ensemble(ensemble_size)`, which
+    trains all members in a single process and returns an `EnsemblePosterior`.
+
     Attributes:
         posteriors: List of the posterior estimators making up the ensemble.
         num_components: Number of posterior estimators.
@@ -80,6 +94,10 @@ class EnsemblePosterior(NeuralPosterior):
 
         device = self.ensure_same_device(posteriors)
 
+        # Stacked weights of the density estimators, built lazily at first use.
+        self._use_stacked_estimators = self._have_same_architecture(posteriors)
+        self._stacked_estimators = None
+
         potential_fns = []
         for posterior in posteriors:
             potential = posterior.potential_fn
@@ -118,6 +136,213 @@ class EnsemblePosterior(NeuralPosterior):
         ), "Only supported if all posteriors are on the same device."
         return devices[0]
 
+    def _have_same_architecture(self, posteriors: List) -> bool:
+        """Return whether all posteriors are `DirectPosterior`s whose density
+        estimators have the same type and the same parameter shapes.
+        """
+        if len(posteriors) < 2 or not all(
+            isinstance(posterior, DirectPosterior) for posterior in posteriors
+        ):
+            return False
+
+        def architecture(estimator: nn.Module) -> Tuple:
+            shapes = {k: v.shape for k, v in estimator.state_dict().items()}
+            return type(estimator), shapes
+
+        reference = architecture(posteriors[0].posterior_estimator)
+        return all(
+            architecture(posterior.posterior_estimator) == reference
+            for posterior in posteriors[1:]
+        )
+
+    def _call_stacked_estimators(self, method: str, *args) -> Tensor:
+        """Call `method` of all density estimators at once via `torch.func.vmap`.
+
+        Tensor arguments are shared between all estimators, non-tensor arguments are
+        passed as they are. The weights of the density estimators are stacked at the
+        first call, such that later changes to the component posteriors are not
+        reflected.
+
+        Returns:
+            Output of all density estimators, stacked along the first dimension.
+        """
+        from torch.func import functional_call, stack_module_state, vmap
+
+        if self._stacked_estimators is None:
+            estimators = [
+                posterior.posterior_estimator for posterior in self.posteriors
+            ]
+            params, buffers = stack_module_state(estimators)  # type: ignore
+            module = _EstimatorMethodCall(estimators[0]).eval()
+            self._stacked_estimators = (
+                module,
+                {f"estimator.{k}": v.detach() for k, v in params.items()},
+                {f"estimator.{k}": v for k, v in buffers.items()},
+            )
+        module, params, buffers = self._stacked_estimators
+
+        # Expand the shared inputs along the ensemble dimension to avoid in-place
+        # operations on unbatched tensors inside `vmap`.
+        is_tensor = [isinstance(arg, Tensor) for arg in args]
+        tensors = [
+            arg.expand(self.num_components, *arg.shape)
+            for arg, tensor in zip(args, is_tensor)
+            if tensor
+        ]
+
+        def call(p: Dict[str, Tensor], b: Dict[str, Tensor], *batched: Tensor):
+            batched_iter = iter(batched)
+            call_args = [
+                next(batched_iter) if tensor else arg
+                for arg, tensor in zip(args, is_tensor)
+            ]
+            return functional_call(module, (p, b), (method, *call_args))
+
+        return vmap(call, randomness="different")(params, buffers, *tensors)
+
+    def _disable_stacked_estimators(self, vmap_error: RuntimeError) -> None:
+        """Evaluate the components one at a time from now on, after vectorizing them
+        failed with `vmap_error`.
+
+        Only called once the components were evaluated successfully one at a time,
+        such that errors that are not caused by `vmap` are raised instead.
+        """
+        self._use_stacked_estimators = False
+        warnings.warn(
+            "The density estimators of the ensemble can not be vectorized with `vmap` "
+            "and are evaluated one after the other, which is slower. `vmap` raised: "
+            f"{vmap_error}",
+            stacklevel=3,
+        )
+
+    def _reshape_to_condition(self, x: Optional[Tensor]) -> Tensor:
+        x = self._x_else_default_x(x)
+        condition_shape = self.posteriors[0].posterior_estimator._condition_shape
+        try:
+            return x.reshape(*condition_shape)
+        except RuntimeError as err:
+            raise ValueError(
+                f"Expected a single `x` which should broadcastable to shape \
+                  {condition_shape}, but got {x.shape}."
+            ) from err
+
+    def _stacked_sample(
+        self,
+        num_samples: int,
+        x: Optional[Tensor] = None,
+        max_sampling_batch_size: int = 10_000,
+        sample_with: Optional[str] = None,
+        show_progress_bars: bool = True,
+    ) -> Tensor:
+        """Return samples of all components, drawn with vectorized density estimators.
+
+        The number of samples per component is drawn from a multinomial distribution.
+        Samples outside of the prior support are rejected, as in
+        `DirectPosterior.sample()`: the batch size adapts to the acceptance rate, and
+        a warning is logged if the acceptance rate is low. Every vectorized call draws
+        at most `max_sampling_batch_size` samples over all components.
+        """
+        if sample_with is not None:
+            raise ValueError(
+                f"You set `sample_with={sample_with}`. As of sbi v0.18.0, setting "
+                f"`sample_with` is no longer supported."
+            )
+        x = self._reshape_to_condition(x)
+
+        posterior_indizes = torch.multinomial(
+            self._weights, num_samples, replacement=True
+        )
+        num_remaining = torch.bincount(posterior_indizes, minlength=self.num_components)
+        accepted = [[] for _ in range(self.num_components)]
+        num_accepted = torch.zeros(self.num_components)
+        num_sampled_total = 0
+        max_batch_size = max(max_sampling_batch_size // self.num_components, 1)
+        batch_size = min(int(num_remaining.max()), max_batch_size)
+        leakage_warning_raised = False
+
+        with torch.no_grad():
+            while num_remaining.sum() > 0:
+                candidates = self._call_stacked_estimators(
+                    "sample", torch.Size((batch_size,)), x
+                )
+                are_within_prior = within_support(
+                    self.prior, candidates.reshape(-1, candidates.shape[-1])
+                ).reshape(self.num_components, batch_size)
+                num_accepted += are_within_prior.sum(dim=1)
+                for index in range(self.num_components):
+                    samples = candidates[index][are_within_prior[index]]
+                    samples = samples[: int(num_remaining[index])]
+                    accepted[index].append(samples)
+                    num_remaining[index] -= samples.shape[0]
+                num_sampled_total += batch_size
+
+                # Adapt the batch size to the component with the lowest acceptance
+                # rate that still has remaining samples, as in `accept_reject_sample`.
+                is_remaining = num_remaining > 0
+                if not is_remaining.any():
+                    break
+                acceptance_rate = float(
+                    (num_accepted[is_remaining] / num_sampled_total).min()
+                )
+                num_missing = int(num_remaining.max())
+                batch_size = min(
+                    max_batch_size,
+                    max(int(1.5 * num_missing / max(acceptance_rate, 1e-12)), 100),
+                )
+                if (
+                    num_sampled_total > 1000
+                    and acceptance_rate < 0.01
+                    and not leakage_warning_raised
+                ):
+                    _warn_low_acceptance(
+                        acceptance_rate,
+                        int(num_remaining.sum()),
+                        alternative_method="build_posterior(..., sample_with='mcmc')",
+                    )
+                    leakage_warning_raised = True
+
+        return torch.cat([torch.cat(samples) for samples in accepted])
+
+    def _stacked_log_prob(
+        self,
+        theta: Tensor,
+        x: Optional[Tensor] = None,
+        norm_posterior: bool = True,
+        track_gradients: bool = False,
+        leakage_correction_params: Optional[dict] = None,
+    ) -> Tensor:
+        """Return `(num_components, len(theta))`-shaped log-probabilities of all
+        components, evaluated with vectorized density estimators.
+
+        Mirrors `DirectPosterior.log_prob()`.
+        """
+        x = self._reshape_to_condition(x)
+        theta = ensure_theta_batched(torch.as_tensor(theta)).to(self._device)
+
+        with torch.set_grad_enabled(track_gradients):
+            unnorm_log_probs = self._call_stacked_estimators("log_prob", theta, x)
+
+            # Force probability to be zero outside prior support.
+            in_prior_support = within_support(self.prior, theta)
+            log_probs = torch.where(
+                in_prior_support,
+                unnorm_log_probs,
+                torch.tensor(float("-inf"), dtype=torch.float32, device=self._device),
+            )
+
+            if norm_posterior:
+                log_factors = torch.stack([
+                    torch.log(
+                        posterior.leakage_correction(
+                            x=x, **(leakage_correction_params or {})
+                        )
+                    )
+                    for posterior in self.posteriors
+                ])
+                log_probs = log_probs - log_factors.reshape(-1, 1)
+
+        return log_probs
+
     @property
     def weights(self) -> Tensor:
         return self._weights
@@ -166,6 +391,15 @@ class EnsemblePosterior(NeuralPosterior):
             Samples drawn from the ensemble distribution.
         """
         num_samples = torch.Size(sample_shape).numel()
+
+        vmap_error = None
+        if self._use_stacked_estimators:
+            try:
+                samples = self._stacked_sample(num_samples, x=x, **kwargs)
+                return samples.reshape(*sample_shape, -1)
+            except RuntimeError as err:
+                vmap_error = err
+
         posterior_indizes = torch.multinomial(
             self._weights, num_samples, replacement=True
         )
@@ -177,6 +411,8 @@ class EnsemblePosterior(NeuralPosterior):
             samples.append(
                 self.posteriors[posterior_index].sample(sample_shape_c, x=x, **kwargs)
             )
+        if vmap_error is not None:
+            self._disable_stacked_estimators(vmap_error)
         return torch.vstack(samples).reshape(*sample_shape, -1)
 
     def log_prob(
@@ -210,9 +446,20 @@ class EnsemblePosterior(NeuralPosterior):
             for posterior in self.posteriors
         ), "`log_prob()` only works for ensembles of the same type of posterior."
 
-        log_probs = torch.stack([
-            posterior.log_prob(theta, x=x, **kwargs) for posterior in self.posteriors
-        ])
+        log_probs = None
+        vmap_error = None
+        if self._use_stacked_estimators:
+            try:
+                log_probs = self._stacked_log_prob(theta, x=x, **kwargs)
+            except RuntimeError as err:
+                vmap_error = err
+        if log_probs is None:
+            log_probs = torch.stack([
+                posterior.log_prob(theta, x=x, **kwargs)
+                for posterior in self.posteriors
+            ])
+        if vmap_error is not None:
+            self._disable_stacked_estimators(vmap_error)
         log_weights = torch.log(self._weights).reshape(-1, 1)
 
         if individually:
@@ -439,3 +686,18 @@ class EnsemblePotential(BasePotential):
             dim=0,
         )
         return ensemble_log_probs
+
+
+class _EstimatorMethodCall(nn.Module):
+    """Module whose forward pass calls a method of the wrapped density estimator.
+
+    Used with `torch.func.functional_call` to swap in the weights of an ensemble
+    component.
+    """
+
+    def __init__(self, estimator: nn.Module):
+        super().__init__()
+        self.estimator = estimator
+
+    def forward(self, method: str, *args) -> Tensor:
+        return getattr(self.estimator, method)(*args)
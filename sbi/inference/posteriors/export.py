@@ -0,0 +1,239 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+"""Export of trained posteriors for inference-only deployment."""
+
+import json
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import torch
+from torch import Tensor, nn
+from torch.distributions import Distribution, Independent, MultivariateNormal
+
+from sbi.__version__ import __version__
+from sbi.inference.posteriors.direct_posterior import DirectPosterior
+from sbi.neural_nets.factory import model_builders
+from sbi.utils.torchutils import BoxUniform
+
+FORMAT_VERSION = 1
+CONFIG_FILENAME = "posterior.json"
+WEIGHTS_FILENAME = "weights.pt"
+
+
+def export_posterior(posterior: DirectPosterior, path: Union[str, Path]) -> None:
+    r"""Export a `DirectPosterior` for sampling and evaluation without pickling it.
+
+    Instead of pickling the entire posterior (including its potential, the inference
+    object it stems from and all of `sbi`), only the weights of the density estimator
+    are saved, together with a JSON file that describes the architecture of the
+    density estimator and the prior. The z-scoring statistics of the estimator are
+    part of its weights. The exported posterior can be loaded with `load_posterior()`.
+
+    The density estimator has to be built with `posterior_nn()` (or with a string
+    passed to `SNPE`), such that its architecture is known. If it contains an
+    embedding net, only its weights are exported, and an instance of the same
+    embedding net has to be passed to `load_posterior()`.
+
+    Args:
+        posterior: The posterior to export.
+        path: Directory to which the posterior is exported. It is created if it does
+            not exist.
+    """
+    if not isinstance(posterior, DirectPosterior):
+        raise TypeError(
+            f"Only a `DirectPosterior` can be exported, but got {type(posterior)}."
+        )
+    estimator = posterior.posterior_estimator
+    build_config = getattr(estimator, "_build_config", None)
+    if build_config is None:
+        raise ValueError(
+            "The architecture of the density estimator is unknown. Only density "
+            "estimators built with `posterior_nn()` can be exported."
+        )
+
+    kwargs = dict(build_config["kwargs"])
+    embedding_net = kwargs.pop("embedding_net", nn.Identity())
+    config = {
+        "format_version": FORMAT_VERSION,
+        "sbi_version": __version__,
+        "density_estimator": {
+            "model": build_config["model"],
+            "input_shape": list(build_config["input_shape"]),
+            "condition_shape": list(build_config["condition_shape"]),
+            "embedding_net": (
+                None
+                if isinstance(embedding_net, nn.Identity)
+                else type(embedding_net).__name__
+            ),
+            "kwargs": kwargs,
+        },
+        "prior": _prior_to_spec(posterior.prior),
+        "x_shape": None if posterior._x_shape is None else list(posterior._x_shape),
+        "max_sampling_batch_size": posterior.max_sampling_batch_size,
+    }
+    if config["prior"] is None:
+        warnings.warn(
+            f"The prior of type {type(posterior.prior)} can not be exported. It has to "
+            "be passed to `load_posterior()`.",
+            stacklevel=2,
+        )
+    try:
+        config_json = json.dumps(config, indent=2)
+    except TypeError as err:
+        raise ValueError(
+            "The arguments of the density estimator can not be exported to JSON."
+        ) from err
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / CONFIG_FILENAME).write_text(config_json)
+    state_dict = {name: t.detach().cpu() for name, t in estimator.state_dict().items()}
+    torch.save(state_dict, path / WEIGHTS_FILENAME)
+
+
+def load_posterior(
+    path: Union[str, Path],
+    prior: Optional[Distribution] = None,
+    embedding_net: Optional[nn.Module] = None,
+    device: str = "cpu",
+) -> DirectPosterior:
+    r"""Load a posterior that was exported with `export_posterior()`.
+
+    The density estimator is rebuilt from its architecture config, without any
+    training data, and its trained weights (including z-scoring statistics) are
+    loaded into it.
+
+    Args:
+        path: Directory to which the posterior was exported.
+        prior: Prior of the posterior. Only required if the prior could not be
+            exported; if passed, it replaces the exported prior.
+        embedding_net: Instance of the embedding net that the density estimator was
+            trained with. Its weights are replaced by the exported weights. Required if
+            the density estimator was trained with an embedding net.
+        device: Device to which the posterior is loaded, e.g., "cpu" or "cuda".
+
+    Returns:
+        The `DirectPosterior`.
+    """
+    path = Path(path)
+    config = json.loads((path / CONFIG_FILENAME).read_text())
+    if config["format_version"] > FORMAT_VERSION:
+        raise ValueError(
+            f"The posterior was exported in format version {config['format_version']} "
+            f"by sbi {config['sbi_version']}, but this version of sbi only supports "
+            f"format versions up to {FORMAT_VERSION}."
+        )
+
+    estimator_config = config["density_estimator"]
+    kwargs = dict(estimator_config["kwargs"])
+    if estimator_config["embedding_net"] is not None:
+        if embedding_net is None:
+            raise ValueError(
+                "The density estimator was trained with an embedding net of type "
+                f"{estimator_config['embedding_net']}. Pass an instance of it as "
+                "`embedding_net`."
+            )
+        kwargs["embedding_net"] = embedding_net
+
+    # The batches only determine the shapes of the estimator: the z-scoring
+    # statistics are overwritten by the exported weights.
+    batch_theta = torch.zeros(2, *estimator_config["input_shape"])
+    batch_x = torch.zeros(2, *estimator_config["condition_shape"])
+    estimator = model_builders[estimator_config["model"]](
+        batch_x=batch_theta, batch_y=batch_x, **kwargs
+    )
+    estimator._build_config = dict(
+        model=estimator_config["model"],
+        input_shape=tuple(estimator_config["input_shape"]),
+        condition_shape=tuple(estimator_config["condition_shape"]),
+        kwargs=kwargs,
+    )
+    estimator.load_state_dict(
+        torch.load(
+            path / WEIGHTS_FILENAME,
+            map_location=torch.device(device),
+            weights_only=True,
+        )
+    )
+    estimator.to(device)
+    estimator.eval()
+
+    if prior is None:
+        if config["prior"] is None:
+            raise ValueError(
+                "The prior of the posterior was not exported. Pass it as `prior`."
+            )
+        prior = _prior_from_spec(config["prior"], device)
+
+    return DirectPosterior(
+        posterior_estimator=estimator,
+        prior=prior,
+        max_sampling_batch_size=config["max_sampling_batch_size"],
+        device=device,
+        x_shape=None if config["x_shape"] is None else torch.Size(config["x_shape"]),
+    )
+
+
+def _prior_to_spec(prior: Distribution) -> Optional[Dict[str, Any]]:
+    """Return a JSON-serializable description of a prior, or None if the prior is
+    not a (composition of) `torch.distributions` that can be rebuilt from it.
+    """
+    if isinstance(prior, BoxUniform):
+        spec = {
+            "type": "BoxUniform",
+            "low": prior.base_dist.low.tolist(),
+            "high": prior.base_dist.high.tolist(),
+            "reinterpreted_batch_ndims": prior.reinterpreted_batch_ndims,
+        }
+    elif type(prior) is Independent:
+        base_spec = _prior_to_spec(prior.base_dist)
+        if base_spec is None:
+            return None
+        spec = {
+            "type": "Independent",
+            "base_dist": base_spec,
+            "reinterpreted_batch_ndims": prior.reinterpreted_batch_ndims,
+        }
+    elif type(prior) is MultivariateNormal:
+        # Only one of the equivalent parametrizations can be passed when rebuilding.
+        spec = {
+            "type": "MultivariateNormal",
+            "loc": prior.loc.tolist(),
+            "scale_tril": prior.scale_tril.tolist(),
+        }
+    elif getattr(torch.distributions, type(prior).__name__, None) is type(prior):
+        # Parameters that are not stored (but computed from others) are skipped.
+        spec = {"type": type(prior).__name__}
+        for name in prior.arg_constraints:
+            value = vars(prior).get(name)
+            if isinstance(value, Tensor):
+                spec[name] = value.tolist()
+    else:
+        return None
+
+    try:
+        _prior_from_spec(spec, "cpu")
+    except (TypeError, ValueError):
+        return None
+    return spec
+
+
+def _prior_from_spec(spec: Dict[str, Any], device: str) -> Distribution:
+    """Return the prior described by a spec of `_prior_to_spec()`."""
+    spec = dict(spec)
+    prior_type = spec.pop("type")
+    if prior_type == "BoxUniform":
+        return BoxUniform(
+            low=torch.tensor(spec["low"], device=device),
+            high=torch.tensor(spec["high"], device=device),
+            reinterpreted_batch_ndims=spec["reinterpreted_batch_ndims"],
+        )
+    if prior_type == "Independent":
+        return Independent(
+            _prior_from_spec(spec["base_dist"], device),
+            spec["reinterpreted_batch_ndims"],
+        )
+    params = {name: torch.tensor(value, device=device) for name, value in spec.items()}
+    return getattr(torch.distributions, prior_type)(**params)
@@ -2,13 +2,11 @@
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 from functools import partial
 from math import ceil
-from typing import Any, Callable, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Union
 from warnings import warn
 
-import arviz as az
 import torch
 import torch.distributions.transforms as torch_tf
-from arviz.data import InferenceData
 from joblib import Parallel, delayed
 from numpy import ndarray
 from pyro.infer.mcmc import HMC, NUTS
@@ -33,6 +31,9 @@ from sbi.simulators.simutils import tqdm_joblib
 from sbi.utils import pyro_potential_wrapper, tensor2numpy, transformed_potential
 from sbi.utils.torchutils import ensure_theta_batched
 
+if TYPE_CHECKING:
+    from arviz.data import InferenceData
+
 
 class MCMCPosterior(NeuralPosterior):
     r"""Provides MCMC to sample from the posterior.<br/><br/>
@@ -656,7 +657,7 @@ class MCMCPosterior(NeuralPosterior):
             force_update=force_update,
         )
 
-    def get_arviz_inference_data(self) -> InferenceData:
+    def get_arviz_inference_data(self) -> "InferenceData":
         """Returns arviz InferenceData object constructed most recent samples.
 
         Note: the InferenceData is constructed using the posterior samples generated in
@@ -668,6 +669,9 @@ class MCMCPosterior(NeuralPosterior):
         Returns:
             inference_data: Arviz InferenceData object.
         """
+        # arviz is slow to import and only needed for diagnostics.
+        import arviz as az
+
         assert (
             self._posterior_sampler is not None
         ), """No samples have been generated, call .sample() first."""
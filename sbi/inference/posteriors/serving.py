@@ -0,0 +1,219 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+"""Serving of concurrent requests to a posterior in batches."""
+
+import asyncio
+import contextlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from torch import Tensor
+
+from sbi.inference.posteriors.direct_posterior import DirectPosterior
+from sbi.sbi_types import Shape
+
+
+class PosteriorServer:
+    r"""Answer concurrent `sample()` and `log_prob()` requests of a `DirectPosterior`
+    in batched calls of the posterior network.
+
+    Every request is for a single observation `x`. Requests that arrive within
+    `max_latency` seconds of the first queued request (up to `max_batch_size` of
+    them) are coalesced into one call of `DirectPosterior.log_prob_batched()`, or of
+    `DirectPosterior.sample_batched()` per requested number of samples, and the
+    results are scattered back to the requests. The network runs in a worker thread,
+    such that the event loop keeps accepting requests for the next batch in the
+    meantime.
+
+    Example:
+    ```
+    async with PosteriorServer(posterior) as server:
+        samples = await server.sample((1000,), x=x_o)
+    ```
+    """
+
+    def __init__(
+        self,
+        posterior: DirectPosterior,
+        max_batch_size: int = 256,
+        max_latency: float = 0.005,
+    ):
+        """
+        Args:
+            posterior: The posterior to serve.
+            max_batch_size: Maximal number of requests, i.e., of observations, that
+                are evaluated in one batch.
+            max_latency: Maximal time in seconds that the first request of a batch
+                waits for further requests before the batch is evaluated.
+        """
+        if not isinstance(posterior, DirectPosterior):
+            raise TypeError(
+                f"Only a `DirectPosterior` can be served, but got {type(posterior)}."
+            )
+        self.posterior = posterior
+        self._theta_dim = posterior.prior.event_shape.numel()
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "PosteriorServer":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def start(self) -> None:
+        """Start batching requests. Has to be called from within the event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._serve())
+
+    async def close(self) -> None:
+        """Stop batching requests and cancel the requests that are still queued or
+        being evaluated."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._worker
+        assert self._queue is not None
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            future.cancel()
+        self._queue = None
+        self._worker = None
+
+    async def sample(self, sample_shape: Shape, x: Tensor) -> Tensor:
+        r"""Return samples from the posterior $p(\theta|x)$ of a single observation.
+
+        Args:
+            sample_shape: Desired shape of samples.
+            x: Observation of shape (*x_shape) or (1, *x_shape).
+
+        Returns:
+            Samples of shape (*sample_shape, parameter_dim).
+        """
+        sample_shape = torch.Size(sample_shape)
+        return await self._submit(("sample", sample_shape.numel()), sample_shape, x)
+
+    async def log_prob(
+        self, theta: Tensor, x: Tensor, norm_posterior: bool = False
+    ) -> Tensor:
+        r"""Return the log-probabilities of parameters under the posterior
+        $p(\theta|x)$ of a single observation.
+
+        Args:
+            theta: Parameters of shape (parameter_dim,) or (num_thetas,
+                parameter_dim).
+            x: Observation of shape (*x_shape) or (1, *x_shape).
+            norm_posterior: Whether to enforce a normalized posterior density, see
+                `DirectPosterior.log_prob()`. Off by default, because the leakage
+                correction samples the posterior network for every request.
+
+        Returns:
+            Log posterior probabilities of shape (num_thetas,).
+        """
+        return await self._submit(("log_prob", norm_posterior), theta, x)
+
+    async def _submit(self, kind: Tuple, arg: Any, x: Tensor) -> Tensor:
+        """Validate a request, queue it and wait for its result.
+
+        Requests are validated before they are queued, such that a malformed request
+        raises immediately instead of failing the batch it is evaluated in.
+        """
+        condition_shape = self.posterior.posterior_estimator._condition_shape
+        try:
+            x = torch.as_tensor(x, dtype=torch.float32).reshape(condition_shape)
+        except RuntimeError as err:
+            raise ValueError(
+                f"Expected a single `x` of shape {tuple(condition_shape)}, but got "
+                f"{tuple(x.shape)}."
+            ) from err
+
+        if kind[0] == "sample" and kind[1] == 0:
+            raise ValueError("At least one sample has to be requested.")
+        if kind[0] == "log_prob":
+            theta = torch.as_tensor(arg, dtype=torch.float32)
+            if theta.ndim not in (1, 2) or theta.shape[-1] != self._theta_dim:
+                raise ValueError(
+                    f"Expected `theta` of shape ({self._theta_dim},) or (num_thetas, "
+                    f"{self._theta_dim}), but got {tuple(theta.shape)}."
+                )
+            arg = theta.reshape(-1, self._theta_dim)
+
+        self.start()
+        assert self._queue is not None
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((kind, (arg, x), future))
+        return await future
+
+    async def _serve(self) -> None:
+        """Collect queued requests into batches and evaluate them, until cancelled."""
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = loop.time() + self.max_latency
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                groups: Dict[Tuple, List] = {}
+                for kind, request, future in batch:
+                    if not future.cancelled():
+                        groups.setdefault(kind, []).append((request, future))
+                for kind, group in groups.items():
+                    requests = [request for request, _ in group]
+                    try:
+                        results = await loop.run_in_executor(
+                            None, self._evaluate, kind, requests
+                        )
+                    except Exception as err:
+                        for _, future in group:
+                            if not future.done():
+                                future.set_exception(err)
+                    else:
+                        for (_, future), result in zip(group, results):
+                            if not future.done():
+                                future.set_result(result)
+            except asyncio.CancelledError:
+                # The server is closed, the requests taken off the queue are not
+                # answered anymore.
+                for _, _, future in batch:
+                    future.cancel()
+                raise
+
+    def _evaluate(self, kind: Tuple, requests: List[Tuple[Any, Tensor]]) -> List:
+        """Return the results of requests of the same kind, evaluated in one batch."""
+        xs = torch.stack([x for _, x in requests])
+
+        if kind[0] == "sample":
+            # All requests of a group are for the same number of samples.
+            samples = self.posterior.sample_batched(
+                (kind[1],), x=xs, show_progress_bars=False
+            )
+            return [
+                samples[:, i].reshape(*sample_shape, self._theta_dim)
+                for i, (sample_shape, _) in enumerate(requests)
+            ]
+
+        # Parameters are padded with zeros to the largest number of a request.
+        thetas = [theta for theta, _ in requests]
+        num_thetas = [theta.shape[0] for theta in thetas]
+        padded = torch.zeros(max(num_thetas), len(thetas), self._theta_dim)
+        for i, theta in enumerate(thetas):
+            padded[: num_thetas[i], i] = theta
+        log_probs = self.posterior.log_prob_batched(
+            padded, x=xs, norm_posterior=kind[1]
+        )
+        return [log_probs[:num, i] for i, num in enumerate(num_thetas)]
@@ -1,5 +1,5 @@
 from abc import ABCMeta, abstractmethod
-from typing import Optional
+from typing import Optional, Tuple
 
 import torch
 from torch import Tensor
@@ -85,3 +85,27 @@ class CallablePotentialWrapper(BasePotential):
     def __call__(self, theta, track_gradients: bool = True):
         with torch.set_grad_enabled(track_gradients):
             return self.callable_potential(theta=theta, x_o=self.x_o)
+
+
+def _iid_chunk_sizes(
+    num_trials: int, num_theta: int, max_batch_size: int
+) -> Tuple[int, int]:
+    """Return chunk sizes over iid trials and parameters for iid evaluation.
+
+    The chunk sizes are chosen such that at most `max_batch_size` combinations of
+    trials and parameters are passed to the network at once. Parameters are chunked
+    only if a single trial does not fit together with all parameters.
+
+    Args:
+        num_trials: Number of iid trials in `x_o`.
+        num_theta: Number of parameters at which to evaluate the potential.
+        max_batch_size: Maximal number of trial-parameter combinations per chunk.
+
+    Returns:
+        Number of trials and number of parameters per chunk.
+    """
+    if max_batch_size < 1:
+        raise ValueError(f"max_batch_size must be positive, got {max_batch_size}.")
+    theta_chunk_size = max(1, min(num_theta, max_batch_size))
+    trial_chunk_size = max(1, min(num_trials, max_batch_size // theta_chunk_size))
+    return trial_chunk_size, theta_chunk_size
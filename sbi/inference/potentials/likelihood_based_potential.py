@@ -7,7 +7,7 @@ import torch
 from torch import Tensor
 from torch.distributions import Distribution
 
-from sbi.inference.potentials.base_potential import BasePotential
+from sbi.inference.potentials.base_potential import BasePotential, _iid_chunk_sizes
 from sbi.neural_nets.density_estimators import DensityEstimator
 from sbi.neural_nets.mnle import MixedDensityEstimator
 from sbi.sbi_types import TorchTransform
@@ -19,6 +19,7 @@ def likelihood_estimator_based_potential(
     prior: Distribution,
     x_o: Optional[Tensor],
     enable_transform: bool = True,
+    max_batch_size: int = 100_000,
 ) -> Tuple[Callable, TorchTransform]:
     r"""Returns potential $\log(p(x_o|\theta)p(\theta))$ for likelihood-based methods.
 
@@ -31,6 +32,9 @@ def likelihood_estimator_based_potential(
         x_o: The observed data at which to evaluate the likelihood.
         enable_transform: Whether to transform parameters to unconstrained space.
              When False, an identity transform will be returned for `theta_transform`.
+        max_batch_size: Maximal number of combinations of iid trials and parameters
+            for which the likelihood is evaluated in one batch. Larger values are
+            faster but require more memory.
 
     Returns:
         The potential function $p(x_o|\theta)p(\theta)$ and a transformation that maps
@@ -40,7 +44,11 @@ def likelihood_estimator_based_potential(
     device = str(next(likelihood_estimator.parameters()).device)
 
     potential_fn = LikelihoodBasedPotential(
-        likelihood_estimator, prior, x_o, device=device
+        likelihood_estimator,
+        prior,
+        x_o,
+        device=device,
+        max_batch_size=max_batch_size,
     )
     theta_transform = mcmc_transform(
         prior, device=device, enable_transform=enable_transform
@@ -58,6 +66,7 @@ class LikelihoodBasedPotential(BasePotential):
         prior: Distribution,
         x_o: Optional[Tensor],
         device: str = "cpu",
+        max_batch_size: int = 100_000,
     ):
         r"""Returns the potential function for likelihood-based methods.
 
@@ -67,14 +76,18 @@ class LikelihoodBasedPotential(BasePotential):
             x_o: The observed data at which to evaluate the likelihood.
             device: The device to which parameters and data are moved before evaluating
                 the `likelihood_nn`.
+            max_batch_size: Maximal number of combinations of iid trials and
+                parameters for which the likelihood is evaluated in one batch. Larger
+                values are faster but require more memory.
 
         Returns:
             The potential function $p(x_o|\theta)p(\theta)$.
         """
 
-        super().__init__(prior, x_o, device)
         self.likelihood_estimator = likelihood_estimator
         self.likelihood_estimator.eval()
+        self.max_batch_size = max_batch_size
+        super().__init__(prior, x_o, device)
 
     def __call__(self, theta: Tensor, track_gradients: bool = True) -> Tensor:
         r"""Returns the potential $\log(p(x_o|\theta)p(\theta))$.
@@ -87,19 +100,24 @@ class LikelihoodBasedPotential(BasePotential):
             The potential $\log(p(x_o|\theta)p(\theta))$.
         """
 
-        # Calculate likelihood over trials and in one batch.
+        # Calculate likelihood over trials in memory-bounded batches.
         log_likelihood_trial_sum = _log_likelihoods_over_trials(
             x=self.x_o,
             theta=theta.to(self.device),
             estimator=self.likelihood_estimator,
             track_gradients=track_gradients,
+            max_batch_size=self.max_batch_size,
         )
 
         return log_likelihood_trial_sum + self.prior.log_prob(theta)  # type: ignore
 
 
 def _log_likelihoods_over_trials(
-    x: Tensor, theta: Tensor, estimator: DensityEstimator, track_gradients: bool = False
+    x: Tensor,
+    theta: Tensor,
+    estimator: DensityEstimator,
+    track_gradients: bool = False,
+    max_batch_size: int = 100_000,
 ) -> Tensor:
     r"""Return log likelihoods summed over iid trials of `x`.
 
@@ -107,13 +125,17 @@ def _log_likelihoods_over_trials(
     to be iid trials, i.e., data generated based on the same paramters /
     experimental conditions.
 
-    Repeats `x` and $\theta$ to cover all their combinations of batch entries.
+    Broadcasts `x` and $\theta$ to cover all their combinations of batch entries.
+    To bound memory, this is done in chunks over trials and, if needed, parameters,
+    and the log likelihoods are summed over chunks of trials.
 
     Args:
         x: batch of iid data.
         theta: batch of parameters.
         estimator: DensityEstimator.
         track_gradients: Whether to track gradients.
+        max_batch_size: Maximal number of combinations of trials and parameters that
+            are evaluated in one batch.
 
     Returns:
         log_likelihood_trial_sum: log likelihood for each parameter, summed over all
@@ -128,13 +150,25 @@ def _log_likelihoods_over_trials(
         {next(estimator.parameters()).device}, {x.device},
         {theta.device}."""
 
-    # Calculate likelihood in one batch.
-    with torch.set_grad_enabled(track_gradients):
-        log_likelihood_trial_batch = estimator.log_prob(x, condition=theta)
-        # Reshape to (-1, theta_batch_size), sum over trial-log likelihoods.
-        log_likelihood_trial_sum = log_likelihood_trial_batch.sum(0)
+    trial_chunk_size, theta_chunk_size = _iid_chunk_sizes(
+        x.shape[0], theta.shape[0], max_batch_size
+    )
 
-    return log_likelihood_trial_sum
+    with torch.set_grad_enabled(track_gradients):
+        log_likelihood_trial_sums = []
+        for theta_chunk in theta.split(theta_chunk_size):
+            log_likelihood_trial_sum = 0.0
+            for x_chunk in x.split(trial_chunk_size):
+                # Shape (trial_chunk_size, theta_chunk_size), sum over trials.
+                log_likelihood_trial_batch = estimator.log_prob(
+                    x_chunk, condition=theta_chunk
+                )
+                log_likelihood_trial_sum = (
+                    log_likelihood_trial_sum + log_likelihood_trial_batch.sum(0)
+                )
+            log_likelihood_trial_sums.append(log_likelihood_trial_sum)
+
+    return torch.cat(log_likelihood_trial_sums)
 
 
 def mixed_likelihood_estimator_based_potential(
@@ -179,19 +213,37 @@ class MixedLikelihoodBasedPotential(LikelihoodBasedPotential):
         # of DensityEstimator
         super().__init__(likelihood_estimator, prior, x_o, device)  # type: ignore
 
+    def set_x(self, x_o: Optional[Tensor]):
+        """Check the shape of the observed data and, if valid, set it.
+
+        The parts of `x_o` that do not depend on the parameters (its continuous and
+        discrete parts, and the jacobian of the log-transform) are computed once here
+        and reused for every evaluation of the potential.
+        """
+        super().set_x(x_o)
+        self._prepared_x_o = (
+            None
+            if self._x_o is None
+            else self.likelihood_estimator.prepare_iid_x(self._x_o)  # type: ignore
+        )
+
     def __call__(self, theta: Tensor, track_gradients: bool = True) -> Tensor:
+        num_trials = self.x_o.shape[0]
+
         # Calculate likelihood in one batch.
         with torch.set_grad_enabled(track_gradients):
             # Call the specific log prob method of the mixed likelihood estimator as
             # this optimizes the evaluation of the discrete data part.
             # TODO: how to fix pyright issues?
-            log_likelihood_trial_batch = self.likelihood_estimator.log_prob_iid(
-                x=self.x_o,
-                theta=theta.to(self.device),
-            )  # type: ignore
+            log_likelihood_trial_batch = (
+                self.likelihood_estimator.log_prob_iid_prepared(  # type: ignore
+                    self._prepared_x_o,
+                    theta=theta.to(self.device),
+                )
+            )
             # Reshape to (x-trials x parameters), sum over trial-log likelihoods.
             log_likelihood_trial_sum = log_likelihood_trial_batch.reshape(
-                self.x_o.shape[0], -1
+                num_trials, -1
             ).sum(0)
 
         return log_likelihood_trial_sum + self.prior.log_prob(theta)  # type: ignore
@@ -7,7 +7,8 @@ import torch
 from torch import Tensor, nn
 from torch.distributions import Distribution
 
-from sbi.inference.potentials.base_potential import BasePotential
+from sbi.inference.potentials.base_potential import BasePotential, _iid_chunk_sizes
+from sbi.neural_nets.classifier import StandardizeInputs
 from sbi.sbi_types import TorchTransform
 from sbi.utils import mcmc_transform
 from sbi.utils.sbiutils import match_theta_and_x_batch_shapes
@@ -19,6 +20,7 @@ def ratio_estimator_based_potential(
     prior: Distribution,
     x_o: Optional[Tensor],
     enable_transform: bool = True,
+    max_batch_size: int = 100_000,
 ) -> Tuple[Callable, TorchTransform]:
     r"""Returns the potential for ratio-based methods.
 
@@ -31,6 +33,9 @@ def ratio_estimator_based_potential(
         x_o: The observed data at which to evaluate the likelihood-to-evidence ratio.
         enable_transform: Whether to transform parameters to unconstrained space.
             When False, an identity transform will be returned for `theta_transform`.
+        max_batch_size: Maximal number of combinations of iid trials and parameters
+            for which the ratio is evaluated in one batch. Larger values are faster
+            but require more memory.
 
     Returns:
         The potential function and a transformation that maps
@@ -39,7 +44,9 @@ def ratio_estimator_based_potential(
 
     device = str(next(ratio_estimator.parameters()).device)
 
-    potential_fn = RatioBasedPotential(ratio_estimator, prior, x_o, device=device)
+    potential_fn = RatioBasedPotential(
+        ratio_estimator, prior, x_o, device=device, max_batch_size=max_batch_size
+    )
     theta_transform = mcmc_transform(
         prior, device=device, enable_transform=enable_transform
     )
@@ -56,6 +63,7 @@ class RatioBasedPotential(BasePotential):
         prior: Distribution,
         x_o: Optional[Tensor],
         device: str = "cpu",
+        max_batch_size: int = 100_000,
     ):
         r"""Returns the potential for ratio-based methods.
 
@@ -64,13 +72,32 @@ class RatioBasedPotential(BasePotential):
             prior: The prior distribution.
             x_o: The observed data at which to evaluate the likelihood-to-evidence
                 ratio.
+            max_batch_size: Maximal number of combinations of iid trials and
+                parameters for which the ratio is evaluated in one batch. Larger
+                values are faster but require more memory.
 
         Returns:
             The potential function.
         """
-        super().__init__(prior, x_o, device)
         self.ratio_estimator = ratio_estimator
         self.ratio_estimator.eval()
+        self.max_batch_size = max_batch_size
+        super().__init__(prior, x_o, device)
+
+    def set_x(self, x_o: Optional[Tensor]):
+        """Check the shape of the observed data and, if valid, set it.
+
+        If the ratio estimator is a classifier built by `sbi`, the (z-scored and)
+        embedded `x_o` is computed once here and reused for every evaluation of the
+        potential.
+        """
+        super().set_x(x_o)
+        self._embedded_x_o = None
+        if self._x_o is not None and _has_separate_input_layer(self.ratio_estimator):
+            with torch.no_grad():
+                self._embedded_x_o = self.ratio_estimator[0].embedding_net_y(
+                    atleast_2d(self._x_o)
+                )
 
     def __call__(self, theta: Tensor, track_gradients: bool = True) -> Tensor:
         r"""Returns the potential for likelihood-ratio-based methods.
@@ -83,12 +110,14 @@ class RatioBasedPotential(BasePotential):
             The potential.
         """
 
-        # Calculate likelihood over trials and in one batch.
+        # Calculate likelihood over trials in memory-bounded batches.
         log_likelihood_trial_sum = _log_ratios_over_trials(
             x=self.x_o,
             theta=theta.to(self.device),
             net=self.ratio_estimator,
             track_gradients=track_gradients,
+            max_batch_size=self.max_batch_size,
+            embedded_x=self._embedded_x_o,
         )
 
         # Move to cpu for comparison with prior.
@@ -96,7 +125,12 @@ class RatioBasedPotential(BasePotential):
 
 
 def _log_ratios_over_trials(
-    x: Tensor, theta: Tensor, net: nn.Module, track_gradients: bool = False
+    x: Tensor,
+    theta: Tensor,
+    net: nn.Module,
+    track_gradients: bool = False,
+    max_batch_size: int = 100_000,
+    embedded_x: Optional[Tensor] = None,
 ) -> Tensor:
     r"""Return log ratios summed over iid trials of `x`.
 
@@ -104,32 +138,68 @@ def _log_ratios_over_trials(
     be iid trials, i.e., data generated based on the same paramters / experimental
     conditions.
 
-    Repeats `x` and $\theta$ to cover all their combinations of batch entries.
+    Repeats `x` and $\theta$ to cover all their combinations of batch entries. To
+    bound memory, this is done in chunks over trials and, if needed, parameters, and
+    the log ratios are summed over chunks of trials.
 
     Args:
         x: batch of iid data.
         theta: batch of parameters
         net: neural net representing the classifier to approximate the ratio.
         track_gradients: Whether to track gradients.
+        max_batch_size: Maximal number of combinations of trials and parameters that
+            are evaluated in one batch.
+        embedded_x: The output of the x-embedding of `net` for `x`. If passed, `net`
+            must be a classifier built by `sbi` and only its theta-embedding and its
+            classifier head are evaluated.
     Returns:
         log_ratio_trial_sum: log ratio for each parameter, summed over all
             batch entries (iid trials) in `x`.
     """
-    theta_repeated, x_repeated = match_theta_and_x_batch_shapes(
-        theta=atleast_2d(theta), x=atleast_2d(x)
-    )
-    assert (
-        x_repeated.shape[0] == theta_repeated.shape[0]
-    ), "x and theta must match in batch shape."
+    theta, x = atleast_2d(theta), atleast_2d(x)
     assert (
         next(net.parameters()).device == x.device and x.device == theta.device
     ), f"""device mismatch: net, x, theta: {next(net.parameters()).device}, {x.device},
         {theta.device}."""
 
-    # Calculate ratios in one batch.
-    with torch.set_grad_enabled(track_gradients):
-        log_ratio_trial_batch = net([theta_repeated, x_repeated])
-        # Reshape to (x-trials x parameters), sum over trial-log likelihoods.
-        log_ratio_trial_sum = log_ratio_trial_batch.reshape(x.shape[0], -1).sum(0)
+    trial_chunk_size, theta_chunk_size = _iid_chunk_sizes(
+        x.shape[0], theta.shape[0], max_batch_size
+    )
 
-    return log_ratio_trial_sum
+    # With a cached x-embedding, only theta is embedded (once per chunk instead of once
+    # per trial) and the classifier head is evaluated on the combined embeddings.
+    trials = x if embedded_x is None else embedded_x
+
+    with torch.set_grad_enabled(track_gradients):
+        log_ratio_trial_sums = []
+        for theta_chunk in theta.split(theta_chunk_size):
+            if embedded_x is not None:
+                theta_chunk = net[0].embedding_net_x(theta_chunk)
+            log_ratio_trial_sum = 0.0
+            for x_chunk in trials.split(trial_chunk_size):
+                theta_repeated, x_repeated = match_theta_and_x_batch_shapes(
+                    theta=theta_chunk, x=x_chunk
+                )
+                if embedded_x is None:
+                    log_ratio_trial_batch = net([theta_repeated, x_repeated])
+                else:
+                    log_ratio_trial_batch = net[1](
+                        torch.cat([theta_repeated, x_repeated], dim=1)
+                    )
+                # Reshape to (x-trials x parameters), sum over trial-log ratios.
+                log_ratio_trial_sum = log_ratio_trial_sum + (
+                    log_ratio_trial_batch.reshape(x_chunk.shape[0], -1).sum(0)
+                )
+            log_ratio_trial_sums.append(log_ratio_trial_sum)
+
+    return torch.cat(log_ratio_trial_sums)
+
+
+def _has_separate_input_layer(net: nn.Module) -> bool:
+    """Return whether `net` is a classifier built by `sbi`, i.e., whether it embeds
+    theta and x separately before passing them to the classifier head."""
+    return (
+        isinstance(net, nn.Sequential)
+        and len(net) == 2
+        and isinstance(net[0], StandardizeInputs)
+    )
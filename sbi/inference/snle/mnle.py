@@ -2,7 +2,6 @@
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
 
-from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 
 from torch import Tensor
@@ -139,7 +138,7 @@ class MNLE(LikelihoodEstimator):
             check_prior(prior)
 
         if density_estimator is None:
-            likelihood_estimator = self._neural_net
+            likelihood_estimator = self._share_neural_net()
             # If internal net is used device is defined.
             device = self._device
         else:
@@ -192,9 +191,9 @@ class MNLE(LikelihoodEstimator):
             raise NotImplementedError
 
         # Store models at end of each round.
-        self._model_bank.append(deepcopy(self._posterior))
+        self._add_to_model_bank(self._posterior)
 
-        return deepcopy(self._posterior)
+        return self._posterior
 
     # Temporary: need to rewrite mixed likelihood estimators as DensityEstimator
     # objects.
@@ -3,7 +3,6 @@
 
 
 from abc import ABC
-from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 
 import torch
@@ -177,6 +176,10 @@ class LikelihoodEstimator(NeuralInference, ABC):
             assert (
                 len(self._x_shape) < 3
             ), "SNLE cannot handle multi-dimensional simulator output."
+            self._neural_net_is_shared = False
+        else:
+            # Do not train a net that was returned or is used by a posterior.
+            self._copy_neural_net_if_shared(resume_training)
 
         self._neural_net.to(self._device)
         if not resume_training:
@@ -204,6 +207,7 @@ class LikelihoodEstimator(NeuralInference, ABC):
                 train_log_probs_sum -= train_losses.sum().item()
 
                 train_loss.backward()
+                self._average_gradients()
                 if clip_max_norm is not None:
                     clip_grad_norm_(
                         self._neural_net.parameters(),
@@ -257,7 +261,7 @@ class LikelihoodEstimator(NeuralInference, ABC):
         # cause memory leakage when benchmarking.
         self._neural_net.zero_grad(set_to_none=True)
 
-        return deepcopy(self._neural_net)
+        return self._share_neural_net()
 
     def build_posterior(
         self,
@@ -310,7 +314,7 @@ class LikelihoodEstimator(NeuralInference, ABC):
             check_prior(prior)
 
         if density_estimator is None:
-            likelihood_estimator = self._neural_net
+            likelihood_estimator = self._share_neural_net()
             # If internal net is used device is defined.
             device = self._device
         else:
@@ -356,9 +360,12 @@ class LikelihoodEstimator(NeuralInference, ABC):
             raise NotImplementedError
 
         # Store models at end of each round.
-        self._model_bank.append(deepcopy(self._posterior))
+        self._add_to_model_bank(self._posterior)
+
+        return self._posterior
 
-        return deepcopy(self._posterior)
+    def _ensemble_loss(self, theta: Tensor, x: Tensor, **loss_kwargs) -> Tensor:
+        return self._loss(theta, x)
 
     def _loss(self, theta: Tensor, x: Tensor) -> Tensor:
         r"""Return loss for SNLE, which is the likelihood of $-\log q(x_i | \theta_i)$.
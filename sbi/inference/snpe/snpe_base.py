@@ -2,7 +2,6 @@
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 import time
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 from warnings import warn
 
@@ -325,6 +324,10 @@ class PosteriorEstimator(NeuralInference, ABC):
             )
 
             del theta, x
+            self._neural_net_is_shared = False
+        else:
+            # Do not train a net that was returned or is used by a posterior.
+            self._copy_neural_net_if_shared(resume_training)
 
         # Move entire net to device for training.
         self._neural_net.to(self._device)
@@ -363,6 +366,7 @@ class PosteriorEstimator(NeuralInference, ABC):
                 train_log_probs_sum -= train_losses.sum().item()
 
                 train_loss.backward()
+                self._average_gradients()
                 if clip_max_norm is not None:
                     clip_grad_norm_(
                         self._neural_net.parameters(), max_norm=clip_max_norm
@@ -425,7 +429,7 @@ class PosteriorEstimator(NeuralInference, ABC):
         # cause memory leakage when benchmarking.
         self._neural_net.zero_grad(set_to_none=True)
 
-        return deepcopy(self._neural_net)
+        return self._share_neural_net()
 
     def build_posterior(
         self,
@@ -483,7 +487,7 @@ class PosteriorEstimator(NeuralInference, ABC):
             utils.check_prior(prior)
 
         if density_estimator is None:
-            posterior_estimator = self._neural_net
+            posterior_estimator = self._share_neural_net()
             # If internal net is used device is defined.
             device = self._device
         else:
@@ -545,9 +549,9 @@ class PosteriorEstimator(NeuralInference, ABC):
             raise NotImplementedError
 
         # Store models at end of each round.
-        self._model_bank.append(deepcopy(self._posterior))
+        self._add_to_model_bank(self._posterior)
 
-        return deepcopy(self._posterior)
+        return self._posterior
 
     @abstractmethod
     def _log_prob_proposal_posterior(
@@ -589,6 +593,19 @@ class PosteriorEstimator(NeuralInference, ABC):
 
         return calibration_kernel(x) * loss
 
+    def _ensemble_loss(self, theta: Tensor, x: Tensor, **loss_kwargs) -> Tensor:
+        """Return the maximum-likelihood loss used by `train_ensemble()`.
+
+        Proposal corrections are not supported, such that ensembles can only be
+        trained on simulations from the prior.
+        """
+        if self._round > 0:
+            raise ValueError(
+                "`train_ensemble()` only supports single-round SNPE, i.e. training on "
+                "simulations from the prior."
+            )
+        return self._neural_net.loss(theta, x)
+
     def _check_proposal(self, proposal):
         """
         Check for validity of the provided proposal distribution.
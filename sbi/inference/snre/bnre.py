@@ -138,3 +138,14 @@ class BNRE(SNRE_A):
         )
 
         return bce + regularization_strength * regularizer
+
+    def _ensemble_loss(
+        self,
+        theta: Tensor,
+        x: Tensor,
+        regularization_strength: float = 100.0,
+        **loss_kwargs,
+    ) -> Tensor:
+        return super()._ensemble_loss(
+            theta, x, regularization_strength=regularization_strength, **loss_kwargs
+        )
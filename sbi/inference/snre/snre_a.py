@@ -122,3 +122,8 @@ class SNRE_A(RatioEstimator):
 
         # Binary cross entropy to learn the likelihood (AALR-specific)
         return nn.BCELoss()(likelihood, labels)
+
+    def _ensemble_loss(self, theta: Tensor, x: Tensor, **loss_kwargs) -> Tensor:
+        # AALR is defined for `num_atoms=2`.
+        loss_kwargs["num_atoms"] = 2
+        return super()._ensemble_loss(theta, x, **loss_kwargs)
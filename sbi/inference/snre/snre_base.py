@@ -1,5 +1,4 @@
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 
 import torch
@@ -200,6 +199,10 @@ class RatioEstimator(NeuralInference, ABC):
             )
             self._x_shape = x_shape_from_simulation(x.to("cpu"))
             del x, theta
+            self._neural_net_is_shared = False
+        else:
+            # Do not train a net that was returned or is used by a posterior.
+            self._copy_neural_net_if_shared(resume_training)
         self._neural_net.to(self._device)
 
         if not resume_training:
@@ -229,6 +232,7 @@ class RatioEstimator(NeuralInference, ABC):
                 train_log_probs_sum -= train_losses.sum().item()
 
                 train_loss.backward()
+                self._average_gradients()
                 if clip_max_norm is not None:
                     clip_grad_norm_(
                         self._neural_net.parameters(),
@@ -282,7 +286,7 @@ class RatioEstimator(NeuralInference, ABC):
         # cause memory leakage when benchmarking.
         self._neural_net.zero_grad(set_to_none=True)
 
-        return deepcopy(self._neural_net)
+        return self._share_neural_net()
 
     def _classifier_logits(self, theta: Tensor, x: Tensor, num_atoms: int) -> Tensor:
         """Return logits obtained through classifier forward pass.
@@ -309,6 +313,11 @@ class RatioEstimator(NeuralInference, ABC):
     def _loss(self, theta: Tensor, x: Tensor, num_atoms: int) -> Tensor:
         raise NotImplementedError
 
+    def _ensemble_loss(
+        self, theta: Tensor, x: Tensor, num_atoms: int = 10, **loss_kwargs
+    ) -> Tensor:
+        return self._loss(theta, x, num_atoms, **loss_kwargs)
+
     def build_posterior(
         self,
         density_estimator: Optional[nn.Module] = None,
@@ -363,7 +372,7 @@ class RatioEstimator(NeuralInference, ABC):
             check_prior(prior)
 
         if density_estimator is None:
-            ratio_estimator = self._neural_net
+            ratio_estimator = self._share_neural_net()
             # If internal net is used device is defined.
             device = self._device
         else:
@@ -409,6 +418,6 @@ class RatioEstimator(NeuralInference, ABC):
             raise NotImplementedError
 
         # Store models at end of each round.
-        self._model_bank.append(deepcopy(self._posterior))
+        self._add_to_model_bank(self._posterior)
 
-        return deepcopy(self._posterior)
+        return self._posterior
@@ -189,6 +189,11 @@ class SNRE_C(RatioEstimator):
         p_marginal, p_joint = self._get_prior_probs_marginal_and_joint(gamma)
         return -torch.mean(p_marginal * log_prob_marginal + p_joint * log_prob_joint)
 
+    def _ensemble_loss(
+        self, theta: Tensor, x: Tensor, num_classes: int = 5, gamma: float = 1.0
+    ) -> Tensor:
+        return self._loss(theta, x, num_classes + 1, gamma)
+
     @staticmethod
     def _get_prior_probs_marginal_and_joint(gamma: float) -> Tuple[float, float]:
         r"""Return a tuple (p_marginal, p_joint) where `p_marginal := `$p_0$,
@@ -283,7 +283,18 @@ def posterior_nn(
         if model not in model_builders:
             raise NotImplementedError("Model {model} in not implemented")
 
-        return model_builders[model](batch_x=batch_theta, batch_y=batch_x, **kwargs)
+        density_estimator = model_builders[model](
+            batch_x=batch_theta, batch_y=batch_x, **kwargs
+        )
+        # Record the architecture, such that the trained estimator can be rebuilt
+        # from its weights, see `sbi.inference.posteriors.export`.
+        density_estimator._build_config = dict(
+            model=model,
+            input_shape=tuple(batch_theta.shape[1:]),
+            condition_shape=tuple(batch_x.shape[1:]),
+            kwargs=kwargs,
+        )
+        return density_estimator
 
     if model == "mdn_snpe_a":
         if num_components != 10:
@@ -344,19 +344,56 @@ class MixedDensityEstimator(nn.Module):
             Tensor: log probs with shape (num_trials, num_parameters), i.e., the log
                 prob for each theta for each trial.
         """
+        return self.log_prob_iid_prepared(self.prepare_iid_x(x), theta)
 
-        theta = atleast_2d(theta)
+    def prepare_iid_x(self, x: Tensor) -> Tuple[Tensor, Tensor, Optional[Tensor]]:
+        """Return all quantities of a batch of iid x that do not depend on theta.
+
+        The result can be passed to `.log_prob_iid_prepared()` to evaluate the log
+        prob for many batches of theta without repeating this work, e.g., during MCMC.
+
+        Args:
+            x: batch of iid data.
+
+        Returns:
+            The (log-transformed) continuous part of x, the discrete part of x, and the
+            log abs det jacobian of the log transform (or `None` if x is not
+            log-transformed).
+        """
         x = atleast_2d(x)
+        x_cont, x_disc = _separate_x(x)
+        if self.log_transform_x:
+            # log abs det jacobian of RTs: log(1/rt) = - log(rt)
+            log_x_cont = torch.log(x_cont)
+            return log_x_cont, x_disc, -log_x_cont
+        return x_cont, x_disc, None
+
+    def log_prob_iid_prepared(
+        self, prepared_x: Tuple[Tensor, Tensor, Optional[Tensor]], theta: Tensor
+    ) -> Tensor:
+        """Return log prob given iid x prepared with `.prepare_iid_x()` and a batch of
+        theta, see `.log_prob_iid()`.
+
+        Args:
+            prepared_x: output of `.prepare_iid_x()` for a batch of iid data.
+            theta: batch of parameters to be evaluated, i.e., each batch entry will be
+                evaluated for the entire batch of iid x.
+
+        Returns:
+            Tensor: log probs with shape (num_trials, num_parameters), i.e., the log
+                prob for each theta for each trial.
+        """
+        x_cont, x_disc, log_abs_det = prepared_x
+        theta = atleast_2d(theta)
         batch_size = theta.shape[0]
-        num_trials = x.shape[0]
-        theta_repeated, x_repeated = match_theta_and_x_batch_shapes(theta, x)
+        num_trials = x_cont.shape[0]
         net_device = next(self.discrete_net.parameters()).device
+        x_device = x_cont.device
         assert (
-            net_device == x.device and x.device == theta.device
-        ), f"device mismatch: net, x, theta: {net_device}, {x.device}, {theta.device}."
-
-        x_cont_repeated, x_disc_repeated = _separate_x(x_repeated)
-        x_cont, x_disc = _separate_x(x)
+            net_device == x_device and x_device == theta.device
+        ), f"device mismatch: net, x, theta: {net_device}, {x_device}, {theta.device}."
+        theta_repeated, x_cont_repeated = match_theta_and_x_batch_shapes(theta, x_cont)
+        x_disc_repeated = x_disc.repeat_interleave(batch_size, dim=0)
 
         # repeat categories for parameters
         repeated_categories = torch.repeat_interleave(
@@ -381,7 +418,7 @@ class MixedDensityEstimator(nn.Module):
 
         # Get repeat discrete data and theta to match in batch shape for flow eval.
         log_probs_cont = self.continuous_net.log_prob(
-            torch.log(x_cont_repeated) if self.log_transform_x else x_cont_repeated,
+            x_cont_repeated,
             condition=torch.cat((theta_repeated, x_disc_repeated), dim=1),
         )
 
@@ -390,9 +427,9 @@ class MixedDensityEstimator(nn.Module):
             num_trials, batch_size
         )
 
-        # Maybe add log abs det jacobian of RTs: log(1/rt) = - log(rt)
-        if self.log_transform_x:
-            log_probs_combined -= torch.log(x_cont)
+        # Maybe add log abs det jacobian of RTs.
+        if log_abs_det is not None:
+            log_probs_combined += log_abs_det
 
         # Return batch over trials as required by SBI potentials.
         return log_probs_combined
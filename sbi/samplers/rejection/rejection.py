@@ -186,6 +186,49 @@ def rejection_sample(
     return samples, as_tensor(acceptance_rate)
 
 
+def _warn_low_acceptance(
+    acceptance_rate: float,
+    num_remaining: int,
+    sample_for_correction_factor: bool = False,
+    alternative_method: Optional[str] = None,
+) -> None:
+    """Warn that rejection sampling is slow because few samples are accepted.
+
+    Args:
+        acceptance_rate: Fraction of accepted samples so far.
+        num_remaining: Number of samples that remain to be collected.
+        sample_for_correction_factor: True if the samples are drawn to estimate the
+            leakage correction of `log_prob()`.
+        alternative_method: An alternative method for sampling, suggested in the
+            warning.
+    """
+    if sample_for_correction_factor:
+        logging.warning(
+            f"""Drawing samples from posterior to estimate the normalizing
+                constant for `log_prob()`. However, only
+                {acceptance_rate:.3%} posterior samples are within the
+                prior support. It may take a long time to collect the
+                remaining {num_remaining} samples.
+                Consider interrupting (Ctrl-C) and either basing the
+                estimate of the normalizing constant on fewer samples (by
+                calling `posterior.leakage_correction(x_o,
+                num_rejection_samples=N)`, where `N` is the number of
+                samples you want to base the
+                estimate on (default N=10000), or not estimating the
+                normalizing constant at all
+                (`log_prob(..., norm_posterior=False)`. The latter will
+                result in an unnormalized `log_prob()`."""
+        )
+    else:
+        warn_msg = f"""Only {acceptance_rate:.3%} proposal samples are
+            accepted. It may take a long time to collect the remaining
+            {num_remaining} samples. """
+        if alternative_method is not None:
+            warn_msg += f"""Consider interrupting (Ctrl-C) and switching to
+            `{alternative_method}`."""
+        logging.warning(warn_msg)
+
+
 @torch.no_grad()
 def accept_reject_sample(
     proposal: Union[nn.Module, Distribution],
@@ -300,32 +343,12 @@ def accept_reject_sample(
             and acceptance_rate < warn_acceptance
             and not leakage_warning_raised
         ):
-            if sample_for_correction_factor:
-                logging.warning(
-                    f"""Drawing samples from posterior to estimate the normalizing
-                        constant for `log_prob()`. However, only
-                        {acceptance_rate:.3%} posterior samples are within the
-                        prior support. It may take a long time to collect the
-                        remaining {num_remaining} samples.
-                        Consider interrupting (Ctrl-C) and either basing the
-                        estimate of the normalizing constant on fewer samples (by
-                        calling `posterior.leakage_correction(x_o,
-                        num_rejection_samples=N)`, where `N` is the number of
-                        samples you want to base the
-                        estimate on (default N=10000), or not estimating the
-                        normalizing constant at all
-                        (`log_prob(..., norm_posterior=False)`. The latter will
-                        result in an unnormalized `log_prob()`."""
-                )
-            else:
-                warn_msg = f"""Only {acceptance_rate:.3%} proposal samples are
-                    accepted. It may take a long time to collect the remaining
-                    {num_remaining} samples. """
-                if alternative_method is not None:
-                    warn_msg += f"""Consider interrupting (Ctrl-C) and switching to
-                    `{alternative_method}`."""
-                logging.warning(warn_msg)
-
+            _warn_low_acceptance(
+                acceptance_rate,
+                num_remaining,
+                sample_for_correction_factor,
+                alternative_method,
+            )
             leakage_warning_raised = True  # Ensure warning is raised just once.
 
     pbar.close()
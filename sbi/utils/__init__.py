@@ -1,72 +1,167 @@
 # flake8: noqa
-from sbi.utils.analysis_utils import get_1d_marginal_peaks_from_kde
-from sbi.utils.conditional_density_utils import extract_and_transform_mog
-from sbi.utils.io import get_data_root, get_log_root, get_project_root
-from sbi.utils.kde import KDEWrapper, get_kde
-from sbi.utils.potentialutils import pyro_potential_wrapper, transformed_potential
-from sbi.utils.restriction_estimator import (
-    RestrictedPrior,
-    RestrictionEstimator,
-    get_density_thresholder,
-)
-from sbi.utils.sbiutils import (
-    batched_mixture_mv,
-    batched_mixture_vmv,
-    check_dist_class,
-    check_warn_and_setstate,
-    clamp_and_warn,
-    del_entries,
-    expit,
-    get_simulations_since_round,
-    gradient_ascent,
-    handle_invalid_x,
-    logit,
-    mask_sims_from_prior,
-    match_theta_and_x_batch_shapes,
-    mcmc_transform,
-    mog_log_prob,
-    nle_nre_apt_msg_on_invalid_x,
-    npe_msg_on_invalid_x,
-    standardizing_net,
-    standardizing_transform,
-    warn_if_zscoring_changes_data,
-    within_support,
-    x_shape_from_simulation,
-    z_score_parser,
-)
-from sbi.utils.torchutils import (
-    BoxUniform,
-    assert_all_finite,
-    cbrt,
-    create_alternating_binary_mask,
-    create_mid_split_binary_mask,
-    create_random_binary_mask,
-    gaussian_kde_log_eval,
-    get_num_parameters,
-    get_temperature,
-    logabsdet,
-    merge_leading_dims,
-    random_orthogonal,
-    repeat_rows,
-    searchsorted,
-    split_leading_dim,
-    sum_except_batch,
-    tensor2numpy,
-    tile,
-)
-from sbi.utils.typechecks import (
-    is_bool,
-    is_int,
-    is_nonnegative_int,
-    is_positive_int,
-    is_power_of_two,
-)
-from sbi.utils.user_input_checks import (
-    check_estimator_arg,
-    check_prior,
-    process_prior,
-    process_x,
-    test_posterior_net_for_multi_d_x,
-    validate_theta_and_x,
-)
-from sbi.utils.user_input_checks_utils import MultipleIndependent
+from typing import TYPE_CHECKING
+
+from sbi.utils.lazy_imports import lazy_imports
+
+# Utilities are imported on first use, such that importing a single utility does not
+# load the dependencies of all others (e.g. `sklearn` for KDE or `scipy` for analysis).
+_imports = {
+    "sbi.utils.analysis_utils": ["get_1d_marginal_peaks_from_kde"],
+    "sbi.utils.conditional_density_utils": ["extract_and_transform_mog"],
+    "sbi.utils.io": [
+        "get_data_root",
+        "get_log_root",
+        "get_project_root",
+    ],
+    "sbi.utils.kde": [
+        "KDEWrapper",
+        "get_kde",
+    ],
+    "sbi.utils.potentialutils": [
+        "pyro_potential_wrapper",
+        "transformed_potential",
+    ],
+    "sbi.utils.restriction_estimator": [
+        "RestrictedPrior",
+        "RestrictionEstimator",
+        "get_density_thresholder",
+    ],
+    "sbi.utils.sbiutils": [
+        "batched_mixture_mv",
+        "batched_mixture_vmv",
+        "check_dist_class",
+        "check_warn_and_setstate",
+        "clamp_and_warn",
+        "del_entries",
+        "expit",
+        "get_simulations_since_round",
+        "gradient_ascent",
+        "handle_invalid_x",
+        "logit",
+        "mask_sims_from_prior",
+        "match_theta_and_x_batch_shapes",
+        "mcmc_transform",
+        "mog_log_prob",
+        "nle_nre_apt_msg_on_invalid_x",
+        "npe_msg_on_invalid_x",
+        "standardizing_net",
+        "standardizing_transform",
+        "warn_if_zscoring_changes_data",
+        "within_support",
+        "x_shape_from_simulation",
+        "z_score_parser",
+    ],
+    "sbi.utils.simulation_cache": ["SimulationCache"],
+    "sbi.utils.torchutils": [
+        "BoxUniform",
+        "assert_all_finite",
+        "cbrt",
+        "create_alternating_binary_mask",
+        "create_mid_split_binary_mask",
+        "create_random_binary_mask",
+        "gaussian_kde_log_eval",
+        "get_num_parameters",
+        "get_temperature",
+        "logabsdet",
+        "merge_leading_dims",
+        "random_orthogonal",
+        "repeat_rows",
+        "searchsorted",
+        "split_leading_dim",
+        "sum_except_batch",
+        "tensor2numpy",
+        "tile",
+    ],
+    "sbi.utils.typechecks": [
+        "is_bool",
+        "is_int",
+        "is_nonnegative_int",
+        "is_positive_int",
+        "is_power_of_two",
+    ],
+    "sbi.utils.user_input_checks": [
+        "check_estimator_arg",
+        "check_prior",
+        "process_prior",
+        "process_x",
+        "test_posterior_net_for_multi_d_x",
+        "validate_theta_and_x",
+    ],
+    "sbi.utils.user_input_checks_utils": ["MultipleIndependent"],
+}
+__getattr__, __dir__ = lazy_imports(__name__, _imports)
+__all__ = sorted(name for names in _imports.values() for name in names)
+
+if TYPE_CHECKING:
+    from sbi.utils.analysis_utils import get_1d_marginal_peaks_from_kde
+    from sbi.utils.conditional_density_utils import extract_and_transform_mog
+    from sbi.utils.io import get_data_root, get_log_root, get_project_root
+    from sbi.utils.kde import KDEWrapper, get_kde
+    from sbi.utils.potentialutils import pyro_potential_wrapper, transformed_potential
+    from sbi.utils.restriction_estimator import (
+        RestrictedPrior,
+        RestrictionEstimator,
+        get_density_thresholder,
+    )
+    from sbi.utils.sbiutils import (
+        batched_mixture_mv,
+        batched_mixture_vmv,
+        check_dist_class,
+        check_warn_and_setstate,
+        clamp_and_warn,
+        del_entries,
+        expit,
+        get_simulations_since_round,
+        gradient_ascent,
+        handle_invalid_x,
+        logit,
+        mask_sims_from_prior,
+        match_theta_and_x_batch_shapes,
+        mcmc_transform,
+        mog_log_prob,
+        nle_nre_apt_msg_on_invalid_x,
+        npe_msg_on_invalid_x,
+        standardizing_net,
+        standardizing_transform,
+        warn_if_zscoring_changes_data,
+        within_support,
+        x_shape_from_simulation,
+        z_score_parser,
+    )
+    from sbi.utils.simulation_cache import SimulationCache
+    from sbi.utils.torchutils import (
+        BoxUniform,
+        assert_all_finite,
+        cbrt,
+        create_alternating_binary_mask,
+        create_mid_split_binary_mask,
+        create_random_binary_mask,
+        gaussian_kde_log_eval,
+        get_num_parameters,
+        get_temperature,
+        logabsdet,
+        merge_leading_dims,
+        random_orthogonal,
+        repeat_rows,
+        searchsorted,
+        split_leading_dim,
+        sum_except_batch,
+        tensor2numpy,
+        tile,
+    )
+    from sbi.utils.typechecks import (
+        is_bool,
+        is_int,
+        is_nonnegative_int,
+        is_positive_int,
+        is_power_of_two,
+    )
+    from sbi.utils.user_input_checks import (
+        check_estimator_arg,
+        check_prior,
+        process_prior,
+        process_x,
+        test_posterior_net_for_multi_d_x,
+        validate_theta_and_x,
+    )
+    from sbi.utils.user_input_checks_utils import MultipleIndependent
@@ -1,3 +1,4 @@
+import math
 from typing import Optional, Union
 
 import numpy as np
@@ -22,14 +23,22 @@ class KDEWrapper:
         self.transform = transform
 
     def sample(self, *args, **kwargs):
-        Y = torch.from_numpy(self.kde.sample(*args, **kwargs).astype(np.float32))
+        if isinstance(self.kde, TorchKernelDensity):
+            Y = self.kde.sample(*args, **kwargs)
+        else:
+            Y = torch.from_numpy(self.kde.sample(*args, **kwargs).astype(np.float32))
         return self.transform.inv(Y)
 
     def log_prob(self, parameters_constrained):
         parameters_unconstrained = self.transform(parameters_constrained)
-        log_probs = torch.from_numpy(
-            self.kde.score_samples(parameters_unconstrained.numpy()).astype(np.float32)
-        )
+        if isinstance(self.kde, TorchKernelDensity):
+            log_probs = self.kde.score_samples(parameters_unconstrained)
+        else:
+            log_probs = torch.from_numpy(
+                self.kde.score_samples(parameters_unconstrained.numpy()).astype(
+                    np.float32
+                )
+            )
         log_probs += self.transform.log_abs_det_jacobian(
             parameters_constrained, parameters_unconstrained
         )
@@ -49,6 +58,8 @@ def get_kde(
     sample_weights: Optional[np.ndarray] = None,
     num_cv_partitions: int = 20,
     num_cv_repetitions: int = 5,
+    backend: str = "sklearn",
+    bandwidth_matrix: str = "scalar",
 ) -> KDEWrapper:
     """Get KDE estimator with selected bandwidth.
 
@@ -62,6 +73,15 @@ def get_kde(
         num_cv_partitions: number of partitions for cross validation
         num_cv_repetitions: how many times to repeat the cross validation to zoom into
             the hyperparameter grid.
+        backend: `sklearn` to use `sklearn.neighbors.KernelDensity`, or `torch` to use
+            `TorchKernelDensity`. With `torch`, 'cv' selects the bandwidth with the
+            leave-one-out likelihood of all candidate bandwidths, computed in one
+            vectorized pass, and `num_cv_partitions` and `num_cv_repetitions` are
+            ignored.
+        bandwidth_matrix: Only for the `torch` backend. The shape of the bandwidth
+            matrix, `scalar`, `diag` or `full`. For `diag` and `full`, the bandwidth
+            is relative to the (weighted) standard deviations or covariance of the
+            samples.
 
     References:
     [1]: https://github.com/scikit-learn/scikit-learn/blob/
@@ -74,6 +94,30 @@ def get_kde(
         transform_ = IndependentTransform(transform_, reinterpreted_batch_ndims=1)
     if isinstance(bandwidth, str):
         assert bandwidth in ["cv", "scott", "silvermann"], "invalid kde bandwidth name."
+    assert backend in ["sklearn", "torch"], "invalid kde backend name."
+
+    if backend == "torch":
+        kde = TorchKernelDensity(bandwidth_matrix=bandwidth_matrix).fit(
+            transform_(samples), sample_weight=sample_weights
+        )
+        num_samples, dim_samples = kde.samples.shape
+        if bandwidth == "cv":
+            candidates = kde.default_bandwidth_candidates()
+            scores = kde.leave_one_out_log_likelihood(candidates)
+            kde.bandwidth = float(candidates[scores.argmax()])
+        elif bandwidth == "scott":
+            kde.bandwidth = num_samples ** (-1.0 / (dim_samples + 4))
+        elif bandwidth == "silvermann":
+            kde.bandwidth = (num_samples * (dim_samples + 2) / 4.0) ** (
+                -1.0 / (dim_samples + 4)
+            )
+        elif float(bandwidth) > 0:
+            kde.bandwidth = float(bandwidth)
+        else:
+            raise ValueError(
+                "bandwidth must be positive, 'scott', 'silvermann' or 'cv'"
+            )
+        return KDEWrapper(kde, transform_)
 
     transformed_samples = transform_(samples).numpy()  # type: ignore
     num_samples, dim_samples = transformed_samples.shape
@@ -159,3 +203,133 @@ def get_kde(
     kde.fit(transformed_samples, sample_weight=sample_weights)
 
     return KDEWrapper(kde, transform_)
+
+
+class TorchKernelDensity:
+    """Gaussian kernel density estimator in torch.
+
+    Mirrors the `fit()`, `sample()` and `score_samples()` interface of
+    `sklearn.neighbors.KernelDensity` on tensors. The kernel covariance is
+    `bandwidth**2` times an identity (`scalar`), the diagonal of the sample
+    covariance (`diag`), or the full sample covariance (`full`). Densities are
+    evaluated with chunked pairwise log-sum-exp, such that at most `max_batch_size`
+    kernel evaluations are held in memory at once.
+    """
+
+    def __init__(
+        self,
+        bandwidth: float = 1.0,
+        bandwidth_matrix: str = "scalar",
+        max_batch_size: int = 2**22,
+    ):
+        assert bandwidth_matrix in [
+            "scalar",
+            "diag",
+            "full",
+        ], "bandwidth_matrix must be one of 'scalar', 'diag', 'full'."
+        self.bandwidth = bandwidth
+        self.bandwidth_matrix = bandwidth_matrix
+        self.max_batch_size = max_batch_size
+
+    def fit(
+        self, samples: Tensor, sample_weight: Optional[Tensor] = None
+    ) -> "TorchKernelDensity":
+        """Fit the density estimator on (optionally weighted) samples."""
+        self.samples = samples
+        num_samples, dim_samples = samples.shape
+        if sample_weight is None:
+            weights = torch.ones(num_samples, device=samples.device)
+        else:
+            weights = torch.as_tensor(sample_weight).to(samples)
+        self.weights = weights / weights.sum()
+        self._log_weights = self.weights.log()
+
+        if self.bandwidth_matrix == "scalar":
+            self._scale_tril = torch.eye(dim_samples).to(samples)
+        else:
+            centered = samples - self.weights @ samples
+            covariance = (self.weights.unsqueeze(1) * centered).T @ centered
+            if self.bandwidth_matrix == "diag":
+                self._scale_tril = torch.diag(covariance.diag().sqrt())
+            else:
+                self._scale_tril = torch.linalg.cholesky(covariance)
+        self._log_det_scale = self._scale_tril.diag().log().sum()
+        self._whitened_samples = self._whiten(samples)
+        return self
+
+    def default_bandwidth_candidates(self, num_candidates: int = 50) -> Tensor:
+        """Return log-spaced bandwidths between 1% and 100% of the (whitened) standard
+        deviation of the samples."""
+        scale = self._whitened_samples.std() if self.bandwidth_matrix == "scalar" else 1
+        return scale * torch.logspace(-2, 0, num_candidates).to(self.samples)
+
+    def score_samples(self, x: Tensor) -> Tensor:
+        """Return the log-density at every point in `x`."""
+        whitened_x = self._whiten(x.to(self.samples))
+        chunk_size = max(1, self.max_batch_size // self.samples.shape[0])
+        log_probs = []
+        for x_chunk in whitened_x.split(chunk_size):
+            squared_distances = torch.cdist(x_chunk, self._whitened_samples) ** 2
+            log_probs.append(
+                torch.logsumexp(
+                    self._log_weights - squared_distances / (2 * self.bandwidth**2),
+                    dim=1,
+                )
+            )
+        return torch.cat(log_probs) + self._log_normalizer(self.bandwidth)
+
+    def sample(self, sample_shape: Union[int, tuple] = 1) -> Tensor:
+        """Return samples from the density estimator."""
+        sample_shape = (
+            torch.Size((sample_shape,))
+            if isinstance(sample_shape, int)
+            else torch.Size(sample_shape)
+        )
+        num_draws = sample_shape.numel()
+        idx = torch.multinomial(self.weights, num_draws, replacement=True)
+        noise = self.bandwidth * torch.randn_like(self.samples[idx])
+        samples = self.samples[idx] + noise @ self._scale_tril.T
+        return samples.reshape(*sample_shape, -1)
+
+    def leave_one_out_log_likelihood(self, bandwidths: Tensor) -> Tensor:
+        """Return the (weighted) mean leave-one-out log-likelihood of the samples for
+        every bandwidth in `bandwidths`.
+
+        The pairwise distances are computed once per chunk of samples and shared by
+        all bandwidths.
+        """
+        bandwidths = torch.as_tensor(bandwidths).to(self.samples)
+        num_samples = self.samples.shape[0]
+        chunk_size = max(1, self.max_batch_size // (num_samples * bandwidths.numel()))
+        inverse_variances = (1 / (2 * bandwidths**2)).reshape(-1, 1, 1)
+
+        scores = torch.zeros_like(bandwidths)
+        for start in range(0, num_samples, chunk_size):
+            x_chunk = self._whitened_samples[start : start + chunk_size]
+            squared_distances = torch.cdist(x_chunk, self._whitened_samples) ** 2
+            # Leave each sample out of its own density estimate.
+            rows = torch.arange(x_chunk.shape[0])
+            squared_distances[rows, rows + start] = math.inf
+            log_densities = torch.logsumexp(
+                self._log_weights - inverse_variances * squared_distances, dim=2
+            )
+            weights = self.weights[start : start + chunk_size]
+            log_densities = log_densities - torch.log1p(-weights)
+            scores += log_densities @ weights
+        return scores + self._log_normalizer(bandwidths)
+
+    def _whiten(self, x: Tensor) -> Tensor:
+        return torch.linalg.solve_triangular(
+            self._scale_tril, x.T, upper=False
+        ).T.contiguous()
+
+    def _log_normalizer(self, bandwidth: Union[float, Tensor]) -> Union[float, Tensor]:
+        dim_samples = self.samples.shape[1]
+        log_bandwidth = (
+            bandwidth.log() if isinstance(bandwidth, Tensor) else math.log(bandwidth)
+        )
+        return (
+            -dim_samples * log_bandwidth
+            - 0.5 * dim_samples * math.log(2 * math.pi)
+            - self._log_det_scale
+        )
@@ -0,0 +1,62 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+"""Lazy loading of the public names of sbi packages (PEP 562)."""
+
+import importlib
+import sys
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def lazy_imports(
+    package_name: str,
+    imports: Dict[str, Sequence[str]],
+    aliases: Optional[Dict[str, str]] = None,
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Return module-level `__getattr__` and `__dir__` that import names on first use.
+
+    Packages such as `sbi.inference` expose many classes whose modules import heavy
+    dependencies (e.g. `arviz`, `pyro` or `sklearn`). Instead of importing all of them
+    in the `__init__.py`, a name is only imported from its module when it is first
+    accessed, e.g. by `from sbi.inference import SNPE`. It is then cached in the
+    package, such that later accesses do not go through `__getattr__` again.
+    Other names are looked up as subpackages or submodules of the package, such that
+    e.g. `sbi.inference.snpe` is available after `import sbi.inference`.
+
+    Args:
+        package_name: `__name__` of the package.
+        imports: Maps each module to the names that the package exposes from it.
+        aliases: Maps names exposed by the package to one of the names in `imports`,
+            e.g. `{"SNPE": "SNPE_C"}`.
+
+    Returns:
+        `__getattr__` and `__dir__` to be assigned in the `__init__.py` of the package.
+    """
+    origins = {name: module for module, names in imports.items() for name in names}
+    aliases = aliases or {}
+
+    def __getattr__(name: str) -> Any:
+        target = aliases.get(name, name)
+        if target in origins:
+            value = getattr(importlib.import_module(origins[target]), target)
+        elif not name.startswith("__"):
+            submodule_name = f"{package_name}.{name}"
+            try:
+                value = importlib.import_module(submodule_name)
+            except ModuleNotFoundError as err:
+                if err.name != submodule_name:
+                    raise
+                raise AttributeError(
+                    f"module {package_name!r} has no attribute {name!r}"
+                ) from None
+        else:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(
+            set(vars(sys.modules[package_name])) | set(origins) | set(aliases)
+        )
+
+    return __getattr__, __dir__
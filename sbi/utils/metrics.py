@@ -1,10 +1,11 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import numpy as np
 import torch
+from joblib import Parallel, delayed
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import KFold, cross_val_score
 from sklearn.neural_network import MLPClassifier
@@ -18,6 +19,8 @@ def c2st(
     n_folds: int = 5,
     metric: str = "accuracy",
     classifier: str = "rf",
+    backend: str = "sklearn",
+    num_workers: int = 1,
 ) -> Tensor:
     """
     Return accuracy of classifier trained to distinguish samples from supposedly two
@@ -35,14 +38,18 @@ def c2st(
     and this difference is divided by std(X) for every dimension.
 
     If you need a more flexible interface which is able to take a sklearn compatible
-    classifier and more, see the `c2st_` method in this module.
+    classifier and more, see the `c2st_` method in this module. To compute many C2STs
+    at once, e.g. one for every parameter dimension, see `batched_c2st`.
 
     Args:
         X: Samples from one distribution. Y: Samples from another distribution. seed:
         Seed for the sklearn classifier and the KFold cross-validation n_folds: Number
         of folds to use metric: sklearn compliant metric to use for the scoring
         parameter of cross_val_score classifier: classification architecture to use,
-        possible values: 'rf' or 'mlp'
+        possible values: 'rf' or 'mlp' backend: 'sklearn' or 'torch'. The 'torch'
+        backend trains an MLP on all folds at once with torch and ignores <classifier>
+        and <metric>, see `batched_c2st`. num_workers: number of processes to train
+        the folds of the 'sklearn' backend in parallel
 
     Return:
         torch.tensor containing the mean accuracy score over the test sets from
@@ -58,6 +65,13 @@ def c2st(
         https://github.com/psteinb/c2st/
     """
 
+    if backend == "torch":
+        return batched_c2st(
+            X.unsqueeze(0), Y.unsqueeze(0), seed=seed, n_folds=n_folds, backend=backend
+        )
+    elif backend != "sklearn":
+        raise ValueError(f"backend must be 'sklearn' or 'torch', not {backend}.")
+
     # the default configuration
     clf_class = RandomForestClassifier
     clf_kwargs = {}
@@ -89,6 +103,7 @@ def c2st(
         verbosity=verbosity,
         clf_class=clf_class,
         clf_kwargs=clf_kwargs,
+        num_workers=num_workers,
     )
 
     # TODO: unclear why np.asarray needs to be used here
@@ -108,6 +123,7 @@ def c2st_scores(
     verbosity: int = 0,
     clf_class: Any = RandomForestClassifier,
     clf_kwargs: Optional[Dict[str, Any]] = None,
+    num_workers: int = 1,
 ) -> Tensor:
     """
     Return accuracy of classifier trained to distinguish samples from supposedly two
@@ -179,73 +195,491 @@ def c2st_scores(
 
     shuffle = KFold(n_splits=n_folds, shuffle=True, random_state=seed)
     scores = cross_val_score(
-        clf, data, target, cv=shuffle, scoring=metric, verbose=verbosity
+        clf,
+        data,
+        target,
+        cv=shuffle,
+        scoring=metric,
+        verbose=verbosity,
+        n_jobs=num_workers,
     )
 
     return scores
 
 
-def unbiased_mmd_squared(x, y):
-    nx, ny = x.shape[0], y.shape[0]
+def batched_c2st(
+    X: Tensor,
+    Y: Tensor,
+    seed: int = 1,
+    n_folds: int = 5,
+    backend: str = "torch",
+    num_workers: int = 1,
+    max_epochs: int = 1000,
+    n_iter_no_change: int = 50,
+) -> Tensor:
+    """
+    Return C2ST accuracies for a batch of independent pairs of samples <X> and <Y>.
+
+    With the 'torch' backend, one MLP is trained for every pair and every fold of the
+    N-fold cross-validation, and all of them are trained simultaneously as a single
+    batched network. Like the 'mlp' classifier of `c2st`, every MLP has two hidden
+    layers of 10 * ndim units, is trained with Adam and stops early once the loss on
+    10% held-out training samples has not improved by at least 1e-4 for
+    <n_iter_no_change> epochs. The held-out samples are stratified, with at least one
+    sample of each class per fold.
+    With the 'sklearn' backend, `c2st` with a random forest is run for every pair,
+    distributed across <num_workers> processes.
 
-    def f(a, b, diag=False):
-        if diag:
-            return torch.sum((a[None, ...] - b[:, None, :]) ** 2, dim=-1).reshape(-1)
-        else:
-            m, n = a.shape[0], b.shape[0]
-            ix = torch.tril_indices(m, n, offset=-1)
-            return torch.sum(
-                (a[None, ...] - b[:, None, :]) ** 2, dim=-1, keepdim=False
-            )[ix[0, :], ix[1, :]].reshape(-1)
+    Args:
+        X: Samples from one distribution for every pair, shape (batch, n, ndim).
+        Y: Samples from another distribution for every pair, shape (batch, m, ndim).
+        seed: Seed for the folds, the initialization and the training of the
+            classifiers.
+        n_folds: Number of folds to use for cross-validation.
+        backend: 'torch' or 'sklearn'.
+        num_workers: Number of processes for the 'sklearn' backend.
+        max_epochs: Maximal number of epochs of the 'torch' backend.
+        n_iter_no_change: Number of epochs without improvement of the validation
+            loss after which training of the 'torch' backend stops.
 
-    xx = f(x, x)
-    xy = f(x, y, diag=True)
-    yy = f(y, y)
+    Return:
+        torch.tensor of shape (batch,) containing the mean accuracy over the test sets
+        from cross-validation for every pair.
+    """
+    assert X.ndim == 3 and Y.ndim == 3, "X and Y must have shape (batch, n, ndim)."
+    assert X.shape[0] == Y.shape[0], "X and Y must have the same batch size."
 
-    scale = torch.median(torch.sqrt(torch.cat((xx, xy, yy))))
-    c = -0.5 / (scale**2)
+    if backend == "sklearn":
+        scores = Parallel(n_jobs=num_workers)(
+            delayed(c2st)(x, y, seed=seed, n_folds=n_folds) for x, y in zip(X, Y)
+        )
+        return torch.cat(scores)  # pyright: ignore[reportArgumentType]
+    elif backend != "torch":
+        raise ValueError(f"backend must be 'sklearn' or 'torch', not {backend}.")
 
-    k = lambda a: torch.sum(torch.exp(c * a))
+    return _batched_mlp_c2st(X, Y, seed, n_folds, max_epochs, n_iter_no_change)
 
-    kxx = k(xx) / (nx * (nx - 1))
-    kxy = k(xy) / (nx * ny)
-    kyy = k(yy) / (ny * (ny - 1))
-    del xx, xy, yy
 
-    mmd_square = 2 * (kxx + kyy - kxy)
-    del kxx, kxy, kyy
+def _batched_mlp_c2st(
+    X: Tensor,
+    Y: Tensor,
+    seed: int,
+    n_folds: int,
+    max_epochs: int,
+    n_iter_no_change: int,
+    batch_size: int = 200,
+    learning_rate: float = 1e-3,
+    validation_fraction: float = 0.1,
+    tol: float = 1e-4,
+) -> Tensor:
+    """Return cross-validated accuracies of MLPs trained as one batched network.
 
-    return mmd_square
+    Every pair of samples and every fold is a separate model that sees all samples of
+    its pair. Which samples a model is trained, validated and tested on is encoded in
+    masks, such that all models share the same minibatch indices. Models whose
+    validation accuracy never improves keep their final weights.
+    """
+    num_pairs, num_samples = X.shape[0], X.shape[1] + Y.shape[1]
+    ndim, num_hidden = X.shape[2], 10 * X.shape[2]
+    num_models = num_pairs * n_folds
+    device = X.device
+    generator = torch.Generator().manual_seed(seed)
+
+    # z-score every pair with the mean and std of X.
+    X_mean, X_std = X.mean(dim=1, keepdim=True), X.std(dim=1, keepdim=True)
+    data = (torch.cat((X, Y), dim=1) - X_mean) / X_std
+    data = data.repeat_interleave(n_folds, dim=0)
+    target = torch.cat((torch.zeros(X.shape[1]), torch.ones(Y.shape[1]))).to(device)
+
+    # Assign every sample to a test fold and hold out validation samples.
+    fold = torch.empty(num_samples, dtype=torch.long)
+    fold[torch.randperm(num_samples, generator=generator)] = (
+        torch.arange(num_samples) % n_folds
+    )
+    is_test = fold.unsqueeze(0) == torch.arange(n_folds).unsqueeze(1)
+    # Hold out a stratified validation split of the training samples of every fold,
+    # with at least one sample of each class.
+    is_validation = torch.zeros(n_folds, num_samples, dtype=torch.bool)
+    for f in range(n_folds):
+        for label in (0, 1):
+            candidates = torch.nonzero(~is_test[f] & (target.cpu() == label)).squeeze(1)
+            num_validation = max(1, round(validation_fraction * len(candidates)))
+            permutation = torch.randperm(len(candidates), generator=generator)
+            is_validation[f, candidates[permutation[:num_validation]]] = True
+    is_train = ~is_test & ~is_validation
+    # Validation only needs predictions on the samples held out in any fold.
+    validation_samples = torch.nonzero(is_validation.any(dim=0)).squeeze(1)
+    training_samples = torch.nonzero(is_train.any(dim=0)).squeeze(1)
+    is_test, is_validation, is_train = (
+        mask.repeat(num_pairs, 1).to(device=device, dtype=data.dtype)
+        for mask in (is_test, is_validation, is_train)
+    )
+    validation_samples = validation_samples.to(device)
+
+    def uniform(fan_in: int, *shape: int) -> Tensor:
+        bound = fan_in**-0.5
+        weight = bound * (2 * torch.rand(num_models, *shape, generator=generator) - 1)
+        return weight.to(device=device, dtype=data.dtype).requires_grad_(True)
+
+    params = [
+        uniform(ndim, ndim, num_hidden),
+        uniform(ndim, 1, num_hidden),
+        uniform(num_hidden, num_hidden, num_hidden),
+        uniform(num_hidden, 1, num_hidden),
+        uniform(num_hidden, num_hidden, 1),
+        uniform(num_hidden, 1, 1),
+    ]
+
+    def logits(inputs: Tensor, params) -> Tensor:
+        w1, b1, w2, b2, w3, b3 = params
+        hidden = torch.relu(torch.baddbmm(b1, inputs, w1))
+        hidden = torch.relu(torch.baddbmm(b2, hidden, w2))
+        return torch.baddbmm(b3, hidden, w3).squeeze(-1)
+
+    def masked_losses(inputs, labels, mask, params) -> Tensor:
+        losses = torch.nn.functional.binary_cross_entropy_with_logits(
+            logits(inputs, params), labels.expand(num_models, -1), reduction="none"
+        )
+        return (losses * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+    def accuracies(inputs, labels, mask, params) -> Tensor:
+        is_correct = (logits(inputs, params) > 0).to(inputs.dtype) == labels
+        return (is_correct * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+    optimizer = torch.optim.Adam(params, lr=learning_rate)
+    best_params = [p.detach().clone() for p in params]
+    best_loss = torch.full((num_models,), float("inf"), device=device, dtype=data.dtype)
+    ever_improved = torch.zeros(num_models, dtype=torch.bool, device=device)
+    epochs_no_change = torch.zeros(num_models, dtype=torch.long, device=device)
+
+    for _ in range(max_epochs):
+        permutation = torch.randperm(training_samples.shape[0], generator=generator)
+        for batch in training_samples[permutation].split(batch_size):
+            batch = batch.to(device)
+            optimizer.zero_grad()
+            masked_losses(
+                data[:, batch], target[batch], is_train[:, batch], params
+            ).sum().backward()
+            optimizer.step()
+
+        with torch.no_grad():
+            validation_loss = masked_losses(
+                data[:, validation_samples],
+                target[validation_samples],
+                is_validation[:, validation_samples],
+                params,
+            )
+            improved = validation_loss < best_loss - tol
+            best_loss = torch.where(improved, validation_loss, best_loss)
+            ever_improved |= improved
+            epochs_no_change = torch.where(improved, 0, epochs_no_change + 1)
+            for best, param in zip(best_params, params):
+                best[improved] = param[improved]
+        if (epochs_no_change >= n_iter_no_change).all():
+            break
+
+    with torch.no_grad():
+        for best, param in zip(best_params, params):
+            best[~ever_improved] = param[~ever_improved]
+        accuracy = accuracies(data, target, is_test, best_params)
+    return accuracy.reshape(num_pairs, n_folds).mean(dim=1).to(torch.float32)
+
+
+def _sq_distances(a: Tensor, b: Tensor) -> Tensor:
+    """Return squared Euclidean distances between the rows of `a` and `b`.
+
+    Uses the matmul expansion |a|^2 + |b|^2 - 2ab, such that memory scales with the
+    number of pairs rather than the number of pairs times the dimension.
+    """
+    return torch.cdist(a, b, compute_mode="use_mm_for_euclid_dist").square()
 
 
-def biased_mmd(x, y):
+def _kernel_block_sums(
+    a: Tensor, b: Tensor, scale: Tensor, block_size: int, exclude_diagonal: bool
+) -> Tensor:
+    """Return the sum of Gaussian kernel values between all rows of `a` and `b`.
+
+    Kernel values are computed in blocks of `block_size` rows of `a` and `b`. If `a`
+    and `b` are the same samples, only the upper block triangle is computed, and
+    `exclude_diagonal` drops the kernel values of every sample with itself.
+    """
+    c = -0.5 / scale**2
+    symmetric = a is b
+    total = torch.zeros((), dtype=a.dtype, device=a.device)
+    for i in range(0, a.shape[0], block_size):
+        a_block = a[i : i + block_size]
+        for j in range(i if symmetric else 0, b.shape[0], block_size):
+            kernel = torch.exp(c * _sq_distances(a_block, b[j : j + block_size]))
+            if symmetric and i == j:
+                if exclude_diagonal:
+                    kernel.fill_diagonal_(0.0)
+                total += kernel.sum()
+            else:
+                total += (2 if symmetric else 1) * kernel.sum()
+    return total
+
+
+def _median_heuristic(
+    x: Tensor,
+    y: Tensor,
+    include_diagonal: bool,
+    max_num_pairs: int = 2**24,
+    seed: int = 1,
+) -> Tensor:
+    """Return the median Euclidean distance between all samples of `x` and `y`.
+
+    If the number of pairs exceeds `max_num_pairs`, the median is approximated on a
+    random subset of samples such that at most `max_num_pairs` distances are kept in
+    memory.
+
+    Args:
+        x: Samples from one distribution.
+        y: Samples from another distribution.
+        include_diagonal: Whether to use all ordered pairs of `x` and of `y`,
+            including the zero distances of each sample to itself, or every unordered
+            pair once.
+        max_num_pairs: Maximal number of pairwise distances held in memory.
+        seed: Seed for drawing the subset of samples.
+    """
+    nx, ny = x.shape[0], y.shape[0]
+    if include_diagonal:
+        num_pairs = nx**2 + nx * ny + ny**2
+    else:
+        num_pairs = nx * (nx - 1) // 2 + nx * ny + ny * (ny - 1) // 2
+    if num_pairs > max_num_pairs:
+        # The number of pairs is quadratic in the number of samples.
+        fraction = (max_num_pairs / num_pairs) ** 0.5
+        generator = torch.Generator(device=x.device).manual_seed(seed)
+        x_idx = torch.randperm(nx, generator=generator, device=x.device)
+        y_idx = torch.randperm(ny, generator=generator, device=x.device)
+        x = x[x_idx[: max(int(fraction * nx), 2)]]
+        y = y[y_idx[: max(int(fraction * ny), 2)]]
+
+    def within(a: Tensor) -> Tensor:
+        distances = _sq_distances(a, a)
+        if include_diagonal:
+            return distances.reshape(-1)
+        ix = torch.tril_indices(a.shape[0], a.shape[0], offset=-1, device=a.device)
+        return distances[ix[0], ix[1]]
+
+    distances = torch.cat((
+        within(x),
+        _sq_distances(x, y).reshape(-1),
+        within(y),
+    ))
+    return torch.sqrt(torch.median(distances))
+
+
+def unbiased_mmd_squared(
+    x: Tensor,
+    y: Tensor,
+    scale: Optional[Tensor] = None,
+    block_size: int = 2048,
+    seed: int = 1,
+) -> Tensor:
+    """Return the unbiased estimate of the squared MMD with a Gaussian kernel.
+
+    Kernel values are computed in blocks, such that memory is bounded by
+    `block_size**2` instead of growing quadratically with the number of samples.
+
+    Args:
+        x: Samples from one distribution.
+        y: Samples from another distribution.
+        scale: Bandwidth of the Gaussian kernel. If None, the median distance between
+            samples is used.
+        block_size: Number of samples for which kernel values are computed at once.
+        seed: Seed for approximating the median distance on a subset of samples.
+    """
     nx, ny = x.shape[0], y.shape[0]
+    if scale is None:
+        scale = _median_heuristic(x, y, include_diagonal=False, seed=seed)
 
-    def f(a, b):
-        return torch.sum((a[None, ...] - b[:, None, :]) ** 2, dim=-1).reshape(-1)
+    kxx = _kernel_block_sums(x, x, scale, block_size, exclude_diagonal=True)
+    kyy = _kernel_block_sums(y, y, scale, block_size, exclude_diagonal=True)
+    kxy = _kernel_block_sums(x, y, scale, block_size, exclude_diagonal=False)
 
-    xx = f(x, x)
-    xy = f(x, y)
-    yy = f(y, y)
+    return kxx / (nx * (nx - 1)) + kyy / (ny * (ny - 1)) - 2 * kxy / (nx * ny)
 
-    scale = torch.median(torch.sqrt(torch.cat((xx, xy, yy))))
-    c = -0.5 / (scale**2)
 
-    k = lambda a: torch.sum(torch.exp(c * a))
+def biased_mmd(
+    x: Tensor,
+    y: Tensor,
+    scale: Optional[Tensor] = None,
+    block_size: int = 2048,
+    seed: int = 1,
+) -> Tensor:
+    """Return the biased estimate of the MMD with a Gaussian kernel.
 
-    kxx = k(xx) / nx**2
-    del xx
-    kxy = k(xy) / (nx * ny)
-    del xy
-    kyy = k(yy) / ny**2
-    del yy
+    Args:
+        x: Samples from one distribution.
+        y: Samples from another distribution.
+        scale: Bandwidth of the Gaussian kernel. If None, the median distance between
+            samples is used.
+        block_size: Number of samples for which kernel values are computed at once.
+        seed: Seed for approximating the median distance on a subset of samples.
+    """
+    nx, ny = x.shape[0], y.shape[0]
+    if scale is None:
+        scale = _median_heuristic(x, y, include_diagonal=True, seed=seed)
 
-    mmd_square = kxx - 2 * kxy + kyy
-    del kxx, kxy, kyy
+    kxx = _kernel_block_sums(x, x, scale, block_size, exclude_diagonal=False)
+    kyy = _kernel_block_sums(y, y, scale, block_size, exclude_diagonal=False)
+    kxy = _kernel_block_sums(x, y, scale, block_size, exclude_diagonal=False)
 
+    mmd_square = kxx / nx**2 - 2 * kxy / (nx * ny) + kyy / ny**2
     return torch.sqrt(mmd_square)
 
 
+def linear_time_mmd_squared(
+    x: Tensor,
+    y: Tensor,
+    scale: Optional[Tensor] = None,
+    seed: int = 1,
+) -> Tensor:
+    """Return the linear-time estimate of the squared MMD with a Gaussian kernel [1].
+
+    Consecutive pairs of samples are compared, such that compute and memory are linear
+    in the number of samples. The estimate is unbiased but has a higher variance than
+    `unbiased_mmd_squared`.
+
+    Args:
+        x: Samples from one distribution.
+        y: Samples from another distribution.
+        scale: Bandwidth of the Gaussian kernel. If None, the median distance is
+            approximated on a subset of samples.
+        seed: Seed for approximating the median distance.
+
+    References:
+        [1]: Gretton et al. (2012), A Kernel Two-Sample Test, JMLR 13.
+    """
+    if scale is None:
+        scale = _median_heuristic(x, y, include_diagonal=False, seed=seed)
+    num_pairs = min(x.shape[0], y.shape[0]) // 2
+    assert num_pairs > 0, "At least two samples of x and y are required."
+    x1, x2 = x[: 2 * num_pairs : 2], x[1 : 2 * num_pairs : 2]
+    y1, y2 = y[: 2 * num_pairs : 2], y[1 : 2 * num_pairs : 2]
+
+    def k(a: Tensor, b: Tensor) -> Tensor:
+        return torch.exp(-0.5 * torch.sum((a - b) ** 2, dim=-1) / scale**2)
+
+    return torch.mean(k(x1, x2) + k(y1, y2) - k(x1, y2) - k(x2, y1))
+
+
+def rff_mmd_squared(
+    x: Tensor,
+    y: Tensor,
+    scale: Optional[Tensor] = None,
+    num_features: int = 1024,
+    seed: int = 1,
+) -> Tensor:
+    """Return the squared MMD with random Fourier features of a Gaussian kernel [1].
+
+    The Gaussian kernel is approximated by the inner product of `num_features` random
+    Fourier features, such that compute and memory are linear in the number of
+    samples. The estimate is the biased squared MMD of the approximate kernel.
+
+    Args:
+        x: Samples from one distribution.
+        y: Samples from another distribution.
+        scale: Bandwidth of the Gaussian kernel. If None, the median distance is
+            approximated on a subset of samples.
+        num_features: Number of random Fourier features.
+        seed: Seed for approximating the median distance and for drawing the random
+            features.
+
+    References:
+        [1]: Rahimi & Recht (2007), Random Features for Large-Scale Kernel Machines,
+            NeurIPS.
+    """
+    if scale is None:
+        scale = _median_heuristic(x, y, include_diagonal=True, seed=seed)
+    generator = torch.Generator(device=x.device).manual_seed(seed)
+    frequencies = torch.randn(
+        x.shape[1], num_features, generator=generator, device=x.device, dtype=x.dtype
+    )
+    phases = (
+        2
+        * torch.pi
+        * torch.rand(num_features, generator=generator, device=x.device, dtype=x.dtype)
+    )
+
+    def mean_features(a: Tensor) -> Tensor:
+        return torch.cos(a @ frequencies / scale + phases).mean(dim=0)
+
+    difference = mean_features(x) - mean_features(y)
+    return 2 / num_features * torch.sum(difference**2)
+
+
+def mmd_permutation_test(
+    x: Tensor,
+    y: Tensor,
+    num_permutations: int = 1000,
+    scale: Optional[Tensor] = None,
+    block_size: int = 2048,
+    seed: int = 1,
+) -> Tuple[Tensor, Tensor]:
+    """Return the unbiased squared MMD and its p-value under a permutation test.
+
+    The squared MMD of every permutation of the pooled samples is a quadratic form of
+    the kernel matrix with the permuted sample memberships. Every block of the kernel
+    matrix is therefore computed once and applied to all permutations at once, such
+    that memory is bounded by `block_size**2 + num_permutations * (nx + ny)`.
+
+    Args:
+        x: Samples from one distribution.
+        y: Samples from another distribution.
+        num_permutations: Number of random permutations of the pooled samples.
+        scale: Bandwidth of the Gaussian kernel. If None, the median distance between
+            samples is used.
+        block_size: Number of samples for which kernel values are computed at once.
+        seed: Seed for drawing the permutations and for approximating the median
+            distance.
+
+    Returns:
+        The unbiased squared MMD between `x` and `y` and the fraction of permutations
+        (including the identity) whose squared MMD is at least as large.
+    """
+    nx, ny = x.shape[0], y.shape[0]
+    if scale is None:
+        scale = _median_heuristic(x, y, include_diagonal=False, seed=seed)
+    generator = torch.Generator(device=x.device).manual_seed(seed)
+    c = -0.5 / scale**2
+    pooled = torch.cat((x, y))
+    num_samples = nx + ny
+
+    # Column 0 holds the observed split, followed by the permuted splits.
+    permutations = torch.stack(
+        [torch.arange(num_samples, device=x.device)]
+        + [
+            torch.randperm(num_samples, generator=generator, device=x.device)
+            for _ in range(num_permutations)
+        ],
+        dim=1,
+    )
+    is_x = (permutations < nx).to(x.dtype)
+    memberships = torch.cat((is_x, 1 - is_x), dim=1)
+
+    # Kernel matrix without its diagonal applied to all memberships.
+    products = torch.zeros_like(memberships)
+    for i in range(0, num_samples, block_size):
+        block = pooled[i : i + block_size]
+        for j in range(0, num_samples, block_size):
+            kernel = torch.exp(c * _sq_distances(block, pooled[j : j + block_size]))
+            if i == j:
+                kernel.fill_diagonal_(0.0)
+            products[i : i + block_size] += kernel @ memberships[j : j + block_size]
+
+    in_x, in_y = memberships.split(num_permutations + 1, dim=1)
+    products_x, products_y = products.split(num_permutations + 1, dim=1)
+    kxx = torch.sum(in_x * products_x, dim=0)
+    kyy = torch.sum(in_y * products_y, dim=0)
+    kxy = torch.sum(in_x * products_y, dim=0)
+    mmd_squared = kxx / (nx * (nx - 1)) + kyy / (ny * (ny - 1)) - 2 * kxy / (nx * ny)
+
+    p_value = torch.mean((mmd_squared >= mmd_squared[0]).to(x.dtype))
+    return mmd_squared[0], p_value
+
+
 def biased_mmd_hypothesis_test(x, y, alpha=0.05):
     assert x.shape[0] == y.shape[0]
     mmd_biased = biased_mmd(x, y).item()
@@ -0,0 +1,192 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import pickle
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+import torch
+from torch import Tensor
+
+
+class SimulationCache:
+    """On-disk cache of simulations, keyed by a hash of the parameters."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        simulator_version: str = "",
+        max_size_bytes: Optional[int] = None,
+    ):
+        r"""On-disk cache of simulations, keyed by a hash of the parameters.
+
+        Every simulation is keyed by the hash of the bytes of its parameters
+        $\theta$ and of `simulator_version`. The simulations of one call of the
+        simulator are stored together in one batch file, next to a file that lists
+        their keys. Simulations of parameters that were simulated before are loaded
+        from disk instead of being simulated again, see `wrap()`. Note that for
+        stochastic simulators, the cache returns the same `x` whenever the same
+        $\theta$ is simulated.
+
+        Args:
+            directory: Directory in which the simulations are stored. It can be
+                shared between processes and runs.
+            simulator_version: Identifier of the simulator, e.g. its version and
+                seed. Simulations of different versions are cached separately, so
+                it has to be changed whenever the simulator changes.
+            max_size_bytes: Maximal size of the cache on disk. When exceeded, the
+                least recently used batches of simulations are removed. Not bounded
+                if None.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.simulator_version = simulator_version
+        self.max_size_bytes = max_size_bytes
+
+        self.num_hits = 0
+        self.num_misses = 0
+        # Maps the key of a simulation to its batch file and its row in the batch.
+        self._index: Dict[str, Tuple[Path, int]] = {}
+        self._indexed_files: Set[Path] = set()
+        self._update_index()
+        self._size_bytes = sum(path.stat().st_size for path in self._cached_files())
+
+    def wrap(self, simulator: Callable[[Tensor], Tensor]) -> Callable[[Tensor], Tensor]:
+        """Return a simulator that serves cached simulations from disk.
+
+        Args:
+            simulator: Simulator that maps a batch of parameters to a batch of data.
+
+        Returns:
+            Simulator that simulates only the parameters of a batch that are not in
+            the cache, in a single call of `simulator`, and stores their simulations.
+        """
+
+        def cached_simulator(theta: Tensor) -> Tensor:
+            keys = [self._key(theta_i) for theta_i in theta]
+            x = self._load(keys)
+            missing = [i for i, x_i in enumerate(x) if x_i is None]
+            self.num_hits += len(keys) - len(missing)
+            self.num_misses += len(missing)
+
+            if missing:
+                x_missing = simulator(theta[missing])
+                self._store([keys[i] for i in missing], x_missing)
+                for i, x_i in zip(missing, x_missing):
+                    x[i] = x_i
+            return torch.stack(x) if x else simulator(theta)
+
+        return cached_simulator
+
+    def clear(self) -> None:
+        """Remove all simulations from the cache."""
+        for path in self._cached_files():
+            path.unlink(missing_ok=True)
+        self._index = {}
+        self._indexed_files = set()
+        self._size_bytes = 0
+
+    def _key(self, theta: Tensor) -> str:
+        theta = theta.detach().cpu().contiguous()
+        hash_ = hashlib.sha256(self.simulator_version.encode())
+        hash_.update(f"{theta.dtype}{tuple(theta.shape)}".encode())
+        hash_.update(theta.numpy().tobytes())
+        return hash_.hexdigest()
+
+    def _cached_files(self) -> List[Path]:
+        return [*self.directory.glob("*.pt"), *self.directory.glob("*.keys")]
+
+    def _update_index(self) -> None:
+        """Add the batches that were stored since the last update to the index,
+        including those stored by other processes."""
+        for keys_path in self.directory.glob("*.keys"):
+            if keys_path in self._indexed_files:
+                continue
+            try:
+                keys = keys_path.read_text().split()
+            except FileNotFoundError:
+                continue
+            self._indexed_files.add(keys_path)
+            path = keys_path.with_suffix(".pt")
+            for row, key in enumerate(keys):
+                self._index[key] = (path, row)
+
+    def _load(self, keys: List[str]) -> List[Optional[Tensor]]:
+        """Return the cached simulations of `keys`, or None for those that are not
+        cached. Every batch file is loaded at most once."""
+        if any(key not in self._index for key in keys):
+            self._update_index()
+
+        rows: Dict[Path, List[Tuple[int, int]]] = {}
+        for i, key in enumerate(keys):
+            if key in self._index:
+                path, row = self._index[key]
+                rows.setdefault(path, []).append((i, row))
+
+        x: List[Optional[Tensor]] = [None] * len(keys)
+        for path, path_rows in rows.items():
+            try:
+                batch = torch.load(path)
+            except (FileNotFoundError, EOFError, RuntimeError, pickle.UnpicklingError):
+                # Evicted by another process or corrupted, simulate again.
+                self._remove_from_index(path)
+                continue
+            # Mark as recently used for the eviction.
+            os.utime(path)
+            for i, row in path_rows:
+                x[i] = batch[row]
+        return x
+
+    def _store(self, keys: List[str], x: Tensor) -> None:
+        name = uuid.uuid4().hex
+        path = self.directory / f"{name}.pt"
+        keys_path = path.with_suffix(".keys")
+        # Write to temporary files first such that concurrent readers never load
+        # partially written simulations. The keys are written last, such that
+        # indexed batches always exist unless they were evicted.
+        tmp_path = self.directory / f"{name}.pt.tmp"
+        torch.save(x.detach().cpu().clone(), tmp_path)
+        os.replace(tmp_path, path)
+        tmp_path = self.directory / f"{name}.keys.tmp"
+        tmp_path.write_text("\n".join(keys))
+        os.replace(tmp_path, keys_path)
+
+        self._indexed_files.add(keys_path)
+        for row, key in enumerate(keys):
+            self._index[key] = (path, row)
+        self._size_bytes += path.stat().st_size + keys_path.stat().st_size
+
+        if self.max_size_bytes is not None and self._size_bytes > self.max_size_bytes:
+            self._evict()
+
+    def _remove_from_index(self, path: Path) -> None:
+        self._index = {
+            key: entry for key, entry in self._index.items() if entry[0] != path
+        }
+
+    def _evict(self) -> None:
+        """Remove least recently used batches until the cache fits its size."""
+        batches = []
+        for path in self.directory.glob("*.pt"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            keys_path = path.with_suffix(".keys")
+            size = stat.st_size + (
+                keys_path.stat().st_size if keys_path.exists() else 0
+            )
+            batches.append((stat.st_mtime, size, path))
+        batches.sort(key=lambda batch: batch[0])
+
+        self._size_bytes = sum(size for _, size, _ in batches)
+        for _, size, path in batches:
+            if self._size_bytes <= self.max_size_bytes:
+                break
+            path.with_suffix(".keys").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            self._remove_from_index(path)
+            self._size_bytes -= size
@@ -2,19 +2,29 @@
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
 
+import sys
 import warnings
-from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 
 import torch
 from numpy import ndarray
 from pyknos.nflows import flows
-from scipy.stats._distn_infrastructure import rv_frozen
-from scipy.stats._multivariate import multi_rv_frozen
 from torch import Tensor, float32, nn
 from torch.distributions import Distribution, Uniform
 
 from sbi.sbi_types import Array
 from sbi.utils.sbiutils import warn_on_iid_x, within_support
+from sbi.utils.simulation_cache import SimulationCache
 from sbi.utils.torchutils import BoxUniform, atleast_2d
 from sbi.utils.user_input_checks_utils import (
     CustomPriorWrapper,
@@ -22,6 +32,10 @@ from sbi.utils.user_input_checks_utils import (
     PytorchReturnTypeWrapper,
 )
 
+if TYPE_CHECKING:
+    from scipy.stats._distn_infrastructure import rv_frozen
+    from scipy.stats._multivariate import multi_rv_frozen
+
 
 def check_prior(prior: Any) -> None:
     """Assert that prior is a PyTorch distribution (or pass if None)."""
@@ -37,7 +51,7 @@ def check_prior(prior: Any) -> None:
 
 
 def process_prior(
-    prior: Union[Sequence[Distribution], Distribution, rv_frozen, multi_rv_frozen],
+    prior: Union[Sequence[Distribution], Distribution, "rv_frozen", "multi_rv_frozen"],
     custom_prior_wrapper_kwargs: Optional[Dict] = None,
 ) -> Tuple[Distribution, int, bool]:
     """Return PyTorch distribution-like prior from user-provided prior.
@@ -86,7 +100,7 @@ def process_prior(
         return process_pytorch_prior(prior)
 
     # If prior is given as `scipy.stats` object, wrap as PyTorch.
-    elif isinstance(prior, (rv_frozen, multi_rv_frozen)):
+    elif _is_scipy_distribution(prior):
         raise NotImplementedError(
             "Passing a prior as scipy.stats object is deprecated. "
             "Please pass it as a PyTorch Distribution."
@@ -177,6 +191,18 @@ def maybe_wrap_prior_as_pytorch(
     return cast(Distribution, prior), is_prior_numpy
 
 
+def _is_scipy_distribution(prior: Any) -> bool:
+    """Return whether the prior is a frozen `scipy.stats` distribution."""
+    # Only check if scipy.stats was imported, which it must be for scipy priors, such
+    # that importing sbi does not import scipy.stats.
+    if "scipy.stats" not in sys.modules:
+        return False
+    from scipy.stats._distn_infrastructure import rv_frozen
+    from scipy.stats._multivariate import multi_rv_frozen
+
+    return isinstance(prior, (rv_frozen, multi_rv_frozen))
+
+
 def process_pytorch_prior(prior: Distribution) -> Tuple[Distribution, int, bool]:
     """Return PyTorch prior adapted to the requirements for sbi.
 
@@ -478,6 +504,7 @@ def process_simulator(
     user_simulator: Callable,
     prior: Distribution,
     is_numpy_simulator: bool,
+    cache: Optional[SimulationCache] = None,
 ) -> Callable:
     """Returns a simulator that meets the requirements for usage in sbi.
 
@@ -486,6 +513,8 @@ def process_simulator(
         prior: prior as pytorch distribution or processed with `process_prior`.
         is_numpy_simulator: whether the simulator needs theta in numpy types, returned
             from `process_prior`.
+        cache: If passed, simulations are stored in and served from this on-disk
+            `SimulationCache`.
 
     Returns:
         simulator: processed simulator that returns `torch.Tensor` can handle batches
@@ -500,6 +529,9 @@ def process_simulator(
 
     batch_simulator = ensure_batched_simulator(pytorch_simulator, prior)
 
+    if cache is not None:
+        batch_simulator = cache.wrap(batch_simulator)
+
     return batch_simulator
 
 
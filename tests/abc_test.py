@@ -1,8 +1,10 @@
 import pytest
-from torch import eye, norm, ones, zeros
+import torch
+from torch import eye, norm, ones, stack, zeros
 from torch.distributions import MultivariateNormal, biject_to
 
-from sbi.inference import MCABC, SMC
+from sbi.inference import MCABC, SMC, ReferenceTableABC
+from sbi.inference.abc.distances import Distance
 from sbi.simulators.linear_gaussian import (
     linear_gaussian,
     samples_true_posterior_linear_gaussian_uniform_prior,
@@ -181,3 +183,443 @@ def test_smcabc_kde(kde_bandwidth):
         kde_bandwidth=kde_bandwidth,
         transform=True,
     )
+
+
+@pytest.mark.parametrize("kernel", ("gaussian", "uniform"))
+@pytest.mark.parametrize("algorithm_variant", ("A", "B", "C"))
+def test_smcabc_batched_log_weights(kernel, algorithm_variant):
+    """Test batched importance weights against kernel log probs per new particle."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+    inferer = SMC(
+        lambda theta: theta,
+        prior,
+        kernel=kernel,
+        algorithm_variant=algorithm_variant,
+        show_progress_bars=False,
+    )
+    old_particles = prior.sample((50,))
+    old_log_weights = torch.log_softmax(torch.randn(50), dim=0)
+    inferer.kernel_variance = inferer.get_kernel_variance(
+        old_particles, old_log_weights.exp()
+    )
+    new_particles = inferer._sample_and_perturb(
+        old_particles, old_log_weights.exp(), num_samples=30
+    )
+
+    expected_log_weights = prior.log_prob(new_particles) - stack([
+        torch.logsumexp(
+            old_log_weights
+            + inferer.get_new_kernel(old_particles).log_prob(new_particle),
+            dim=0,
+        )
+        for new_particle in new_particles
+    ])
+    # Use small chunks to test chunking as well.
+    log_weights = inferer._calculate_new_log_weights(
+        new_particles, old_particles, old_log_weights, max_batch_size=1000
+    )
+    assert torch.allclose(log_weights, expected_log_weights, atol=1e-4)
+
+
+@pytest.mark.parametrize("eps, quantile", ((0.5, None), (None, 0.1)))
+def test_mcabc_in_chunks_and_resume(eps, quantile):
+    """Test that chunked and resumed MCABC accepts the same simulations as MCABC on
+    all simulations at once."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+    x_o = zeros((1, num_dim))
+    all_theta = []
+
+    def simulator(theta):
+        all_theta.append(theta)
+        return theta
+
+    inferer = MCABC(simulator, prior, simulation_batch_size=50)
+    _, summary = inferer(
+        x_o,
+        num_simulations=500,
+        eps=eps,
+        quantile=quantile,
+        simulation_chunk_size=120,
+        return_summary=True,
+    )
+    theta, summary = inferer(
+        x_o,
+        num_simulations=300,
+        eps=eps,
+        quantile=quantile,
+        simulation_chunk_size=120,
+        return_summary=True,
+        resume_from=summary,
+    )
+    assert summary["num_simulations"] == 800
+
+    all_theta = torch.cat(all_theta)
+    assert all_theta.shape[0] == 800
+    distances = inferer.distance(inferer.x_o, all_theta)
+    if eps is not None:
+        expected_theta = all_theta[distances < eps]
+    else:
+        expected_theta = all_theta[torch.argsort(distances)[: int(800 * quantile)]]
+    assert theta.shape == expected_theta.shape
+    assert torch.allclose(
+        theta[torch.argsort(summary["distances"])],
+        expected_theta[torch.argsort(inferer.distance(inferer.x_o, expected_theta))],
+    )
+
+
+def test_mcabc_resume_restores_distance_and_x_o():
+    """Test that resumed MCABC reuses the fitted distance and checks x_o."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+    x_o = zeros((1, num_dim))
+
+    def simulator(theta):
+        return theta + 0.1 * torch.randn_like(theta)
+
+    inferer = MCABC(simulator, prior, distance=Distance("l2", scale="mad"))
+    _, summary = inferer(x_o, num_simulations=200, quantile=0.1, return_summary=True)
+
+    resumed = MCABC(simulator, prior, distance=Distance("l2", scale="mad"))
+    _, resumed_summary = resumed(
+        x_o, num_simulations=50, quantile=0.1, return_summary=True, resume_from=summary
+    )
+    # New and restored distances are on the same scale.
+    assert torch.allclose(
+        resumed_summary["distances"],
+        inferer.distance(inferer.x_o, resumed_summary["x"]),
+    )
+
+    theta = MCABC(simulator, prior, distance=Distance("l2", scale="mad"))(
+        x_o, num_simulations=0, quantile=0.1, resume_from=summary
+    )
+    assert torch.equal(theta, summary["theta_accepted"])
+    with pytest.raises(ValueError, match="different x_o"):
+        resumed(ones((1, num_dim)), 50, quantile=0.1, resume_from=summary)
+
+
+@pytest.mark.parametrize("distance", ("l2", "l1", "mse"))
+@pytest.mark.parametrize("index", ("kdtree", "brute"))
+@pytest.mark.parametrize("eps, quantile", ((0.5, None), (None, 0.05)))
+def test_reference_table_abc(distance, index, eps, quantile, tmp_path):
+    """Test that reference table ABC accepts the same simulations as rejection ABC
+    for a batch of observations, and that the table can be saved and loaded."""
+    num_dim = 3
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return theta + 0.1 * torch.randn_like(theta)
+
+    table = ReferenceTableABC(
+        simulator, prior, distance=distance, index=index, block_size=300
+    ).simulate(1000)
+    table.save(tmp_path / "table.pt")
+    loaded_table = ReferenceTableABC(
+        simulator, prior, distance=distance, index=index
+    ).load(tmp_path / "table.pt")
+
+    x_o = 0.5 * prior.sample((4,))
+    thetas, summaries = loaded_table(
+        x_o, eps=eps, quantile=quantile, return_summary=True
+    )
+    assert len(thetas) == len(summaries) == x_o.shape[0]
+
+    for observation, theta, summary in zip(x_o, thetas, summaries):
+        distances = table.distance(observation.unsqueeze(0), table.x)
+        if eps is not None:
+            num_expected = int((distances < eps).sum())
+        else:
+            num_expected = int(table.theta.shape[0] * quantile)
+        assert theta.shape == (num_expected, num_dim)
+        assert torch.allclose(
+            summary["distances"], torch.sort(distances).values[:num_expected]
+        )
+
+
+def test_reference_table_abc_multidimensional_x():
+    """Test that the KD-tree index of reference table ABC handles `x` with more than
+    one data dimension, and that empty quantiles are rejected."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return theta.unsqueeze(1) + 0.1 * torch.randn(theta.shape[0], 3, num_dim)
+
+    theta = prior.sample((500,))
+    x = simulator(theta)
+    x_o = simulator(zeros(2, num_dim))
+    kdtree_table = ReferenceTableABC(simulator, prior).set_table(theta, x)
+    brute_table = ReferenceTableABC(simulator, prior, index="brute").set_table(theta, x)
+    assert kdtree_table._tree is not None
+
+    for kwargs in (dict(quantile=0.1), dict(eps=0.5)):
+        for kdtree_theta, brute_theta in zip(
+            kdtree_table(x_o, **kwargs), brute_table(x_o, **kwargs)
+        ):
+            assert torch.equal(kdtree_theta, brute_theta)
+
+    with pytest.raises(ValueError, match="selects no simulations"):
+        kdtree_table(x_o, quantile=0.001)
+
+
+def test_reference_table_abc_sass_returns_raw_x():
+    """Test that reference table ABC with sass returns the raw simulated data of
+    the accepted parameters, not their summary statistics."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        x = theta + 0.1 * torch.randn_like(theta)
+        return torch.cat((x, torch.randn(theta.shape[0], 3)), dim=1)
+
+    table = ReferenceTableABC(simulator, prior).simulate(500, sass=True)
+    _, summaries = table(
+        simulator(zeros(1, num_dim)), quantile=0.1, return_summary=True
+    )
+
+    # Unlike the raw data, the summary statistics have the dimension of theta.
+    assert summaries[0]["x"].shape == (50, num_dim + 3)
+    assert all((table.x == x).all(dim=1).any() for x in summaries[0]["x"])
+
+
+def test_smcabc_batched_population_sampling():
+    """Test that SMCABC proposes populations in few, large batches and accounts for
+    every simulation in its budget."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+    batch_sizes = []
+
+    def simulator(theta):
+        batch_sizes.append(theta.shape[0])
+        return theta + 0.1 * torch.randn_like(theta)
+
+    inferer = SMC(simulator, prior, simulation_batch_size=10_000)
+    num_simulations = 5000
+    _, summary = inferer(
+        zeros((1, num_dim)),
+        num_particles=100,
+        num_initial_pop=500,
+        num_simulations=num_simulations,
+        epsilon_decay=0.5,
+        return_summary=True,
+    )
+
+    assert inferer.simulation_counter == sum(batch_sizes) == num_simulations
+    assert all(particles.shape[0] == 100 for particles in summary["particles"])
+    # With adaptive oversampling, populations need only few batches on average.
+    num_populations = len(summary["particles"]) - 1
+    assert len(batch_sizes) - 1 <= 3 * num_populations
+
+
+@pytest.mark.parametrize(
+    "smc_kwargs",
+    (
+        dict(ess_based_decay=True),
+        dict(min_acceptance_rate=0.25),
+        dict(min_num_particles=20),
+    ),
+)
+def test_smcabc_adaptive_schedule_and_telemetry(smc_kwargs):
+    """Test adaptive epsilon, early stopping and population sizes of SMCABC and the
+    per-population telemetry in its summary."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return theta + 0.1 * torch.randn_like(theta)
+
+    inferer = SMC(simulator, prior, simulation_batch_size=10_000)
+    num_simulations = 3000
+    _, summary = inferer(
+        zeros((1, num_dim)),
+        num_particles=100,
+        num_initial_pop=500,
+        num_simulations=num_simulations,
+        epsilon_decay=0.5,
+        return_summary=True,
+        **smc_kwargs,
+    )
+
+    num_populations = len(summary["particles"])
+    for key in ("acceptance_rates", "num_simulations", "wall_times"):
+        assert len(summary[key]) == num_populations
+    assert sum(summary["num_simulations"]) == inferer.simulation_counter
+    assert all(0 <= rate <= 1 for rate in summary["acceptance_rates"])
+    assert all(
+        later <= earlier
+        for earlier, later in zip(summary["epsilons"][:-1], summary["epsilons"][1:])
+    )
+
+    if "min_acceptance_rate" in smc_kwargs:
+        # Stops once acceptance drops below the rate (or the budget is used up).
+        # The initial population selects 20% of its simulations, which does not
+        # count as an acceptance rate.
+        assert num_populations > 1
+        assert (
+            summary["acceptance_rates"][-1] < 0.25
+            or inferer.simulation_counter == num_simulations
+        )
+        assert all(rate >= 0.25 for rate in summary["acceptance_rates"][1:-1])
+    elif "min_num_particles" in smc_kwargs:
+        assert all(particles.shape[0] >= 20 for particles in summary["particles"])
+    else:
+        assert inferer.simulation_counter == num_simulations
+
+
+@pytest.mark.parametrize("expansion_degree", (1, 3))
+@pytest.mark.parametrize("weighted", (False, True))
+def test_sass_and_lra_match_sklearn(expansion_degree, weighted):
+    """Test the torch regressions of SASS and LRA against sklearn."""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures
+
+    num_samples, num_dim = 500, 3
+    theta = torch.randn(num_samples, num_dim)
+    x = theta + 0.3 * theta**2 + 0.1 * torch.randn(num_samples, num_dim)
+    x_o = zeros(1, num_dim)
+    sample_weight = torch.rand(num_samples) if weighted else None
+
+    expansion = PolynomialFeatures(degree=expansion_degree, include_bias=False)
+    x_expanded = expansion.fit_transform(x)
+    regression = LinearRegression().fit(x_expanded, theta, sample_weight=sample_weight)
+    sass_transform = MCABC.get_sass_transform(
+        theta, x, expansion_degree=expansion_degree, sample_weight=sample_weight
+    )
+    assert torch.allclose(
+        sass_transform(x),
+        torch.as_tensor(x_expanded @ regression.coef_.T, dtype=torch.float32),
+        atol=1e-4,
+    )
+
+    regression = LinearRegression().fit(x, theta, sample_weight=sample_weight)
+    expected = theta + torch.as_tensor(
+        regression.predict(x_o) - regression.predict(x), dtype=torch.float32
+    )
+    adjusted = MCABC.run_lra(theta.clone(), x, x_o, sample_weight=sample_weight)
+    assert torch.allclose(adjusted, expected, atol=1e-4)
+
+
+def test_smcabc_checkpoint_and_resume(tmp_path):
+    """Test that a preempted SMCABC run resumed from its checkpoint gives the same
+    result as an uninterrupted run, without repeating simulations."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+    num_calls = []
+
+    def simulator(theta):
+        num_calls.append(theta.shape[0])
+        return theta + 0.1 * torch.randn_like(theta)
+
+    def preempted_simulator(theta):
+        if len(num_calls) == 6:
+            raise RuntimeError("Preempted.")
+        return simulator(theta)
+
+    smc_kwargs = dict(
+        x_o=zeros((1, num_dim)),
+        num_particles=100,
+        num_initial_pop=500,
+        num_simulations=3000,
+        epsilon_decay=0.5,
+        return_summary=True,
+    )
+
+    torch.manual_seed(0)
+    _, summary = SMC(simulator, prior, simulation_batch_size=10_000)(**smc_kwargs)
+    num_uninterrupted_simulations = sum(num_calls)
+
+    num_calls.clear()
+    torch.manual_seed(0)
+    checkpoint_path = tmp_path / "smcabc.pt"
+    with pytest.raises(RuntimeError):
+        SMC(preempted_simulator, prior, simulation_batch_size=10_000)(
+            checkpoint_path=checkpoint_path, **smc_kwargs
+        )
+    num_checkpointed_simulations = torch.load(checkpoint_path)["simulation_counter"]
+    assert num_checkpointed_simulations > smc_kwargs["num_initial_pop"]
+
+    num_calls.clear()
+    inferer = SMC(simulator, prior, simulation_batch_size=10_000)
+    _, resumed_summary = inferer(
+        resume_from=checkpoint_path, checkpoint_path=checkpoint_path, **smc_kwargs
+    )
+
+    # Simulations of completed populations are not repeated.
+    assert inferer.simulation_counter == num_uninterrupted_simulations
+    assert sum(num_calls) == (
+        num_uninterrupted_simulations - num_checkpointed_simulations
+    )
+    assert resumed_summary["epsilons"] == summary["epsilons"]
+    for particles, resumed_particles in zip(
+        summary["particles"], resumed_summary["particles"]
+    ):
+        assert torch.equal(particles, resumed_particles)
+    assert torch.load(checkpoint_path)["epsilons"] == summary["epsilons"]
+
+
+@pytest.mark.parametrize(
+    "distance, x_shape",
+    (
+        ("l1", (2, 3)),
+        ("l2", (2, 3)),
+        ("mse", (2, 3)),
+        ("mahalanobis", (6,)),
+        ("wasserstein", (20,)),
+        ("wasserstein", (20, 2)),
+        ("energy", (20, 2)),
+    ),
+)
+@pytest.mark.parametrize("scale", (None, "mad"))
+def test_distances(distance, x_shape, scale):
+    """Test shapes, chunking and multiple observations of ABC distances."""
+    num_simulations, num_observations = 50, 3
+    x = torch.randn(num_simulations, *x_shape)
+    x_o = torch.randn(num_observations, *x_shape)
+
+    distance_fn = Distance(distance, scale=scale)
+    if distance_fn.requires_fit:
+        with pytest.raises(AssertionError):
+            distance_fn(x_o[:1], x)
+        distance_fn.fit(x)
+
+    distances = distance_fn(x_o, x)
+    assert distances.shape == (num_observations, num_simulations)
+    assert (distances >= 0).all()
+    assert torch.allclose(distance_fn(x_o[:1], x), distances[0], atol=1e-5)
+    # Zero distance of data to itself.
+    assert torch.allclose(distance_fn(x[:1], x[:1]), zeros(1), atol=1e-4)
+
+    distance_fn.batch_size = 7
+    assert torch.allclose(distance_fn(x_o, x), distances, atol=1e-5)
+
+    if distance in ("l1", "l2", "mse") and scale is None:
+        difference = (x_o[:1] - x).flatten(1)
+        expected = dict(
+            l1=difference.abs().mean(-1),
+            l2=difference.norm(dim=-1),
+            mse=(difference**2).mean(-1),
+        )[distance]
+        assert torch.allclose(distances[0], expected, atol=1e-5)
+
+
+def test_mcabc_with_set_distance():
+    """Test rejection ABC on iid outcomes compared with a fitted set distance."""
+    num_dim, num_trials = 2, 20
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return theta.unsqueeze(1) + 0.1 * torch.randn(theta.shape[0], num_trials, 2)
+
+    theta_o = zeros(1, num_dim)
+    inferer = MCABC(
+        simulator,
+        prior,
+        distance=Distance("energy", scale="mad", batch_size=500),
+        simulation_batch_size=1000,
+        show_progress_bars=False,
+    )
+    samples = inferer(simulator(theta_o), num_simulations=2000, quantile=0.01)
+    assert inferer.distance.is_fitted
+    assert samples.shape == (20, num_dim)
+    assert (samples.mean(0) - theta_o).abs().max() < 0.2
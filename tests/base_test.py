@@ -2,7 +2,7 @@ import pytest
 import torch
 
 from sbi import utils
-from sbi.inference import SNPE, infer
+from sbi.inference import SNLE, SNPE, SNRE, infer
 
 
 def test_infer():
@@ -41,3 +41,36 @@ def test_get_dataloaders(training_batch_size):
     )
 
     assert len(val_loader) * val_loader.batch_size == int(validation_fraction * N)
+
+
+@pytest.mark.parametrize("method", (SNPE, SNLE, SNRE))
+@pytest.mark.parametrize("resume_training", (False, True))
+def test_networks_are_shared_until_trained_further(method, resume_training: bool):
+    num_dim = 2
+    prior = utils.BoxUniform(low=-2 * torch.ones(num_dim), high=2 * torch.ones(num_dim))
+    theta = prior.sample((200,))
+    x = theta + torch.randn_like(theta) * 0.1
+
+    inference = method(prior=prior, show_progress_bars=False)
+    net = inference.append_simulations(theta, x).train(max_num_epochs=1)
+    posterior = inference.build_posterior()
+    # No copies are made of the trained network.
+    assert net is inference._neural_net
+    assert inference._model_bank == [posterior]
+    weights = {k: v.clone() for k, v in net.state_dict().items()}
+
+    train_kwargs = dict(force_first_round_loss=True) if method is SNPE else {}
+    next_net = inference.train(
+        max_num_epochs=2, resume_training=resume_training, **train_kwargs
+    )
+    # Further training works on a copy, the returned network keeps its weights.
+    assert next_net is not net
+    for k, v in net.state_dict().items():
+        assert torch.equal(v, weights[k])
+    assert any(not torch.equal(v, weights[k]) for k, v in next_net.state_dict().items())
+
+    next_posterior = inference.build_posterior()
+    assert inference._model_bank == [next_posterior]
+    inference.max_model_bank_size = None
+    inference.build_posterior()
+    assert len(inference._model_bank) == 2
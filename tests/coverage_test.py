@@ -0,0 +1,74 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import torch
+from torch import eye, ones, zeros
+from torch.distributions import MultivariateNormal
+
+from sbi.diagnostics import get_expected_coverage, run_coverage, run_sbc
+from sbi.inference import SNPE, simulate_for_sbi
+from sbi.simulators import linear_gaussian
+from sbi.utils import BoxUniform
+from tests.test_utils import PosteriorPotential, TractablePosterior
+
+
+def test_batched_coverage_matches_log_prob_ranks():
+    """Test that batched HPD levels match SBC ranks under the posterior log prob,
+    computed from the same posterior samples."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return linear_gaussian(theta, zeros(num_dim), 0.3 * eye(num_dim))
+
+    theta, x = simulate_for_sbi(simulator, prior, 200)
+    inferer = SNPE(prior, show_progress_bars=False)
+    inferer.append_simulations(theta, x).train(max_num_epochs=2)
+    posterior = inferer.build_posterior()
+
+    num_observations, num_posterior_samples = 20, 100
+    thetas = prior.sample((num_observations,))
+    xs = simulator(thetas)
+
+    torch.manual_seed(1)
+    # Chunks of few observations per network call.
+    hpd_levels = run_coverage(
+        thetas, xs, posterior, num_posterior_samples, max_batch_size=505
+    )
+    torch.manual_seed(1)
+    ranks = run_sbc(
+        thetas,
+        xs,
+        posterior,
+        num_posterior_samples,
+        reduce_fns=lambda theta, x: posterior.log_prob(
+            theta, x=x, norm_posterior=False
+        ),
+    )[0]
+
+    assert hpd_levels.shape == (num_observations,)
+    assert torch.allclose(hpd_levels, 1 - ranks[:, 0] / num_posterior_samples)
+
+
+def test_expected_coverage_of_exact_posterior():
+    """Test that the exact posterior has an expected coverage equal to the
+    credibility level, evaluated one observation at a time."""
+    num_dim = 2
+    posterior_dist = MultivariateNormal(ones(num_dim), 0.5 * eye(num_dim))
+    prior = MultivariateNormal(zeros(num_dim), eye(num_dim))
+    potential = PosteriorPotential(posterior=posterior_dist, prior=prior)
+    posterior = TractablePosterior(potential_fn=potential)
+
+    num_observations = 500
+    # Ground-truth parameters from the posterior are calibrated for any x.
+    thetas = posterior_dist.sample((num_observations,))
+    xs = zeros(num_observations, num_dim)
+
+    hpd_levels = run_coverage(thetas, xs, posterior, num_posterior_samples=200)
+    levels, coverage = get_expected_coverage(hpd_levels)
+
+    assert levels.shape == coverage.shape == (101,)
+    assert coverage[0] == 0.0 and coverage[-1] == 1.0
+    assert torch.allclose(coverage, levels, atol=0.1)
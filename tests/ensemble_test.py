@@ -3,16 +3,20 @@
 
 from __future__ import annotations
 
+import logging
+import warnings
+
 import pytest
-from torch import eye, ones, zeros
+from torch import allclose, eye, ones, rand, stack, zeros
 from torch.distributions import MultivariateNormal
 
-from sbi.inference import SNLE_A, SNPE_C, SNRE_A, prepare_for_sbi
-from sbi.inference.posteriors import EnsemblePosterior
+from sbi.inference import SNLE_A, SNPE_C, SNRE_A, SNRE_C, prepare_for_sbi
+from sbi.inference.posteriors import EnsemblePosterior, ensemble_posterior
 from sbi.simulators.linear_gaussian import (
     linear_gaussian,
     true_posterior_linear_gaussian_mvn_prior,
 )
+from sbi.utils import BoxUniform
 from tests.test_utils import check_c2st, get_dkl_gaussian_prior
 
 
@@ -141,3 +145,102 @@ def test_c2st_posterior_ensemble_on_linearGaussian(inference_method, num_trials)
 
     # test individual log_prob and map
     posterior.log_prob(samples, individually=True)
+
+
+@pytest.mark.parametrize(
+    "inference_method, density_estimator",
+    ((SNPE_C, "maf"), (SNPE_C, "mdn"), (SNLE_A, "maf"), (SNRE_A, None), (SNRE_C, None)),
+)
+def test_train_ensemble(inference_method, density_estimator):
+    """Test that `train_ensemble` returns an ensemble of independently trained nets.
+
+    `mdn` can not be vectorized with `vmap` and tests the member-wise fallback.
+    """
+    num_dim = 2
+    num_members = 3
+    prior = MultivariateNormal(loc=zeros(num_dim), covariance_matrix=eye(num_dim))
+    theta = prior.sample((200,))
+    x = linear_gaussian(theta, -1.0 * ones(num_dim), 0.3 * eye(num_dim))
+
+    init_kwargs = {}
+    if density_estimator is not None:
+        init_kwargs["density_estimator"] = density_estimator
+    inferer = inference_method(prior, show_progress_bars=False, **init_kwargs)
+    posterior = inferer.append_simulations(theta, x).train_ensemble(
+        num_members, max_num_epochs=2, stop_after_epochs=1
+    )
+
+    assert isinstance(posterior, EnsemblePosterior)
+    assert posterior.num_components == num_members
+    posterior.set_default_x(x[0])
+    member_potentials = [p.potential(theta[:5]) for p in posterior.posteriors]
+    assert not all(member_potentials[0].equal(p) for p in member_potentials[1:])
+
+    if inference_method == SNPE_C:
+        samples = posterior.sample((10,))
+        assert samples.shape == (10, num_dim)
+    assert posterior.potential(theta[:5]).shape == (5,)
+
+
+@pytest.mark.parametrize("density_estimator", ("maf", "nsf"))
+def test_stacked_ensemble_matches_components(density_estimator):
+    """Test that vectorized sampling and evaluation of `DirectPosterior` ensembles
+    matches the component posteriors.
+
+    `nsf` can not be vectorized with `vmap` and tests the fallback.
+    """
+    num_dim = 2
+    prior = BoxUniform(-2 * ones(num_dim), 2 * ones(num_dim))
+    theta = prior.sample((200,))
+    x = linear_gaussian(theta, -1.0 * ones(num_dim), 0.3 * eye(num_dim))
+
+    posteriors = []
+    for _ in range(3):
+        inferer = SNPE_C(prior, density_estimator=density_estimator)
+        inferer.append_simulations(theta, x).train(max_num_epochs=2)
+        posteriors.append(inferer.build_posterior())
+    posterior = EnsemblePosterior(posteriors)
+    posterior.set_default_x(x[0])
+    assert posterior._use_stacked_estimators
+
+    theta_test = prior.sample((20,))
+    is_vectorized = density_estimator == "maf"
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        _, log_probs = posterior.log_prob(theta_test, individually=True)
+        samples = posterior.sample((100,))
+    vmap_warnings = [w for w in caught if "vectorized with `vmap`" in str(w.message)]
+    assert posterior._use_stacked_estimators == is_vectorized
+    assert len(vmap_warnings) == (0 if is_vectorized else 1)
+
+    component_log_probs = stack([p.log_prob(theta_test) for p in posterior.posteriors])
+    assert allclose(log_probs, component_log_probs, atol=1e-4)
+    assert samples.shape == (100, num_dim)
+    assert prior.support.check(samples).all()
+
+
+def test_stacked_ensemble_sampling_warns_on_leakage(monkeypatch, caplog):
+    """Test that vectorized sampling warns about a low acceptance rate, like
+    `DirectPosterior.sample()`."""
+    num_dim = 2
+    prior = BoxUniform(-2 * ones(num_dim), 2 * ones(num_dim))
+    theta = prior.sample((200,))
+    x = linear_gaussian(theta, -1.0 * ones(num_dim), 0.3 * eye(num_dim))
+    posteriors = []
+    for _ in range(2):
+        inferer = SNPE_C(prior)
+        inferer.append_simulations(theta, x).train(max_num_epochs=1)
+        posteriors.append(inferer.build_posterior())
+    posterior = EnsemblePosterior(posteriors)
+    posterior.set_default_x(x[0])
+
+    # Accept 0.5% of the samples.
+    def within_support(prior, samples):
+        return rand(samples.shape[0]) < 0.005
+
+    monkeypatch.setattr(ensemble_posterior, "within_support", within_support)
+    with caplog.at_level(logging.WARNING):
+        samples = posterior.sample((10,), max_sampling_batch_size=1000)
+    assert samples.shape == (10, num_dim)
+    assert posterior._use_stacked_estimators
+    assert "proposal samples are" in caplog.text
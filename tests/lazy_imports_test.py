@@ -0,0 +1,58 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+
+
+def _imported_modules(statement: str, modules) -> list:
+    """Return which of `modules` are imported by `statement` in a fresh
+    interpreter."""
+    script = (
+        f"import sys; {statement}; "
+        f"print(*[m for m in {list(modules)} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    )
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize(
+    "statement, unused_modules",
+    (
+        ("import sbi.inference", ("torch", "arviz", "sklearn", "scipy.stats")),
+        ("import sbi.utils", ("torch", "sklearn", "scipy.stats")),
+        ("from sbi.inference import SNPE", ("arviz", "sklearn", "scipy.stats")),
+        ("from sbi.inference import MCMCPosterior", ("arviz", "sklearn")),
+    ),
+)
+def test_lazy_imports(statement: str, unused_modules):
+    """Test that importing sbi does not load dependencies of unused parts."""
+    assert _imported_modules(statement, unused_modules) == []
+
+
+def test_lazy_attributes():
+    import sbi.inference
+    import sbi.utils
+
+    assert sbi.inference.SNPE is sbi.inference.SNPE_C
+    assert "MCMCPosterior" in dir(sbi.inference)
+    assert sbi.utils.BoxUniform.__name__ == "BoxUniform"
+    with pytest.raises(AttributeError, match="no attribute 'NotAnAlgorithm'"):
+        sbi.inference.NotAnAlgorithm  # noqa: B018
+
+    # Subpackages are imported on first access as well.
+    assert sbi.inference.snpe.SNPE_C is sbi.inference.SNPE_C
+
+
+def test_star_import():
+    namespace = {}
+    exec("from sbi.utils import *", namespace)
+
+    assert "BoxUniform" in namespace
+    assert "lazy_imports" not in namespace
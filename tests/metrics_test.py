@@ -9,7 +9,17 @@ import torch
 from sklearn.neural_network import MLPClassifier
 from torch.distributions import MultivariateNormal as tmvn
 
-from sbi.utils.metrics import c2st, c2st_scores
+from sbi.utils.metrics import (
+    _median_heuristic,
+    batched_c2st,
+    biased_mmd,
+    c2st,
+    c2st_scores,
+    linear_time_mmd_squared,
+    mmd_permutation_test,
+    rff_mmd_squared,
+    unbiased_mmd_squared,
+)
 
 ## c2st related:
 ## for a study about c2st see https://github.com/psteinb/c2st/
@@ -128,3 +138,120 @@ def test_c2st_scores(dist_sigma, c2st_lowerbound, c2st_upperbound):
     assert obs2_c2st.mean() <= c2st_upperbound
 
     assert np.allclose(obs2_c2st, obs_c2st, atol=0.05)
+
+
+@pytest.mark.parametrize("backend", ("torch", "sklearn"))
+def test_batched_c2st(backend):
+    ndim = 2
+    nsamples = 500
+    dist_sigmas = torch.tensor([0.0, 1.0, 20.0])
+
+    X = torch.randn(3, nsamples, ndim)
+    Y = dist_sigmas[:, None, None] + torch.randn(3, nsamples, ndim)
+
+    obs_c2st = batched_c2st(X, Y, backend=backend)
+
+    # Accuracies of the Bayes optimal classifier are 0.5, 0.76 and 1.0.
+    assert obs_c2st.shape == (3,)
+    assert 0.42 < obs_c2st[0] < 0.58
+    assert 0.7 < obs_c2st[1] < 0.82
+    assert obs_c2st[2] > 0.98
+    assert torch.allclose(
+        obs_c2st[1:2], c2st(X[1], Y[1], backend=backend), atol=0.03
+    )
+
+
+@pytest.mark.parametrize("nsamples", (8, 30))
+def test_batched_c2st_on_separable_data(nsamples):
+    X = torch.randn(20, nsamples, 2)
+    Y = 5.0 + torch.randn(20, nsamples, 2)
+
+    obs_c2st = batched_c2st(X, Y, backend="torch")
+
+    # The data are separable, such that the accuracy should be close to 1.
+    assert obs_c2st.mean() > 0.95
+
+
+## mmd related:
+
+
+def _dense_mmd_squared(x, y, scale, biased):
+    """Squared MMD from the full difference tensor, as reference."""
+
+    def k(a, b):
+        return torch.exp(-0.5 * ((a[:, None] - b[None]) ** 2).sum(-1) / scale**2)
+
+    nx, ny = x.shape[0], y.shape[0]
+    kxx, kyy, kxy = k(x, x), k(y, y), k(x, y)
+    if biased:
+        return kxx.mean() + kyy.mean() - 2 * kxy.mean()
+    return (
+        (kxx.sum() - nx) / (nx * (nx - 1))
+        + (kyy.sum() - ny) / (ny * (ny - 1))
+        - 2 * kxy.mean()
+    )
+
+
+def test_blocked_mmd_matches_dense():
+    x, y = torch.randn(300, 3), torch.randn(200, 3) + 0.5
+    scale = torch.tensor(1.3)
+
+    assert torch.allclose(
+        unbiased_mmd_squared(x, y, scale=scale, block_size=64),
+        _dense_mmd_squared(x, y, scale, biased=False),
+        atol=1e-5,
+    )
+    assert torch.allclose(
+        biased_mmd(x, y, scale=scale, block_size=64) ** 2,
+        _dense_mmd_squared(x, y, scale, biased=True),
+        atol=1e-5,
+    )
+    # The median heuristic does not depend on the block size.
+    assert torch.allclose(
+        unbiased_mmd_squared(x, y, block_size=64), unbiased_mmd_squared(x, y)
+    )
+
+
+def test_mmd_estimators_are_seeded():
+    x, y = torch.randn(300, 3), torch.randn(200, 3) + 0.5
+
+    # The median is approximated on a random subset of samples.
+    scales = [
+        _median_heuristic(x, y, include_diagonal=False, max_num_pairs=1000, seed=seed)
+        for seed in (0, 0, 1)
+    ]
+    assert torch.equal(scales[0], scales[1])
+    assert not torch.equal(scales[0], scales[2])
+
+    assert torch.equal(rff_mmd_squared(x, y, seed=0), rff_mmd_squared(x, y, seed=0))
+    assert torch.equal(
+        mmd_permutation_test(x, y, num_permutations=20, seed=0)[1],
+        mmd_permutation_test(x, y, num_permutations=20, seed=0)[1],
+    )
+
+
+@pytest.mark.parametrize("dist_sigma", (0.0, 1.0))
+def test_mmd_estimators_and_permutation_test(dist_sigma):
+    ndim = 2
+    x = torch.randn(1000, ndim)
+    y = dist_sigma + torch.randn(1000, ndim)
+    scale = torch.tensor(1.0)
+    reference = _dense_mmd_squared(x, y, scale, biased=False)
+
+    assert torch.allclose(
+        linear_time_mmd_squared(x, y, scale=scale), reference, atol=0.05
+    )
+    assert torch.allclose(
+        rff_mmd_squared(x, y, scale=scale, num_features=4096, seed=0),
+        reference,
+        atol=0.02,
+    )
+
+    mmd_squared, p_value = mmd_permutation_test(
+        x, y, num_permutations=100, scale=scale, block_size=256
+    )
+    assert torch.allclose(mmd_squared, reference, atol=1e-5)
+    if dist_sigma == 0.0:
+        assert p_value > 0.01
+    else:
+        assert p_value < 0.05
@@ -3,14 +3,18 @@
 
 from __future__ import annotations
 
+import os
 import time
 import warnings
 
 import pytest
 import torch
 
+import sbi.inference.base
+from sbi.inference import SNLE_A, SNPE_C, SNRE_B
 from sbi.simulators.linear_gaussian import diagonal_linear_gaussian
 from sbi.simulators.simutils import simulate_in_batches
+from sbi.utils import BoxUniform
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
@@ -56,3 +60,78 @@ def test_benchmarking_parallel_simulation(sim_batch_size, num_workers):
 
     # Allow joblib to be 10 percent slower due to overhead.
     assert toc_joblib <= toc_sp * 1.1
+
+
+@pytest.mark.parametrize("method", (SNPE_C, SNLE_A, SNRE_B))
+def test_train_data_parallel(method):
+    """Test that data-parallel training runs and returns a usable posterior."""
+    num_dim = 2
+    prior = BoxUniform(-torch.ones(num_dim), torch.ones(num_dim))
+    theta = prior.sample((200,))
+    x = diagonal_linear_gaussian(theta)
+
+    train_kwargs = dict(training_batch_size=20, max_num_epochs=3)
+    serial_inference = method(prior=prior, show_progress_bars=False)
+    serial_inference.append_simulations(theta, x).train(**train_kwargs)
+
+    inference = method(prior=prior, show_progress_bars=False)
+    inference.append_simulations(theta, x)
+    inference.train_data_parallel(num_processes=2, **train_kwargs)
+    assert (
+        inference._summary["epochs_trained"]
+        == serial_inference._summary["epochs_trained"]
+    )
+
+    # The network of the main process is used to build the posterior.
+    posterior = inference.build_posterior()
+    if method == SNPE_C:
+        samples = posterior.sample((10,), x=x[0])
+        assert samples.shape == (10, num_dim)
+    assert torch.isfinite(posterior.log_prob(theta[:5], x=x[0])).all()
+
+
+@pytest.mark.parametrize("method", (SNPE_C, SNLE_A))
+def test_train_data_parallel_matches_serial_step(method):
+    """Test that one full-batch step of data-parallel training updates the weights
+    like one step of serial training."""
+    num_dim = 2
+    prior = BoxUniform(-torch.ones(num_dim), torch.ones(num_dim))
+    theta = prior.sample((200,))
+    x = diagonal_linear_gaussian(theta)
+
+    # With a single batch of all training data, the gradient averaged over the shards
+    # is the full-batch gradient.
+    train_kwargs = dict(training_batch_size=180, max_num_epochs=1, clip_max_norm=None)
+    torch.manual_seed(0)
+    serial_inference = method(prior=prior, show_progress_bars=False)
+    serial_net = serial_inference.append_simulations(theta, x).train(**train_kwargs)
+
+    torch.manual_seed(0)
+    inference = method(prior=prior, show_progress_bars=False)
+    inference.append_simulations(theta, x)
+    net = inference.train_data_parallel(num_processes=2, **train_kwargs)
+
+    assert not inference._data_parallel
+    for serial_param, param in zip(serial_net.parameters(), net.parameters()):
+        assert torch.allclose(serial_param, param, atol=1e-6)
+
+
+def test_train_data_parallel_fails_fast_on_dead_worker(monkeypatch):
+    """Test that data-parallel training aborts when a worker exits on startup instead
+    of waiting for the process group until the timeout."""
+    num_dim = 2
+    prior = BoxUniform(-torch.ones(num_dim), torch.ones(num_dim))
+    theta = prior.sample((100,))
+    x = diagonal_linear_gaussian(theta)
+
+    def dying_worker(*args):
+        os._exit(1)
+
+    monkeypatch.setattr(sbi.inference.base, "_data_parallel_worker", dying_worker)
+    inference = SNPE_C(prior=prior, show_progress_bars=False)
+    inference.append_simulations(theta, x)
+    tic = time.time()
+    with pytest.raises(RuntimeError, match="exited on startup"):
+        inference.train_data_parallel(num_processes=2, max_num_epochs=1)
+    assert time.time() - tic < 30
+    assert not inference._data_parallel
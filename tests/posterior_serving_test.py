@@ -0,0 +1,112 @@
+# This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
+# under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+import torch
+from torch import eye, zeros
+from torch.distributions import MultivariateNormal
+
+from sbi.inference import SNPE
+from sbi.inference.posteriors.serving import PosteriorServer
+
+
+@pytest.fixture(scope="module")
+def posterior():
+    num_dim = 2
+    prior = MultivariateNormal(zeros(num_dim), eye(num_dim))
+    theta = prior.sample((500,))
+    x = theta + torch.randn_like(theta) * 0.1
+    inference = SNPE(prior, show_progress_bars=False)
+    _ = inference.append_simulations(theta, x).train(max_num_epochs=1)
+    return inference.build_posterior()
+
+
+def test_posterior_server_batches_requests(posterior):
+    num_dim = 2
+    num_requests = 10
+    prior = posterior.prior
+
+    num_calls = []
+    sample_batched = posterior.sample_batched
+
+    def counting_sample_batched(*args, **kwargs):
+        num_calls.append(1)
+        return sample_batched(*args, **kwargs)
+
+    posterior.sample_batched = counting_sample_batched
+    # Requests are batched per number of samples.
+    sample_shapes = [(i % 2 + 1, 3) for i in range(num_requests)]
+
+    xs = prior.sample((num_requests,))
+    thetas = [prior.sample((i + 1,)) for i in range(num_requests)]
+
+    async def serve():
+        async with PosteriorServer(posterior, max_latency=0.1) as server:
+            samples = await asyncio.gather(*[
+                server.sample(sample_shapes[i], x=xs[i]) for i in range(num_requests)
+            ])
+            log_probs = await asyncio.gather(*[
+                server.log_prob(thetas[i], x=xs[i]) for i in range(num_requests)
+            ])
+        return samples, log_probs
+
+    samples, log_probs = asyncio.run(serve())
+    del posterior.sample_batched
+
+    assert len(num_calls) == 2
+    for i in range(num_requests):
+        assert samples[i].shape == (*sample_shapes[i], num_dim)
+        assert torch.allclose(
+            log_probs[i],
+            posterior.log_prob(thetas[i], x=xs[i], norm_posterior=False),
+            atol=1e-5,
+        )
+
+
+def test_posterior_server_rejects_malformed_requests(posterior):
+    x_o = zeros(2)
+
+    async def serve():
+        async with PosteriorServer(posterior, max_latency=0.1) as server:
+            return await asyncio.gather(
+                server.log_prob(zeros(5, 2), x=x_o),
+                server.log_prob(zeros(5, 3), x=x_o),
+                server.sample((0,), x=x_o),
+                server.sample((5,), x=zeros(3)),
+                return_exceptions=True,
+            )
+
+    log_probs, *errors = asyncio.run(serve())
+
+    # Malformed requests fail on their own, without failing the batch.
+    assert log_probs.shape == (5,)
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_posterior_server_close_cancels_requests_in_flight(posterior):
+    sample_batched = posterior.sample_batched
+
+    def slow_sample_batched(*args, **kwargs):
+        time.sleep(0.5)
+        return sample_batched(*args, **kwargs)
+
+    async def serve():
+        server = PosteriorServer(posterior, max_latency=0.0)
+        server.start()
+        request = asyncio.ensure_future(server.sample((10,), x=zeros(2)))
+        # Close the server while the request is being evaluated.
+        await asyncio.sleep(0.1)
+        await server.close()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(request, timeout=5.0)
+
+    posterior.sample_batched = slow_sample_batched
+    try:
+        asyncio.run(serve())
+    finally:
+        del posterior.sample_batched
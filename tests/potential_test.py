@@ -14,6 +14,14 @@ from sbi.inference import (
     RejectionPosterior,
     VIPosterior,
 )
+from sbi.inference.potentials.likelihood_based_potential import (
+    LikelihoodBasedPotential,
+)
+from sbi.inference.potentials.ratio_based_potential import (
+    RatioBasedPotential,
+    _log_ratios_over_trials,
+)
+from sbi.neural_nets import classifier_nn, likelihood_nn
 
 
 @pytest.mark.parametrize(
@@ -59,3 +67,51 @@ def test_callable_potential(sampling_method):
     sample_std = torch.std(approx_samples, dim=0)
     assert torch.allclose(sample_mean, torch.as_tensor(mean) - x_o, atol=0.2)
     assert torch.allclose(sample_std, torch.sqrt(torch.as_tensor(cov)), atol=0.1)
+
+
+@pytest.mark.parametrize(
+    "potential_class", (LikelihoodBasedPotential, RatioBasedPotential)
+)
+@pytest.mark.parametrize("max_batch_size", (1, 7, 30, 1000))
+def test_iid_potential_in_chunks(potential_class, max_batch_size):
+    """Test that chunked iid evaluation matches evaluation in one batch."""
+    num_trials, num_theta, dim = 6, 5, 2
+    prior = MultivariateNormal(zeros(dim), eye(dim))
+    theta = prior.sample((num_theta,))
+    x_o = prior.sample((num_trials,))
+
+    if potential_class == LikelihoodBasedPotential:
+        estimator = likelihood_nn("mdn")(theta, x_o)
+    else:
+        estimator = classifier_nn("mlp")(theta, x_o)
+
+    potential = potential_class(estimator, prior, x_o)
+    chunked_potential = potential_class(
+        estimator, prior, x_o, max_batch_size=max_batch_size
+    )
+    assert torch.allclose(
+        potential(theta, track_gradients=False),
+        chunked_potential(theta, track_gradients=False),
+        atol=1e-5,
+    )
+
+
+def test_ratio_potential_caches_embedded_x():
+    """Test that the cached x-embedding gives the same potential and is updated with
+    `x_o`."""
+    num_trials, num_theta, dim = 4, 10, 3
+    prior = MultivariateNormal(zeros(dim), eye(dim))
+    theta = prior.sample((num_theta,))
+    x = prior.sample((num_trials,))
+    classifier = classifier_nn("resnet")(theta, x)
+    potential = RatioBasedPotential(classifier, prior, x_o=None)
+
+    for x_o in (x, x[:1] + 1.0):
+        potential.set_x(x_o)
+        assert potential._embedded_x_o is not None
+        log_ratios = _log_ratios_over_trials(x_o, theta, classifier)
+        assert torch.allclose(
+            potential(theta, track_gradients=False),
+            log_ratios + prior.log_prob(theta),
+            atol=1e-5,
+        )
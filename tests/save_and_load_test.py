@@ -2,9 +2,17 @@ import pickle
 
 import pytest
 import torch
+from torch.distributions import MultivariateNormal
 
 from sbi import utils as utils
 from sbi.inference import SNLE, SNPE, SNRE
+from sbi.inference.posteriors.export import (
+    WEIGHTS_FILENAME,
+    export_posterior,
+    load_posterior,
+)
+from sbi.neural_nets import posterior_nn
+from sbi.neural_nets.embedding_nets import FCEmbedding
 
 
 @pytest.mark.parametrize(
@@ -40,3 +48,81 @@ def test_picklability(inference_method, sampling_method: str, tmp_path):
         pickle.dump(inference, handle)
     with open(f"{tmp_path}/saved_inference.pickle", "rb") as handle:
         _ = pickle.load(handle)
+
+
+@pytest.mark.parametrize("density_estimator", ("mdn", "maf", "nsf"))
+@pytest.mark.parametrize(
+    "prior",
+    (
+        utils.BoxUniform(low=-2 * torch.ones(2), high=2 * torch.ones(2)),
+        MultivariateNormal(torch.zeros(2), torch.eye(2)),
+    ),
+)
+def test_export_posterior(density_estimator: str, prior, tmp_path):
+    x_o = torch.ones(1, 2)
+    theta = prior.sample((500,))
+    x = theta + 1.0 + torch.randn_like(theta) * 0.1
+
+    inference = SNPE(prior=prior, density_estimator=density_estimator)
+    _ = inference.append_simulations(theta, x).train(max_num_epochs=1)
+    posterior = inference.build_posterior()
+
+    export_posterior(posterior, tmp_path)
+    loaded_posterior = load_posterior(tmp_path)
+
+    thetas = prior.sample((10,))
+    assert torch.allclose(
+        posterior.log_prob(thetas, x=x_o, norm_posterior=False),
+        loaded_posterior.log_prob(thetas, x=x_o, norm_posterior=False),
+        atol=1e-5,
+    )
+    torch.manual_seed(0)
+    samples = posterior.sample((10,), x=x_o)
+    torch.manual_seed(0)
+    assert torch.allclose(samples, loaded_posterior.sample((10,), x=x_o), atol=1e-5)
+
+
+def test_export_posterior_with_embedding_net(tmp_path):
+    prior = utils.BoxUniform(low=-2 * torch.ones(2), high=2 * torch.ones(2))
+    x_o = torch.ones(1, 4)
+    theta = prior.sample((500,))
+    x = torch.cat((theta, theta), dim=1) + torch.randn(500, 4) * 0.1
+
+    density_estimator = posterior_nn(
+        "maf", embedding_net=FCEmbedding(input_dim=4, output_dim=3)
+    )
+    inference = SNPE(prior=prior, density_estimator=density_estimator)
+    _ = inference.append_simulations(theta, x).train(max_num_epochs=1)
+    posterior = inference.build_posterior()
+    export_posterior(posterior, tmp_path)
+
+    with pytest.raises(ValueError, match="embedding net"):
+        load_posterior(tmp_path)
+    loaded_posterior = load_posterior(
+        tmp_path, embedding_net=FCEmbedding(input_dim=4, output_dim=3)
+    )
+    thetas = prior.sample((10,))
+    assert torch.allclose(
+        posterior.log_prob(thetas, x=x_o, norm_posterior=False),
+        loaded_posterior.log_prob(thetas, x=x_o, norm_posterior=False),
+        atol=1e-5,
+    )
+
+
+class _Payload:
+    def __reduce__(self):
+        return (print, ("Executed while loading the weights.",))
+
+
+def test_load_posterior_only_loads_weights(tmp_path):
+    """Test that the weights file can not execute code when it is loaded."""
+    prior = utils.BoxUniform(low=-2 * torch.ones(2), high=2 * torch.ones(2))
+    theta = prior.sample((100,))
+    x = theta + torch.randn_like(theta) * 0.1
+    inference = SNPE(prior=prior)
+    _ = inference.append_simulations(theta, x).train(max_num_epochs=1)
+    export_posterior(inference.build_posterior(), tmp_path)
+
+    torch.save({"payload": _Payload()}, tmp_path / WEIGHTS_FILENAME)
+    with pytest.raises(pickle.UnpicklingError):
+        load_posterior(tmp_path)
@@ -107,8 +107,100 @@ def test_sbc_accuracy():
     assert (pvals > 0.05).all(), "posterior ranks uniformity test p-values too small."
 
 
+def test_batched_sbc():
+    """Test that SBC for amortized posteriors samples all runs in one batched call
+    and matches the ranks of sampling one observation at a time."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return linear_gaussian(theta, zeros(num_dim), 0.3 * eye(num_dim))
+
+    theta, x = simulate_for_sbi(simulator, prior, 200)
+    inferer = SNPE(prior, show_progress_bars=False)
+    inferer.append_simulations(theta, x).train(max_num_epochs=2)
+    posterior = inferer.build_posterior()
+
+    num_sbc_runs, num_posterior_samples = 20, 50
+    thetas = prior.sample((num_sbc_runs,))
+    xs = simulator(thetas)
+
+    estimator = posterior.posterior_estimator
+    condition_batch_sizes = []
+    estimator_sample = estimator.sample
+
+    def counting_sample(sample_shape, condition):
+        condition_batch_sizes.append(condition.shape[0])
+        return estimator_sample(sample_shape, condition)
+
+    estimator.sample = counting_sample
+    ranks, dap_samples = run_sbc(
+        thetas, xs, posterior, num_posterior_samples=num_posterior_samples
+    )
+    # All observations are sampled together (with few rounds for leakage).
+    assert condition_batch_sizes[0] == num_sbc_runs
+    assert len(condition_batch_sizes) <= 5
+    assert ranks.shape == (num_sbc_runs, num_dim)
+    assert dap_samples.shape == (num_sbc_runs, num_dim)
+    assert ((ranks >= 0) & (ranks <= num_posterior_samples)).all()
+
+    samples = posterior.sample_batched((num_posterior_samples,), x=xs)
+    assert samples.shape == (num_posterior_samples, num_sbc_runs, num_dim)
+    assert torch.isfinite(prior.log_prob(samples.reshape(-1, num_dim))).all()
+
+    # Ranks computed from the same samples agree with the per-run reduce functions.
+    torch.manual_seed(1)
+    ranks = run_sbc(
+        thetas,
+        xs,
+        posterior,
+        num_posterior_samples,
+        reduce_fns=[lambda theta, x: theta[:, 0], lambda theta, x: theta[:, 1]],
+    )[0]
+    torch.manual_seed(1)
+    marginal_ranks = run_sbc(thetas, xs, posterior, num_posterior_samples)[0]
+    assert torch.equal(ranks, marginal_ranks)
+
+
+def test_batched_nltp():
+    """Test that batched NLTP matches the log probs of single pairs."""
+    num_dim = 2
+    prior = BoxUniform(-ones(num_dim), ones(num_dim))
+
+    def simulator(theta):
+        return linear_gaussian(theta, zeros(num_dim), 0.3 * eye(num_dim))
+
+    theta, x = simulate_for_sbi(simulator, prior, 200)
+    inferer = SNPE(prior, show_progress_bars=False)
+    inferer.append_simulations(theta, x).train(max_num_epochs=2)
+    posterior = inferer.build_posterior()
+
+    thetas = prior.sample((10,))
+    xs = simulator(thetas)
+
+    nltp = get_nltp(thetas, xs, posterior, norm_posterior=False)
+    expected = torch.stack([
+        -posterior.log_prob(tho, x=xo, norm_posterior=False)[0]
+        for tho, xo in zip(thetas, xs)
+    ])
+    assert torch.allclose(nltp, expected, atol=1e-4)
+
+    # Batched leakage correction factors match those of single observations.
+    torch.manual_seed(0)
+    factors = posterior._leakage_correction_batched(
+        xs, num_rejection_samples=20_000, max_sampling_batch_size=50_000
+    )
+    expected_factors = torch.stack([
+        posterior.leakage_correction(x=xo.unsqueeze(0), num_rejection_samples=20_000)
+        for xo in xs
+    ])
+    assert torch.allclose(factors, expected_factors, atol=0.02)
+    assert get_nltp(thetas, xs, posterior, norm_posterior=True).shape == (10,)
+
+
 @pytest.mark.slow
-def test_sbc_checks():
+@pytest.mark.parametrize("c2st_backend", ("sklearn", "torch"))
+def test_sbc_checks(c2st_backend: str):
     """Test the uniformity checks for SBC."""
 
     num_dim = 2
@@ -127,6 +219,7 @@ def test_sbc_checks():
         prior.sample((num_posterior_samples,)),
         daps,
         num_posterior_samples=num_posterior_samples,
+        c2st_backend=c2st_backend,
     )
     assert (checks["ks_pvals"] > 0.05).all()
     assert (checks["c2st_ranks"] < 0.55).all()
@@ -3,6 +3,7 @@ from typing import Tuple
 import matplotlib.pyplot as plt
 import pytest
 import torch
+from sklearn.neighbors import KernelDensity
 from torch import Tensor, ones, zeros
 from torch.distributions import MultivariateNormal
 from torch.distributions.transforms import IndependentTransform, identity_transform
@@ -17,6 +18,7 @@ from sbi.inference import SNPE, SNPE_A
 from sbi.inference.snpe.snpe_a import SNPE_A_MDN
 from sbi.neural_nets import classifier_nn, likelihood_nn, posterior_nn
 from sbi.utils import BoxUniform, get_kde
+from sbi.utils.kde import TorchKernelDensity
 
 
 def test_conditional_density_1d():
@@ -377,7 +379,11 @@ def test_gaussian_transforms(snpe_method: str, plot_results: bool = False):
     "bandwidth",
     ("cv", "scott"),
 )
-def test_kde(bandwidth, transform, sample_weights):
+@pytest.mark.parametrize(
+    "backend, bandwidth_matrix",
+    (("sklearn", "scalar"), ("torch", "scalar"), ("torch", "full")),
+)
+def test_kde(bandwidth, transform, sample_weights, backend, bandwidth_matrix):
     num_dim = 3
     num_samples = 100
     num_draws = 10
@@ -391,6 +397,8 @@ def test_kde(bandwidth, transform, sample_weights):
         bandwidth=bandwidth,
         transform=transform,
         sample_weights=torch.rand(num_samples) if sample_weights else None,
+        backend=backend,
+        bandwidth_matrix=bandwidth_matrix,
     )
 
     kde_samples = kde.sample((num_draws,))
@@ -400,6 +408,41 @@ def test_kde(bandwidth, transform, sample_weights):
     assert kde_vals.shape == torch.Size((num_draws,))
 
 
+def test_torch_kde_matches_sklearn():
+    """Test torch KDE densities and leave-one-out bandwidth selection."""
+    num_samples = 200
+    samples = torch.randn(num_samples, 2)
+    sample_weights = torch.rand(num_samples)
+
+    sklearn_kde = KernelDensity(bandwidth=0.3).fit(
+        samples.numpy(), sample_weight=sample_weights.numpy()
+    )
+    torch_kde = TorchKernelDensity(bandwidth=0.3, max_batch_size=1000).fit(
+        samples, sample_weight=sample_weights
+    )
+    x = torch.randn(10, 2)
+    assert torch.allclose(
+        torch_kde.score_samples(x),
+        torch.as_tensor(sklearn_kde.score_samples(x.numpy()), dtype=torch.float32),
+        atol=1e-4,
+    )
+
+    # Leave-one-out likelihood of all bandwidths against refitting without a sample.
+    bandwidths = torch.tensor([0.1, 0.3, 1.0])
+    loo_scores = torch_kde.leave_one_out_log_likelihood(bandwidths)
+    for bandwidth, loo_score in zip(bandwidths, loo_scores):
+        expected = 0.0
+        for i in range(num_samples):
+            is_kept = torch.arange(num_samples) != i
+            kde_without_i = TorchKernelDensity(bandwidth=float(bandwidth)).fit(
+                samples[is_kept], sample_weight=sample_weights[is_kept]
+            )
+            expected += sample_weights[i] * kde_without_i.score_samples(
+                samples[i : i + 1]
+            )
+        assert torch.allclose(loo_score, expected / sample_weights.sum(), atol=1e-4)
+
+
 @pytest.mark.parametrize(
     "z_x", [True, False, None, "none", "independent", "structured"]
 )
@@ -9,8 +9,9 @@ from torch import ones, zeros
 
 from sbi.simulators.linear_gaussian import diagonal_linear_gaussian
 from sbi.simulators.simutils import simulate_in_batches
+from sbi.utils.simulation_cache import SimulationCache
 from sbi.utils.torchutils import BoxUniform
-from sbi.utils.user_input_checks import prepare_for_sbi
+from sbi.utils.user_input_checks import prepare_for_sbi, process_simulator
 
 
 @pytest.mark.parametrize("num_sims", (0, 10))
@@ -38,3 +39,63 @@ def test_simulate_in_batches(
         assert not torch.equal(x1, x2)
     else:
         assert torch.equal(x1, x2)
+
+
+def test_simulation_cache(tmp_path):
+    """Test that cached simulations are served from disk and the cache is bounded."""
+    prior = BoxUniform(zeros(2), ones(2))
+    simulated_theta = []
+
+    def simulator(theta):
+        simulated_theta.append(theta)
+        return theta + torch.randn_like(theta)
+
+    cache = SimulationCache(tmp_path, simulator_version="v1")
+    cached_simulator = process_simulator(simulator, prior, False, cache=cache)
+    theta = prior.sample((10,))
+    x = cached_simulator(theta)
+
+    # Repeated and partially new parameters only simulate the new ones, in one call.
+    new_theta = prior.sample((5,))
+    x_repeated = cached_simulator(torch.cat((theta[:5], new_theta)))
+    assert torch.equal(x_repeated[:5], x[:5])
+    assert torch.equal(simulated_theta[-1], new_theta)
+    assert (cache.num_hits, cache.num_misses) == (5, 15)
+
+    # A new cache on the same directory serves the simulations of previous runs.
+    cache = SimulationCache(tmp_path, simulator_version="v1")
+    x_reloaded = cache.wrap(simulator)(theta)
+    assert torch.equal(x_reloaded, x)
+    assert cache.num_hits == 10
+
+    # Other simulator versions are cached separately.
+    cache = SimulationCache(tmp_path, simulator_version="v2")
+    assert not torch.equal(cache.wrap(simulator)(theta), x)
+
+    # Every call of the simulator is stored as one batch.
+    assert len(list(tmp_path.glob("*.pt"))) == 3
+
+    size_per_batch = cache._size_bytes / 3
+    cache = SimulationCache(
+        tmp_path, simulator_version="v3", max_size_bytes=int(5 * size_per_batch)
+    )
+    for _ in range(4):
+        cache.wrap(simulator)(prior.sample((10,)))
+    assert cache._size_bytes <= cache.max_size_bytes
+    assert len(list(tmp_path.glob("*.pt"))) <= 5
+
+
+def test_simulation_cache_corrupted_batch(tmp_path):
+    """Test that simulations of corrupted batch files are simulated again."""
+    prior = BoxUniform(zeros(2), ones(2))
+    cache = SimulationCache(tmp_path)
+    cached_simulator = cache.wrap(lambda theta: theta + 1.0)
+    theta = prior.sample((4,))
+    cached_simulator(theta)
+
+    (path,) = tmp_path.glob("*.pt")
+    path.write_bytes(b"not a pickle")
+    cache = SimulationCache(tmp_path)
+    x = cache.wrap(lambda theta: theta + 1.0)(theta)
+    assert torch.equal(x, theta + 1.0)
+    assert (cache.num_hits, cache.num_misses) == (0, 4)